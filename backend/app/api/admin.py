@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+
+from app.config import settings
+from app.core import cache, coldstart, log, retention
+from app.core.recommender import get_engine
+from app.core.security import require_admin
+from app.db import bulk_import
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+# Status of the current (or last) import; one import at a time per worker
+_job = {"state": "idle"}
+_job_lock = threading.Lock()
+
+
+class ImportRequest(BaseModel):
+    path: str  # file under IMPORT_DIR (CSV / JSONL / Parquet)
+    format: Optional[str] = None
+    chunk_size: Optional[int] = None
+    resume: bool = True
+
+
+def _resolve_import_path(path: str) -> str:
+    """Resolves path against IMPORT_DIR; rejects anything (.., symlinks, absolute paths) outside it."""
+    if not settings.IMPORT_DIR:
+        raise HTTPException(status_code=403, detail="Imports are disabled (set IMPORT_DIR).")
+    root = os.path.realpath(settings.IMPORT_DIR)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root:
+        raise HTTPException(status_code=400, detail="Path must be inside IMPORT_DIR.")
+    if not os.path.isfile(full):
+        raise HTTPException(status_code=404, detail=f"File not found: {path}")
+    return full
+
+
+def _run_import(req: ImportRequest):
+    try:
+        summary = bulk_import.run_import(
+            req.path, req.format, req.chunk_size, resume=req.resume,
+            engine=get_engine(), progress=_job.update,
+        )
+        # Every user may have new history: O(1) cache flush + rebuild cold-start lists
+        cache.bump_epoch()
+        coldstart.request_refresh()
+        _job.update(summary, state="done", finished_at=int(time.time()))
+    except Exception as e:
+        log.error("Import", f"⚠️ Import Error: {e}")
+        _job.update(state="failed", error=str(e), finished_at=int(time.time()))
+
+
+@router.post("/import", status_code=202, summary="Stream an interaction file into the DB and the live engine")
+def start_import(req: ImportRequest):
+    req.path = _resolve_import_path(req.path)
+    with _job_lock:
+        if _job.get("state") == "running":
+            raise HTTPException(status_code=409, detail="An import is already running.")
+        _job.clear()
+        _job.update(state="running", path=req.path, started_at=int(time.time()))
+
+    threading.Thread(target=_run_import, args=(req,), name="bulk-import", daemon=True).start()
+    return dict(_job)
+
+
+@router.get("/import", summary="Progress of the current or last import")
+def import_status():
+    return dict(_job)
+
+
+@router.post("/retention", summary="Run the retention pass now (prune decayed edges, archive their rows)")
+def run_retention():
+    if not retention.enabled():
+        raise HTTPException(status_code=409, detail="Retention is disabled (set RETENTION_MIN_WEIGHT).")
+    return retention.run("admin", force=True)
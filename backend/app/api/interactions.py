@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
@@ -7,7 +7,7 @@ from typing import List
 from app.db import crud, session
 from app.core.recommender import get_engine
 from app.core.security import get_current_user_id  # ← USE THIS
-from app.utils.redis import redis_client
+from app.core import boot, cache, changestream, ingest, refresher, timing
 
 router = APIRouter()
 
@@ -15,61 +15,89 @@ class InteractionRequest(BaseModel):
     user_id: int
     item_id: int
 
+def _submit(op: str, data: InteractionRequest) -> int:
+    try:
+        return ingest.submit(op, data.user_id, data.item_id)
+    except ingest.Backpressure:
+        raise HTTPException(status_code=503, detail="Too many pending writes, retry shortly.", headers={"Retry-After": "1"})
+
 @router.post("/", summary="Log a user-item interaction (Like)")
 def log_interaction(
     data: InteractionRequest, 
+    response: Response,
     db: Session = Depends(session.get_db),
     current_user_id: int = Depends(get_current_user_id)  # ← PROPER VERIFICATION
 ):
+    timer = timing.start("interaction_add")
+
     # Verify ownership
     if current_user_id != data.user_id:
         raise HTTPException(status_code=403, detail="You can only modify your own interactions.")
     
-    # Save to DB
-    interaction = crud.create_interaction(db, data.user_id, data.item_id)
+    # Save: durable log append (SQL write happens in the next batch), or direct to DB
+    if ingest.enabled():
+        with timer.stage("log"):
+            timestamp = _submit(ingest.OP_ADD, data)
+    else:
+        with timer.stage("db"):
+            timestamp = crud.create_interaction(db, data.user_id, data.item_id).timestamp
     
-    # Update C++ Engine
+    # Update C++ Engine (queued until the graph has finished loading)
     engine = get_engine()
-    if hasattr(engine, "add_interaction"):
-        engine.add_interaction(data.user_id, data.item_id, interaction.timestamp) 
+    with timer.stage("engine"):
+        if hasattr(engine, "add_interaction"):
+            boot.apply_or_defer(lambda: engine.add_interaction(data.user_id, data.item_id, timestamp))
+
+    # Fan out to the other replicas' engines
+    with timer.stage("stream"):
+        changestream.publish(changestream.OP_ADD, data.user_id, data.item_id, timestamp)
     
-    # Wipe Cache
-    if redis_client:
-        try:
-            for key in redis_client.scan_iter(f"rec:{data.user_id}:*"):
-                redis_client.delete(key)
-        except Exception as e:
-            print(f"⚠️ Redis Delete Error: {e}")
+    # Invalidate Cache (bump generation) and recompute in the background
+    with timer.stage("cache"):
+        cache.invalidate_user(data.user_id)
+        refresher.enqueue_user(data.user_id)
     
+    timer.finish(response)
     return {"status": "success", "msg": "Interaction logged"}
 
 @router.delete("/", summary="Remove an interaction (Unlike)")
 def delete_interaction(
     data: InteractionRequest,
+    response: Response,
     db: Session = Depends(session.get_db),
     current_user_id: int = Depends(get_current_user_id)  # ← PROPER VERIFICATION
 ):
+    timer = timing.start("interaction_remove")
+
     # Verify ownership
     if current_user_id != data.user_id:
         raise HTTPException(status_code=403, detail="You can only modify your own interactions.")
 
-    crud.delete_interaction(db, data.user_id, data.item_id)
+    # Unlikes share the Like queue so a quick Like -> Unlike can't be reordered
+    if ingest.enabled():
+        with timer.stage("log"):
+            _submit(ingest.OP_REMOVE, data)
+    else:
+        with timer.stage("db"):
+            crud.delete_interaction(db, data.user_id, data.item_id)
     
     engine = get_engine()
-    if hasattr(engine, "remove_interaction"):
-        engine.remove_interaction(data.user_id, data.item_id)
+    with timer.stage("engine"):
+        if hasattr(engine, "remove_interaction"):
+            boot.apply_or_defer(lambda: engine.remove_interaction(data.user_id, data.item_id))
+
+    with timer.stage("stream"):
+        changestream.publish(changestream.OP_REMOVE, data.user_id, data.item_id)
 
-    # Wipe Cache
-    if redis_client:
-        try:
-            for key in redis_client.scan_iter(f"rec:{data.user_id}:*"):
-                redis_client.delete(key)
-        except Exception as e:
-            print(f"⚠️ Redis Delete Error: {e}")
+    # Invalidate Cache (bump generation) and recompute in the background
+    with timer.stage("cache"):
+        cache.invalidate_user(data.user_id)
+        refresher.enqueue_user(data.user_id)
 
+    timer.finish(response)
     return {"status": "success", "msg": "Interaction removed"}
 
 @router.get("/{user_id}", response_model=List[int])
-def get_user_interactions(user_id: int, db: Session = Depends(session.get_db)):
-    """PUBLIC READ: Anyone can view any user's likes"""
-    return list(crud.get_user_interacted_ids(db, user_id))
\ No newline at end of file
+async def get_user_interactions(user_id: int, db=Depends(session.get_async_read_db)):
+    """PUBLIC READ: Anyone can view any user's likes (read replica; pending writes from the overlay)"""
+    return list(ingest.overlay(user_id, await crud.get_user_interacted_ids_async(db, user_id)))
\ No newline at end of file
@@ -1,5 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from app.core.recommender import get_engine
+from app.db import session
+from app.core import security
+from app.core import admission, boot, log, cache, changestream, coldstart, hybrid, ingest, refresher, retention, snapshotter
 
 router = APIRouter()
 
@@ -14,5 +17,29 @@ def get_graph_metrics():
     return {
         "nodes_users": engine.get_user_count() if hasattr(engine, "get_user_count") else 0,
         "nodes_items": engine.get_item_count() if hasattr(engine, "get_item_count") else 0,
-        "edges_interactions": engine.get_edge_count() if hasattr(engine, "get_edge_count") else 0
-    }
\ No newline at end of file
+        "edges_interactions": engine.get_edge_count() if hasattr(engine, "get_edge_count") else 0,
+        "boot": boot.stats(),
+        "auth": security.stats(),
+        "log": log.stats(),
+        "db_pools": session.pool_stats(),
+        "cache": cache.stats(),
+        "refresh": refresher.stats(),
+        "admission": admission.stats(),
+        "hybrid": hybrid.stats(),
+        "coldstart": coldstart.stats(),
+        "ingest": ingest.stats(),
+        "changestream": changestream.stats(),
+        "snapshots": snapshotter.stats(),
+        "retention": retention.stats(),
+    }
+
+@router.get("/prometheus")
+def get_prometheus_metrics():
+    """
+    Prometheus scrape endpoint (stage latency histograms).
+    """
+    try:
+        from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+    except ImportError:
+        return Response("prometheus_client not installed\n", status_code=501, media_type="text/plain")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
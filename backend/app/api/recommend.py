@@ -1,17 +1,42 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 from pydantic import BaseModel
-import time
-import json
 
+from app.config import settings
 from app.db import session, crud
-from app.core.recommender import get_engine
-from app.utils.redis import redis_client
-from app.ml.graphsage_serving import recommend_graphsage_for_user
+from app.core.recommender import PPR_DEPTH, PPR_WALKS, get_engine
+from app.core import admission, boot, cache, changestream, coldstart, hybrid, ingest, refresher, timing
+from app.utils import fastjson
+from app.ml.graphsage_serving import rank_graphsage
 
 router = APIRouter()
 
+CACHE_SOURCES = {
+    "l1": "Memory Cache ⚡",
+    "l2": "Redis Cache ⚡",
+    "stale": "Stale Cache ⏳ (refreshing)",
+}
+
+
+def render(body: bytes, timer: timing.StageTimer, source: str, expose: bool = False, work: Optional[dict] = None) -> Response:
+    """
+    Completes a pre-serialized body (see cache.encode_body) with the per-request
+    fields and returns it as raw bytes, bypassing response_model validation.
+    """
+    extra = {"latency_ms": timer.elapsed_ms(), "source": source}
+    if expose:
+        extra["timings"] = timer.breakdown_ms()
+    if work and work.get("work_total"):
+        extra["completeness"] = round(work["work_done"] / work["work_total"], 4)
+    tail = fastjson.dumps(extra)
+    response = Response(content=body + b"," + tail[1:], media_type="application/json")
+    return timer.finish(response)
+
+# Algorithms a client may ask for ("trending" is internal: degrade()'s last resort);
+# anything else is a 422 rather than a new cache key and admission gate
+Algo = Literal["bfs", "ppr", "graphsage", "hybrid"]
+
 # --- Response Models ---
 class ItemResponse(BaseModel):
     id: int
@@ -23,87 +48,113 @@ class RecResponse(BaseModel):
     user_id: int
     recommendations: List[ItemResponse]
     latency_ms: float
-    source: str = "Hybrid"  
+    source: str = "Hybrid"
+    timings: Optional[Dict[str, float]] = None  # per-stage ms, only with ?timings=true
+    completeness: Optional[float] = None  # share of planned engine work done, only with ?budget_ms=
+
 class PrefRequest(BaseModel):
     user_id: int
     genres: List[str]
 
 # --- Endpoints ---
 
-@router.post("/preferences")
+@router.post("/preferences", dependencies=[Depends(boot.require_db)])
 def save_preferences(data: PrefRequest, db: Session = Depends(session.get_db)):
     crud.set_user_preferences(db, data.user_id, data.genres)
+    changestream.publish_prefs(data.user_id, data.genres)
 
-    # Invalidate Cache
-    if redis_client:
-        try:
-            for key in redis_client.scan_iter(f"rec:{data.user_id}:*"):
-                redis_client.delete(key)
-        except Exception as e:
-            print(f"Redis Invalidation Error: {e}")
+    # Invalidate Cache (bump generation) and recompute in the background
+    cache.invalidate_user(data.user_id)
+    refresher.enqueue_user(data.user_id)
 
     return {"status": "success", "msg": "Preferences saved"}
 
 
-@router.get("/preferences/{user_id}", response_model=List[str])
-def get_user_preferences(user_id: int, db: Session = Depends(session.get_db)):
+@router.get("/preferences/{user_id}", response_model=List[str], dependencies=[Depends(boot.require_db)])
+async def get_user_preferences(user_id: int, db=Depends(session.get_async_read_db)):
     """Get user's genre preferences as a list of genre names"""
-    genre_ids = crud.get_user_preference_ids(db, user_id)
+    genre_ids = await crud.get_user_preference_ids_async(db, user_id)
     # Map IDs back to names
     id_to_name = {v: k for k, v in crud.GENRE_MAP.items() if k != "Unknown"}
     return [id_to_name.get(gid, "Unknown") for gid in genre_ids if gid in id_to_name]
 
 
-@router.get("/{user_id}", response_model=RecResponse)
-def get_recommendations(
-    user_id: int,
-    k: int = 5,
-    algo: str = Query("bfs", description="Algorithm: 'bfs', 'ppr', or 'graphsage'"),
-    db: Session = Depends(session.get_db),
-):
-    t0 = time.time()
-    cache_key = f"rec:{user_id}:{algo}:{k}"
+def _remaining_us(timer: timing.StageTimer, budget_ms: float) -> int:
+    """What is left of the request budget for the engine (at least 1 µs, so it does minimal work)."""
+    return max(1, int((budget_ms - timer.elapsed_ms()) * 1000))
 
-    # 1. CHECK CACHE (Only for BFS to allow PPR experiments)
-    if algo == "bfs" and redis_client:
-        try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                results = json.loads(cached_data)
-                t1 = time.time()
-                return {
-                    "user_id": user_id,
-                    "recommendations": results,
-                    "latency_ms": (t1 - t0) * 1000,
-                    "source": "Redis Cache ⚡",
-                }
-        except Exception:
-            pass
 
-    # 2. PREPARE DATA
+def build_recommendations(
+    db: Session,
+    user_id: int,
+    algo: str,
+    k: int,
+    timer: Optional[timing.StageTimer] = None,
+    budget_ms: Optional[float] = None,
+    work: Optional[dict] = None,
+) -> List[dict]:
+    """
+    Runs the full waterfall (Graph -> Cold Start -> Trending -> Catalog) and hydrates titles.
+    With budget_ms, BFS/PPR get whatever is left of the budget and return their
+    best ranking so far; `work` (if given) receives work_done/work_total/completed.
+    """
+    timer = timer or timing.StageTimer("refresh", algo, sampled=False)
+
+    # 1. PREPARE DATA
     engine = get_engine()
-    seen_ids = crud.get_user_interacted_ids(db, user_id)
-    pref_ids = crud.get_user_preference_ids(db, user_id)
+    with timer.stage("sql"):
+        # SQL plus this user's Likes/Unlikes still waiting in the write-behind queue
+        seen_ids = ingest.overlay(user_id, crud.get_user_interacted_ids(db, user_id))
+        pref_ids = crud.get_user_preference_ids(db, user_id)
+        if not pref_ids and settings.RETENTION_MODE == "aggregate":
+            # No explicit genres: use the ones their aggregated old Likes favoured
+            pref_ids = crud.get_user_affinity_genre_ids(db, user_id)
 
     # We use a set to ensure we don't recommend the same item twice via different strategies
     recommended_ids = set()
     final_items_meta = []  # List of dicts: {id, reason}
 
-    # 3. STRATEGY A: THE GRAPH ENGINE (BFS / PPR / GraphSAGE)
+    # 2. STRATEGY A: THE GRAPH ENGINE (BFS / PPR / GraphSAGE)
     # We try to get as many as possible from here first.
     graph_candidates = []
     graph_strategy_name = "Graph-Based"
-
-    if algo == "graphsage":
-        graph_candidates = recommend_graphsage_for_user(db, user_id, k + 10)
-        graph_strategy_name = "GraphSAGE (TMDb)"
-    elif algo == "ppr" and hasattr(engine, "recommend_ppr"):
-        graph_candidates = engine.recommend_ppr(user_id, k + 10, 10000, 2)
-        graph_strategy_name = "PageRank"
-    elif hasattr(engine, "recommend"):
-        # Weighted BFS
-        graph_candidates = engine.recommend(user_id, k, pref_ids)
-        graph_strategy_name = "Graph BFS"
+    outcome = None  # AnytimeResult when the engine ran under a budget
+
+    with timer.stage("engine"):
+        if algo == "graphsage":
+            graph_candidates, _ = rank_graphsage(cache.get_item_map(db), seen_ids, k + 10)
+            graph_strategy_name = "GraphSAGE (TMDb)"
+        elif algo == "hybrid":
+            # BFS + PPR + GraphSAGE in parallel, normalized and weighted; one shared deadline
+            blend_ms = _remaining_us(timer, budget_ms) / 1000 if budget_ms is not None else settings.HYBRID_BUDGET_MS
+            graph_candidates, finished, total = hybrid.blend(
+                user_id, k + 10, pref_ids, seen_ids, cache.get_item_map(db), blend_ms
+            )
+            graph_strategy_name = "Hybrid Blend"
+            if work is not None:  # with or without a budget, a dropped generator makes it partial
+                work.update(work_done=finished, work_total=total, completed=finished == total)
+        elif algo == "ppr" and budget_ms is not None and hasattr(engine, "recommend_ppr_anytime"):
+            outcome = engine.recommend_ppr_anytime(user_id, k + 10, PPR_WALKS, PPR_DEPTH, _remaining_us(timer, budget_ms))
+            graph_candidates = outcome.items
+            graph_strategy_name = "PageRank"
+        elif algo == "ppr" and hasattr(engine, "recommend_ppr"):
+            graph_candidates = engine.recommend_ppr(user_id, k + 10, PPR_WALKS, PPR_DEPTH)
+            graph_strategy_name = "PageRank"
+        elif algo == "trending":
+            # Graph skipped entirely (load shedding); the waterfall below fills the list
+            pass
+        elif budget_ms is not None and hasattr(engine, "recommend_anytime"):
+            # Weighted BFS, cut short when the budget runs out
+            outcome = engine.recommend_anytime(user_id, k, pref_ids, _remaining_us(timer, budget_ms))
+            graph_candidates = outcome.items
+            graph_strategy_name = "Graph BFS"
+        elif hasattr(engine, "recommend"):
+            # Weighted BFS
+            graph_candidates = engine.recommend(user_id, k, pref_ids)
+            graph_strategy_name = "Graph BFS"
+
+    if outcome is not None and work is not None:
+        work.update(work_done=outcome.work_done, work_total=outcome.work_total, completed=outcome.completed)
 
     # Filter Graph Results
     for pid in graph_candidates:
@@ -117,12 +168,26 @@ def get_recommendations(
             if len(final_items_meta) >= k:
                 break
 
-    # 4. STRATEGY B: FALLBACK TO POPULAR (Trending)
+    # 3. STRATEGY B: COLD START (no history yet -> precomputed lists for the user's genres)
+    if len(final_items_meta) < k and not seen_ids and pref_ids:
+        with timer.stage("coldstart"):
+            genre_candidates = coldstart.lookup(pref_ids)
+
+        for pid in genre_candidates:
+            if pid not in recommended_ids:
+                recommended_ids.add(pid)
+                final_items_meta.append({"id": pid, "reason": "Popular in Your Genres"})
+
+                if len(final_items_meta) >= k:
+                    break
+
+    # 4. STRATEGY C: FALLBACK TO POPULAR (Trending)
     # If graph didn't provide enough items (e.g. sparse graph), fill gaps with popular items.
     if len(final_items_meta) < k:
         needed = k - len(final_items_meta)
         # Fetch extra popular items to account for 'seen' overlap
-        popular_candidates = crud.get_popular_item_ids(db, limit=needed + len(seen_ids) + 5)
+        with timer.stage("trending"):
+            popular_candidates = crud.get_popular_item_ids(db, limit=needed + len(seen_ids) + 5)
 
         for pid in popular_candidates:
             if pid not in seen_ids and pid not in recommended_ids:
@@ -132,11 +197,12 @@ def get_recommendations(
                 if len(final_items_meta) >= k:
                     break
 
-    # 5. STRATEGY C: FALLBACK TO NEWEST (Catalog)
+    # 5. STRATEGY D: FALLBACK TO NEWEST (Catalog)
     # If still not enough (e.g. fresh DB with no interactions), just show items.
     if len(final_items_meta) < k:
         needed = k - len(final_items_meta)
-        default_candidates = crud.get_default_items(db, limit=needed + len(seen_ids) + 10)
+        with timer.stage("catalog"):
+            default_candidates = crud.get_default_items(db, limit=needed + len(seen_ids) + 10)
 
         for pid in default_candidates:
             if pid not in seen_ids and pid not in recommended_ids:
@@ -147,7 +213,8 @@ def get_recommendations(
                     break
 
     # 6. HYDRATE WITH TITLES
-    item_map = crud.get_item_map(db)
+    with timer.stage("hydrate"):
+        item_map = cache.get_item_map(db)
     results = []
 
     for meta in final_items_meta:
@@ -164,18 +231,82 @@ def get_recommendations(
             }
         )
 
-    t1 = time.time()
+    return results
+
 
-    # 7. UPDATE CACHE
-    if results and algo == "bfs" and redis_client:
+def degrade(db: Session, user_id: int, algo: str, k: int, timer: timing.StageTimer, expose: bool, why: str = "overloaded") -> Response:
+    """
+    Cheapest correct answer when `algo` is overloaded (or the graph is still loading):
+    another algorithm's cached list -> BFS (only if it has a free slot) -> trending.
+    """
+    timer.tier = "degraded"
+
+    # a) Anything already cached for this user
+    for alt in ("bfs", "graphsage", "ppr"):
+        if alt == algo:
+            continue
+        cached, tier, _ = cache.get_recs(user_id, alt, k)
+        if cached is not None:
+            return render(cached, timer, f"Degraded ⚠️ ({algo} {why} → cached {alt})", expose)
+
+    # b) BFS, without queueing behind other BFS requests (not on a half-loaded graph)
+    if algo != "bfs" and boot.ready():
         try:
-            redis_client.setex(cache_key, 3600, json.dumps(results))
-        except Exception as e:
-            print(f"Redis Write Error: {e}")
-
-    return {
-        "user_id": user_id,
-        "recommendations": results,
-        "latency_ms": (t1 - t0) * 1000,
-        "source": "Hybrid (Graph + Fallback)",
-    }
\ No newline at end of file
+            results = admission.run("bfs", lambda: build_recommendations(db, user_id, "bfs", k, timer), wait=False)
+            return render(cache.encode_body(user_id, results), timer, f"Degraded ⚠️ ({algo} {why} → bfs)", expose)
+        except admission.Overloaded:
+            pass
+
+    # c) Trending / catalog only
+    results = build_recommendations(db, user_id, "trending", k, timer)
+    return render(cache.encode_body(user_id, results), timer, f"Degraded ⚠️ ({algo} {why} → trending)", expose)
+
+
+@router.get("/{user_id}", response_model=RecResponse)
+def get_recommendations(
+    user_id: int,
+    k: int = 5,
+    algo: Algo = Query("bfs", description="Algorithm: 'bfs', 'ppr', 'graphsage', or 'hybrid'"),
+    timings: bool = Query(False, description="Include a per-stage latency breakdown"),
+    budget_ms: Optional[float] = Query(None, gt=0, description="Latency budget; BFS/PPR return their best ranking so far when it runs out"),
+    # Primary, not the replica: a miss right after a Like must not cache a list
+    # computed from rows the replica hasn't received yet
+    db: Session = Depends(session.get_db),
+):
+    timer = timing.start("recommend", algo, force=timings)
+
+    # 1. CHECK CACHE (L1 in-process -> L2 Redis -> stale copy, versioned keys)
+    with timer.stage("cache"):
+        cached, tier, ticket = cache.get_recs(user_id, algo, k)
+    if cached is not None:
+        timer.tier = tier
+        if tier == "stale":
+            # Serve the previous list while a fresh one is computed in the background
+            refresher.enqueue(user_id, algo, k)
+        return render(cached, timer, CACHE_SOURCES[tier], expose=timings)
+
+    # Graph still loading: nothing computed now would be worth caching
+    if not boot.ready():
+        boot.require_db()  # trending needs SQL
+        return degrade(db, user_id, algo, k, timer, timings, why="warming up")
+
+    # 2. COMPUTE (single-flight: concurrent misses share one computation;
+    #    the leader needs an admission slot for its algorithm)
+    work = {}
+    ticket["budget_ms"] = budget_ms  # budgeted and unbudgeted callers don't share a computation
+
+    def compute():
+        results = build_recommendations(db, user_id, algo, k, timer, budget_ms, work)
+        # A ranking cut short (by the budget, or a hybrid generator that missed its
+        # deadline) is not cached for callers that would expect the full one
+        ticket["cacheable"] = work.get("completed", True)
+        return results
+
+    try:
+        body, shared = cache.compute_once(ticket, lambda: admission.run(algo, compute))
+    except admission.Overloaded:
+        return degrade(db, user_id, algo, k, timer, timings)
+    timer.tier = "coalesced" if shared else "miss"
+
+    source = "Coalesced ⚡" if shared else "Hybrid (Graph + Fallback)"
+    return render(body, timer, source, expose=timings, work=None if shared else work)
\ No newline at end of file
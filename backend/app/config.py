@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 # 1. Load the .env file immediately
@@ -12,10 +13,141 @@ class Settings:
     # --- Private Secrets (Backend Only) ---
     # 2. Database Configuration
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./graphrec.db")
+    # Read-only queries go here when set (a replica); empty = DATABASE_URL
+    DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL", "")
+    # Per-engine pool (Postgres): steady connections, burst above that, seconds a
+    # checkout waits for a free connection, seconds before a connection is replaced
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "300"))
 
     # 3. Redis Configuration
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+    # Per-algorithm recommendation cache TTLs (seconds)
+    CACHE_TTL_BFS: int = int(os.getenv("CACHE_TTL_BFS", "3600"))
+    CACHE_TTL_PPR: int = int(os.getenv("CACHE_TTL_PPR", "600"))
+    CACHE_TTL_GRAPHSAGE: int = int(os.getenv("CACHE_TTL_GRAPHSAGE", "1800"))
+
+    # In-process L1 cache in front of Redis (entries / seconds)
+    L1_CACHE_SIZE: int = int(os.getenv("L1_CACHE_SIZE", "2048"))
+    L1_CACHE_TTL: int = int(os.getenv("L1_CACHE_TTL", "60"))
+    CATALOG_CACHE_TTL: int = int(os.getenv("CATALOG_CACHE_TTL", "300"))
+
+    # Auth caches: verified JWT fingerprints (never past the token's exp) and
+    # uuid -> user_id (dropped on every worker when a profile is (re)registered)
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    AUTH_TOKEN_CACHE_TTL: int = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+    PROFILE_CACHE_SIZE: int = int(os.getenv("PROFILE_CACHE_SIZE", "100000"))
+    PROFILE_CACHE_TTL: int = int(os.getenv("PROFILE_CACHE_TTL", "3600"))
+    # Graph ids checked for gaps (deleted profiles) per startup, continuing where the last one stopped
+    USER_ID_RECLAIM_BATCH: int = int(os.getenv("USER_ID_RECLAIM_BATCH", "100000"))
+
+    # Request coalescing across workers (short Redis lock per cache miss)
+    SINGLE_FLIGHT_REDIS: bool = os.getenv("SINGLE_FLIGHT_REDIS", "true").lower() == "true"
+    SINGLE_FLIGHT_LOCK_MS: int = int(os.getenv("SINGLE_FLIGHT_LOCK_MS", "2000"))
+    SINGLE_FLIGHT_WAIT_MS: int = int(os.getenv("SINGLE_FLIGHT_WAIT_MS", "500"))
+
+    # Stale-while-revalidate + background recompute after writes
+    STALE_WHILE_REVALIDATE: bool = os.getenv("STALE_WHILE_REVALIDATE", "true").lower() == "true"
+    STALE_GRACE_SECONDS: int = int(os.getenv("STALE_GRACE_SECONDS", "300"))
+    REFRESH_ALGOS: list = os.getenv("REFRESH_ALGOS", "bfs,ppr,graphsage").split(",")
+    REFRESH_K: list = [int(k) for k in os.getenv("REFRESH_K", "5").split(",")]
+    REFRESH_WORKERS: int = int(os.getenv("REFRESH_WORKERS", "1"))
+
+    # Fraction of requests that record per-stage timings / Prometheus histograms
+    TIMING_SAMPLE_RATE: float = float(os.getenv("TIMING_SAMPLE_RATE", "0.1"))
+
+    # Admission control: concurrent computations per algorithm; the wait queue
+    # holds ADMISSION_QUEUE_FACTOR x limit requests for at most ADMISSION_MAX_WAIT_MS
+    ADMISSION_LIMITS: str = os.getenv("ADMISSION_LIMITS", "bfs=16,ppr=4,graphsage=4,hybrid=4")
+    ADMISSION_QUEUE_FACTOR: int = int(os.getenv("ADMISSION_QUEUE_FACTOR", "2"))
+    ADMISSION_MAX_WAIT_MS: int = int(os.getenv("ADMISSION_MAX_WAIT_MS", "250"))
+
+    # Hybrid blend (algo=hybrid): per-generator weights, shared deadline, pool size
+    HYBRID_WEIGHTS: str = os.getenv("HYBRID_WEIGHTS", "bfs=0.4,ppr=0.3,graphsage=0.3")
+    HYBRID_BUDGET_MS: float = float(os.getenv("HYBRID_BUDGET_MS", "50"))
+    HYBRID_WORKERS: int = int(os.getenv("HYBRID_WORKERS", "12"))
+
+    # Cold-start lists: top-N per genre combination (up to COLDSTART_MAX_COMBO genres),
+    # rebuilt every COLDSTART_REFRESH_SECONDS and on catalog changes
+    COLDSTART_TOP_N: int = int(os.getenv("COLDSTART_TOP_N", "50"))
+    COLDSTART_MAX_COMBO: int = int(os.getenv("COLDSTART_MAX_COMBO", "3"))
+    COLDSTART_REFRESH_SECONDS: int = int(os.getenv("COLDSTART_REFRESH_SECONDS", "300"))
+
+    # Write-behind ingestion: Like/Unlike are acked after a durable log append
+    # (INGEST_LOG = auto | redis | file) and flushed to SQL in batches
+    INGEST_WRITE_BEHIND: bool = os.getenv("INGEST_WRITE_BEHIND", "true").lower() == "true"
+    INGEST_LOG: str = os.getenv("INGEST_LOG", "auto")
+    INGEST_WAL_PATH: str = os.getenv("INGEST_WAL_PATH", "ingest.wal")
+    INGEST_FLUSH_MS: int = int(os.getenv("INGEST_FLUSH_MS", "50"))
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+    INGEST_MAX_PENDING: int = int(os.getenv("INGEST_MAX_PENDING", "10000"))
+    INGEST_BACKPRESSURE_MS: int = int(os.getenv("INGEST_BACKPRESSURE_MS", "200"))
+    # Each worker owns its log; one silent for INGEST_OWNER_TTL_MS is replayed by another.
+    # A batch failing INGEST_MAX_ATTEMPTS times with the DB up is dead-lettered row by row
+    INGEST_OWNER_TTL_MS: int = int(os.getenv("INGEST_OWNER_TTL_MS", "30000"))
+    INGEST_MAX_ATTEMPTS: int = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+
+    # Bulk import (CLI + /admin/import); the admin API is disabled unless ADMIN_TOKEN is set
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", "50000"))
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    # /admin/import only reads files under this directory (imports are refused when unset)
+    IMPORT_DIR: str = os.getenv("IMPORT_DIR", "")
+
+    # Startup graph load: interactions streamed from SQL in chunks of this many rows
+    STARTUP_LOAD_CHUNK: int = int(os.getenv("STARTUP_LOAD_CHUNK", "100000"))
+
+    # Logging: records are queued and written by one background thread (LOG_FORMAT =
+    # text | json); LOG_SAMPLE_RATES keeps a fraction of a tag's info records ("Auth=0.1")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "info")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "")
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    # Boot: the graph loads in the background after the server starts listening;
+    # /ready reports it, and a boot slower than BOOT_BUDGET_SECONDS is flagged
+    BOOT_BUDGET_SECONDS: float = float(os.getenv("BOOT_BUDGET_SECONDS", "30"))
+    # A failed boot is retried (BOOT_RETRY_SECONDS, doubling up to 60s); after
+    # BOOT_MAX_ATTEMPTS it stays failed and /health turns 503 so the instance is replaced
+    BOOT_MAX_ATTEMPTS: int = int(os.getenv("BOOT_MAX_ATTEMPTS", "5"))
+    BOOT_RETRY_SECONDS: float = float(os.getenv("BOOT_RETRY_SECONDS", "2"))
+
+    # Retention: edges whose decayed weight (1 / (1 + 0.05 * age_days)) is below
+    # RETENTION_MIN_WEIGHT leave the live graph, except each user's KEEP_PER_USER newest.
+    # SQL rows are moved to interactions_archive, or folded into per-user genre counts
+    # (RETENTION_MODE = archive | aggregate), RETENTION_USER_BATCH users per transaction.
+    # 0 disables; e.g. 0.03 ~ likes older than 21 months
+    RETENTION_MIN_WEIGHT: float = float(os.getenv("RETENTION_MIN_WEIGHT", "0"))
+    RETENTION_KEEP_PER_USER: int = int(os.getenv("RETENTION_KEEP_PER_USER", "20"))
+    RETENTION_MODE: str = os.getenv("RETENTION_MODE", "archive")
+    RETENTION_INTERVAL_SECONDS: int = int(os.getenv("RETENTION_INTERVAL_SECONDS", "86400"))
+    RETENTION_USER_BATCH: int = int(os.getenv("RETENTION_USER_BATCH", "10000"))
+
+    # Graph snapshots: codec (auto = zstd, then lz4, then zlib) and DB row size
+    SNAPSHOT_CODEC: str = os.getenv("SNAPSHOT_CODEC", "auto")
+    SNAPSHOT_CHUNK_BYTES: int = int(os.getenv("SNAPSHOT_CHUNK_BYTES", str(4 * 1024 * 1024)))
+
+    # Online snapshots while serving: every SNAPSHOT_INTERVAL_SECONDS or after
+    # SNAPSHOT_EDGE_DELTA graph writes, whichever comes first (0 disables either)
+    SNAPSHOT_INTERVAL_SECONDS: int = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "900"))
+    SNAPSHOT_EDGE_DELTA: int = int(os.getenv("SNAPSHOT_EDGE_DELTA", "100000"))
+    SNAPSHOT_CHECK_SECONDS: float = float(os.getenv("SNAPSHOT_CHECK_SECONDS", "10"))
+    SNAPSHOT_LOCK_MS: int = int(os.getenv("SNAPSHOT_LOCK_MS", "600000"))
+
+    # Change stream: Like/Unlike/preference changes are XADDed to one Redis stream
+    # that every replica tails (offset kept per REPLICA_ID and in the graph snapshot)
+    CHANGESTREAM_ENABLED: bool = os.getenv("CHANGESTREAM_ENABLED", "true").lower() == "true"
+    CHANGESTREAM_KEY: str = os.getenv("CHANGESTREAM_KEY", "graph:changes")
+    CHANGESTREAM_MAXLEN: int = int(os.getenv("CHANGESTREAM_MAXLEN", "1000000"))
+    CHANGESTREAM_BLOCK_MS: int = int(os.getenv("CHANGESTREAM_BLOCK_MS", "1000"))
+    CHANGESTREAM_BATCH: int = int(os.getenv("CHANGESTREAM_BATCH", "1000"))
+    # Without a snapshot, the tail starts this long before the SQL load (writes still
+    # in another worker's write-behind queue are not in SQL yet)
+    CHANGESTREAM_REPLAY_MS: int = int(os.getenv("CHANGESTREAM_REPLAY_MS", "60000"))
+    REPLICA_ID: str = os.getenv("REPLICA_ID", socket.gethostname())
+
     # 4. Supabase JWT Secret
     SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")
 
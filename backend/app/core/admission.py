@@ -0,0 +1,109 @@
+"""
+Per-algorithm admission control.
+
+Each algorithm gets a concurrency limit and a bounded wait queue. A request is
+shed (Overloaded) instead of queued when the queue is full, when the predicted
+wait (EWMA service time x queue position) already exceeds the wait budget, or
+when it could not get a slot within that budget. Callers degrade to a cheaper
+answer rather than tying up a threadpool slot until the client times out.
+"""
+import threading
+import time
+
+from app.config import settings
+
+
+class Overloaded(Exception):
+    def __init__(self, algo: str, reason: str):
+        super().__init__(f"{algo} overloaded ({reason})")
+        self.algo = algo
+        self.reason = reason
+
+
+class AlgoGate:
+    def __init__(self, algo: str, limit: int, max_queue: int, max_wait_ms: float):
+        self.algo = algo
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait_ms / 1000.0
+        self._sem = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.ewma_service = 0.0  # seconds
+        self.stats = {"admitted": 0, "shed_busy": 0, "shed_queue": 0, "shed_latency": 0, "shed_timeout": 0}
+
+    def _acquire(self, wait: bool):
+        if self._sem.acquire(blocking=False):
+            return
+        if not wait:
+            self.stats["shed_busy"] += 1
+            raise Overloaded(self.algo, "busy")
+
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.stats["shed_queue"] += 1
+                raise Overloaded(self.algo, "queue full")
+            predicted_wait = self.ewma_service * (self.waiting + 1) / self.limit
+            if predicted_wait > self.max_wait:
+                self.stats["shed_latency"] += 1
+                raise Overloaded(self.algo, "latency")
+            self.waiting += 1
+
+        try:
+            acquired = self._sem.acquire(timeout=self.max_wait)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            self.stats["shed_timeout"] += 1
+            raise Overloaded(self.algo, "timeout")
+
+    def run(self, fn, wait: bool = True):
+        """Runs fn() inside a slot, or raises Overloaded."""
+        self._acquire(wait)
+        self.stats["admitted"] += 1
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            elapsed = time.perf_counter() - start
+            self.ewma_service = 0.8 * self.ewma_service + 0.2 * elapsed if self.ewma_service else elapsed
+            self.running -= 1
+            self._sem.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "waiting": self.waiting,
+            "ewma_service_ms": round(self.ewma_service * 1000, 3),
+            **self.stats,
+        }
+
+
+def _parse_limits(spec: str) -> dict:
+    limits = {}
+    for part in spec.split(","):
+        algo, limit = part.split("=")
+        limits[algo.strip()] = int(limit)
+    return limits
+
+
+GATES = {
+    algo: AlgoGate(algo, limit, limit * settings.ADMISSION_QUEUE_FACTOR, settings.ADMISSION_MAX_WAIT_MS)
+    for algo, limit in _parse_limits(settings.ADMISSION_LIMITS).items()
+}
+
+
+def run(algo: str, fn, wait: bool = True):
+    """Runs fn() under the algorithm's gate; algorithms without a gate run unrestricted."""
+    gate = GATES.get(algo)
+    if gate is None:
+        return fn()
+    return gate.run(fn, wait)
+
+
+def stats() -> dict:
+    return {algo: gate.snapshot() for algo, gate in GATES.items()}
@@ -0,0 +1,168 @@
+"""
+Background boot behind a readiness gate.
+
+The server used to load everything (schema, seed, snapshot, full SQL sync)
+inside lifespan before accepting a single request. Now lifespan only starts a
+boot thread and yields: /health answers immediately, /ready turns 200 once the
+graph is loaded, and requests arriving in between are served from what exists:
+
+- "db" phase done: SQL is usable (require_db gates DB-backed endpoints until then)
+- "ready": graph loaded and background services running
+
+Until ready, /recommend serves cached lists or trending, and engine writes
+(Like/Unlike) are queued by apply_or_defer and replayed in order once the
+graph is in place, since a snapshot restore replaces the whole graph and a
+sync may re-add an edge whose removal is still in the write-behind queue.
+
+Each phase (and the module imports before lifespan) is timed; report() prints
+the breakdown and flags boots over BOOT_BUDGET_SECONDS.
+
+A failed boot is retried BOOT_MAX_ATTEMPTS times with exponential backoff (steps
+wrapped in once() are not repeated). After the last attempt the phase stays
+"failed" and /health answers 503, so the platform replaces the instance instead
+of keeping one that can never become ready.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.core import log
+
+PHASE_STARTING = "starting"
+PHASE_READY = "ready"
+PHASE_FAILED = "failed"
+
+_lock = threading.Lock()
+_done = set()  # once() steps that completed
+_deferred = []
+_thread = None
+_started_at = None
+
+state = {"phase": PHASE_STARTING, "db_ready": False, "ready": False, "error": None, "attempts": 0, "deferred_applied": 0}
+timings = {}  # phase -> seconds, in boot order
+
+
+def record(name: str, seconds: float):
+    timings[name] = round(seconds, 3)
+
+
+@contextmanager
+def phase(name: str):
+    state["phase"] = name
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def once(name: str, fn):
+    """Runs a boot step unless an earlier attempt already completed it (thread starts, log recovery)."""
+    if name in _done:
+        return
+    fn()
+    _done.add(name)
+
+
+def failed() -> bool:
+    """True once every boot attempt has failed (liveness)."""
+    return state["phase"] == PHASE_FAILED
+
+
+def db_ready() -> bool:
+    return state["db_ready"]
+
+
+def ready() -> bool:
+    return state["ready"]
+
+
+def mark_db_ready():
+    state["db_ready"] = True
+
+
+def mark_ready():
+    """Replays the deferred engine writes, then opens the gate (atomically w.r.t. apply_or_defer)."""
+    with _lock:
+        for fn in _deferred:
+            try:
+                fn()
+                state["deferred_applied"] += 1
+            except Exception as e:
+                log.warning("Boot", f"⚠️ Deferred Write Error: {e}")
+        _deferred.clear()
+        state["ready"] = True
+        state["phase"] = PHASE_READY
+
+
+def apply_or_defer(fn) -> bool:
+    """Runs an engine write now, or queues it until the graph is loaded. Returns True if run now."""
+    if state["ready"]:
+        fn()
+        return True
+    with _lock:
+        if not state["ready"]:
+            _deferred.append(fn)
+            return False
+    fn()
+    return True
+
+
+def require_db():
+    """Dependency: 503 + Retry-After until the schema/seed phase has finished."""
+    if not state["db_ready"]:
+        raise HTTPException(status_code=503, detail=f"Starting up ({state['phase']}), retry shortly.", headers={"Retry-After": "1"})
+
+
+def report():
+    total = timings.get("imports", 0.0) + (time.perf_counter() - _started_at if _started_at is not None else 0.0)
+    breakdown = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+    log.info("Boot", f"✅ Ready in {total:.2f}s ({breakdown})")
+    if total > settings.BOOT_BUDGET_SECONDS:
+        log.warning("Boot", f"⚠️ Boot took {total:.2f}s, over the {settings.BOOT_BUDGET_SECONDS:.0f}s budget")
+
+
+def _run(fn):
+    for attempt in range(1, settings.BOOT_MAX_ATTEMPTS + 1):
+        state["attempts"] = attempt
+        try:
+            fn()
+            state["error"] = None
+            mark_ready()
+            report()
+            return
+        except Exception as e:
+            failed_in = state["phase"]
+            state["error"] = f"{failed_in}: {e}"
+            if attempt == settings.BOOT_MAX_ATTEMPTS:
+                state["phase"] = PHASE_FAILED
+                log.error("Boot", f"❌ Failed during {failed_in}: {e}", attempts=attempt)
+                return
+            delay = min(settings.BOOT_RETRY_SECONDS * 2 ** (attempt - 1), 60)
+            log.warning("Boot", f"⚠️ Failed during {failed_in}: {e}; retrying in {delay:.0f}s", attempt=attempt)
+            time.sleep(delay)
+
+
+def start(fn, import_seconds: float = None):
+    """Runs fn (the phased boot sequence) in a background thread."""
+    global _thread, _started_at
+    _started_at = time.perf_counter()
+    if import_seconds is not None:
+        record("imports", import_seconds)
+    _thread = threading.Thread(target=_run, args=(fn,), name="boot", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def wait(timeout: float = None) -> bool:
+    """Blocks until boot has finished (tests, CLI). Returns True if the graph is ready."""
+    if _thread is not None:
+        _thread.join(timeout)
+    return state["ready"]
+
+
+def stats() -> dict:
+    return {**state, "deferred": len(_deferred), "timings_s": dict(timings)}
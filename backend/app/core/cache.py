@@ -0,0 +1,489 @@
+"""
+Two-tier recommendation cache.
+
+Values are pre-serialized response bodies (see encode_body), so a hit is
+returned as raw bytes without JSON parsing or Pydantic validation.
+
+L1 is a bounded in-process LRU with a short TTL, L2 is Redis. Every cached
+list lives in L2 under a key that embeds the user's generation counter and the
+global graph/embedding epoch:
+
+    rec:{user_id}:g{generation}:e{epoch}:{algo}:{k}
+
+Invalidating a user is a single INCR on ``rec:gen:{user_id}`` and invalidating
+everybody is a single INCR on ``rec:epoch``. Old L2 entries are never deleted;
+nothing points at them any more and they expire through their TTL. L1 entries
+are dropped on every worker via a Redis pub/sub broadcast.
+
+Stale-while-revalidate: the latest list is also kept under an unversioned
+``rec:last:*`` key (and invalidated L1 entries are demoted to a stale L1), so a
+read that lands between an invalidation and the background refresh can be
+answered with the previous result, marked stale. The time of the last
+invalidation (``rec:inv:{user_id}`` / ``rec:epoch:at``) bounds that to
+STALE_GRACE_SECONDS after it, whatever is left of the copy's own TTL.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.config import settings
+from app.core import log
+from app.core.singleflight import SingleFlight
+from app.db import crud
+from app.utils import fastjson
+from app.utils.redis import redis_client
+
+EPOCH_KEY = "rec:epoch"
+EPOCH_AT_KEY = "rec:epoch:at"
+INVALIDATION_CHANNEL = "rec:invalidate"
+
+CACHE_TTLS = {
+    "bfs": settings.CACHE_TTL_BFS,
+    "ppr": settings.CACHE_TTL_PPR,
+    "graphsage": settings.CACHE_TTL_GRAPHSAGE,
+    "hybrid": settings.CACHE_TTL_PPR,  # shortest-lived input bounds the blend
+}
+
+
+class LRUCache:
+    """Thread-safe bounded LRU with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_where(self, predicate):
+        """Removes and returns the live (key, value) pairs whose key matches."""
+        now = time.monotonic()
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            popped = [(k, self._data.pop(k)) for k in keys]
+        return [(k, value) for k, (expires_at, value) in popped if expires_at >= now]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+# L1 recommendation lists, keyed (user_id, algo, k)
+rec_l1 = LRUCache(settings.L1_CACHE_SIZE, settings.L1_CACHE_TTL)
+# Invalidated L1 lists, kept for the grace window so reads can serve them stale
+stale_l1 = LRUCache(settings.L1_CACHE_SIZE, settings.STALE_GRACE_SECONDS)
+# L1 catalog (item_id -> title/category), a single entry in front of SQL
+catalog_l1 = LRUCache(1, settings.CATALOG_CACHE_TTL)
+# Supabase uuid -> graph user_id, so authenticated writes skip the profiles lookup
+profile_l1 = LRUCache(settings.PROFILE_CACHE_SIZE, settings.PROFILE_CACHE_TTL)
+
+# L2 counters (L1 counters live on the LRUCache itself)
+l2_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+# Coalesces concurrent misses for the same (user, algo, k, generation)
+flights = SingleFlight()
+lock_stats = {"acquired": 0, "waited": 0, "peer_hits": 0}
+
+# Local invalidation stamps guard L1 writes that raced with an invalidation.
+# Bounded to L1_CACHE_SIZE users: past that the older half is forgotten and
+# _global_stamp bumped once, so no ticket can match a forgotten stamp again.
+_stamps: "OrderedDict[int, int]" = OrderedDict()
+_stamps_lock = threading.Lock()
+_global_stamp = 0
+
+
+def generation_key(user_id: int) -> str:
+    return f"rec:gen:{user_id}"
+
+
+def invalidated_key(user_id: int) -> str:
+    return f"rec:inv:{user_id}"
+
+
+def ttl_for(algo: str) -> int:
+    return CACHE_TTLS.get(algo, settings.CACHE_TTL_BFS)
+
+
+def get_versions(user_id: int):
+    """Returns (generation, epoch) for a user in a single round-trip."""
+    gen, epoch = redis_client.mget(generation_key(user_id), EPOCH_KEY)
+    return int(gen or 0), int(epoch or 0)
+
+
+def rec_key(user_id: int, algo: str, k: int) -> str:
+    gen, epoch = get_versions(user_id)
+    return f"rec:{user_id}:g{gen}:e{epoch}:{algo}:{k}"
+
+
+def last_key(user_id: int, algo: str, k: int) -> str:
+    """Unversioned copy of the latest list; outlives invalidations by the grace window."""
+    return f"rec:last:{user_id}:{algo}:{k}"
+
+
+def _stamp(user_id: int):
+    return (_global_stamp, _stamps.get(user_id, 0))
+
+
+def make_ticket(user_id: int, algo: str, k: int) -> dict:
+    """Captures the current versions of (user, algo, k) for a later set_recs()."""
+    ticket = {"user_id": user_id, "algo": algo, "k": k, "stamp": _stamp(user_id), "key": None}
+    if redis_client:
+        try:
+            ticket["key"] = rec_key(user_id, algo, k)
+        except Exception:
+            l2_stats["errors"] += 1
+    return ticket
+
+
+def encode_body(user_id: int, results: list) -> bytes:
+    """
+    Serializes a response body without its closing brace, so the per-request
+    fields (latency_ms, source) can be appended without re-encoding the list.
+    """
+    return fastjson.dumps({"user_id": user_id, "recommendations": results})[:-1]
+
+
+def get_stale(user_id: int, algo: str, k: int):
+    """Returns the previous body for (user, algo, k) if still inside the grace window."""
+    body = stale_l1.get((user_id, algo, k))
+    if body is not None or not redis_client:
+        return body
+    try:
+        key = last_key(user_id, algo, k)
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        pipe.mget(invalidated_key(user_id), EPOCH_AT_KEY)
+        cached_data, ttl_ms, invalidated_at = pipe.execute()
+    except Exception:
+        l2_stats["errors"] += 1
+        return None
+    if not cached_data:
+        return None
+
+    # Written before the last invalidation and that was over the grace window ago: too old
+    invalidated = max((float(at) for at in invalidated_at if at), default=None)
+    if invalidated is not None and time.time() - invalidated > settings.STALE_GRACE_SECONDS:
+        written = time.time() - (ttl_for(algo) + settings.STALE_GRACE_SECONDS) + max(ttl_ms, 0) / 1000.0
+        if written < invalidated:
+            return None
+    return cached_data.encode("utf-8")
+
+
+def get_recs(user_id: int, algo: str, k: int):
+    """
+    Looks a pre-serialized body up in L1, then L2, then (if enabled) the stale copy.
+    Returns (body, tier, ticket) with tier in {"l1", "l2", "stale", None};
+    pass the ticket to set_recs()/compute_once() after a miss.
+    """
+    ticket = {"user_id": user_id, "algo": algo, "k": k, "stamp": _stamp(user_id), "key": None}
+
+    body = rec_l1.get((user_id, algo, k))
+    if body is not None:
+        return body, "l1", ticket
+
+    if redis_client:
+        try:
+            ticket["key"] = rec_key(user_id, algo, k)
+            cached_data = redis_client.get(ticket["key"])
+            if cached_data:
+                l2_stats["hits"] += 1
+                body = cached_data.encode("utf-8")
+                rec_l1.set((user_id, algo, k), body)
+                return body, "l2", ticket
+            l2_stats["misses"] += 1
+        except Exception:
+            l2_stats["errors"] += 1
+
+    if settings.STALE_WHILE_REVALIDATE:
+        body = get_stale(user_id, algo, k)
+        if body is not None:
+            return body, "stale", ticket
+
+    return None, None, ticket
+
+
+def set_recs(ticket: dict, body: bytes):
+    """Writes a freshly computed body (see encode_body) to both tiers."""
+    user_id, algo, k = ticket["user_id"], ticket["algo"], ticket["k"]
+
+    # Skip L1 if the user was invalidated while we were computing
+    if ticket["stamp"] == _stamp(user_id):
+        rec_l1.set((user_id, algo, k), body)
+
+    if ticket["key"] and redis_client:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.setex(ticket["key"], ttl_for(algo), body)
+            pipe.setex(last_key(user_id, algo, k), ttl_for(algo) + settings.STALE_GRACE_SECONDS, body)
+            pipe.execute()
+        except Exception as e:
+            log.warning("Cache", f"⚠️ Redis Write Error: {e}")
+
+
+def _wait_for_peer(ticket: dict):
+    """Polls L2 while another worker holds the compute lock. Returns its result or None."""
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT_MS / 1000.0
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        cached_data = redis_client.get(ticket["key"])
+        if cached_data:
+            body = cached_data.encode("utf-8")
+            rec_l1.set((ticket["user_id"], ticket["algo"], ticket["k"]), body)
+            return body
+        if not redis_client.exists(f"lock:{ticket['key']}"):
+            break
+    return None
+
+
+# Deletes the single-flight lock only while it still holds our token (it may have
+# expired and been taken by another worker while we were computing)
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_lock = redis_client.register_script(RELEASE_LOCK_LUA) if redis_client else None
+
+
+def _compute_with_lock(ticket: dict, compute):
+    lock_key = token = None
+    if settings.SINGLE_FLIGHT_REDIS and ticket["key"] and redis_client:
+        try:
+            token = uuid.uuid4().hex
+            if redis_client.set(f"lock:{ticket['key']}", token, nx=True, px=settings.SINGLE_FLIGHT_LOCK_MS):
+                lock_key = f"lock:{ticket['key']}"
+                lock_stats["acquired"] += 1
+            else:
+                lock_stats["waited"] += 1
+                body = _wait_for_peer(ticket)
+                if body is not None:
+                    lock_stats["peer_hits"] += 1
+                    return body, True
+        except Exception:
+            lock_key = None
+
+    try:
+        results = compute()
+        body = encode_body(ticket["user_id"], results)
+        if results and ticket.get("cacheable", True):
+            set_recs(ticket, body)
+        return body, False
+    finally:
+        if lock_key:
+            try:
+                _release_lock(keys=[lock_key], args=[token])
+            except Exception:
+                pass
+
+
+def compute_once(ticket: dict, compute):
+    """
+    Runs compute() for a cache miss at most once per (user, algo, k, generation)
+    in this process, and (optionally) once across workers via a short Redis lock.
+    compute() returns the result list and may set ticket["cacheable"] = False to
+    skip the write-back; callers get the list back pre-serialized.
+    Returns (body, shared).
+    """
+    user_id, algo, k = ticket["user_id"], ticket["algo"], ticket["k"]
+    flight_key = (ticket["key"] or (user_id, algo, k, _stamp(user_id)), ticket.get("budget_ms"))
+    (body, from_peer), shared = flights.do(flight_key, lambda: _compute_with_lock(ticket, compute))
+    return body, shared or from_peer
+
+
+def get_item_map(db):
+    """Catalog lookup (item_id -> title/category) served from L1."""
+    item_map = catalog_l1.get("items")
+    if item_map is None:
+        item_map = crud.get_item_map(db)
+        catalog_l1.set("items", item_map)
+    return item_map
+
+
+# --- INVALIDATION ---
+
+def _demote(entries):
+    for key, value in entries:
+        stale_l1.set(key, value)
+
+
+def _drop_user_local(user_id: int):
+    global _global_stamp
+    with _stamps_lock:
+        _stamps[user_id] = _stamps.pop(user_id, 0) + 1
+        if len(_stamps) > settings.L1_CACHE_SIZE:
+            for _ in range(len(_stamps) // 2):
+                _stamps.popitem(last=False)
+            _global_stamp += 1
+    _demote(rec_l1.pop_where(lambda key: key[0] == user_id))
+
+
+def drop_local_user(user_id: int):
+    """Drops one user's L1 entries on this worker only (no Redis round trip)."""
+    _drop_user_local(user_id)
+
+
+def _drop_all_local():
+    global _global_stamp
+    _global_stamp += 1
+    _demote(rec_l1.pop_where(lambda key: True))
+    catalog_l1.clear()
+
+
+def _publish(message: dict):
+    try:
+        redis_client.publish(INVALIDATION_CHANNEL, json.dumps(message))
+    except Exception as e:
+        log.warning("Cache", f"⚠️ Redis Publish Error: {e}")
+
+
+def invalidate_user(user_id: int):
+    """O(1) invalidation of every cached list for one user (Like/Unlike/Pref change)."""
+    _drop_user_local(user_id)
+    if not redis_client:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.incr(generation_key(user_id))
+        pipe.set(invalidated_key(user_id), time.time(), ex=max(CACHE_TTLS.values()) + settings.STALE_GRACE_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        log.warning("Cache", f"⚠️ Redis Invalidation Error: {e}")
+    _publish({"type": "user", "user_id": user_id})
+
+
+def bump_epoch():
+    """O(1) invalidation of every user's cache (graph reload, new embeddings)."""
+    _drop_all_local()
+    if not redis_client:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.incr(EPOCH_KEY)
+        pipe.set(EPOCH_AT_KEY, time.time())
+        pipe.execute()
+    except Exception as e:
+        log.warning("Cache", f"⚠️ Redis Epoch Error: {e}")
+    _publish({"type": "epoch"})
+
+
+_catalog_listeners = []
+
+
+def on_catalog_change(fn):
+    """Registers fn() to run on this worker whenever any worker invalidates the catalog."""
+    _catalog_listeners.append(fn)
+
+
+def _catalog_changed():
+    catalog_l1.clear()
+    for fn in _catalog_listeners:
+        fn()
+
+
+def invalidate_catalog():
+    """Drops the catalog L1 on every worker (items added or renamed)."""
+    _catalog_changed()
+    if redis_client:
+        _publish({"type": "catalog"})
+
+
+def invalidate_profile(uuid: str):
+    """Drops a uuid -> user_id mapping on every worker (registration / reconciliation)."""
+    profile_l1.pop(uuid)
+    if redis_client:
+        _publish({"type": "profile", "uuid": uuid})
+
+
+def _handle_message(raw: str):
+    message = json.loads(raw)
+    if message["type"] == "profile":
+        profile_l1.pop(message["uuid"])
+    elif message["type"] == "user":
+        _drop_user_local(int(message["user_id"]))
+    elif message["type"] == "epoch":
+        _drop_all_local()
+    elif message["type"] == "catalog":
+        _catalog_changed()
+
+
+_listener_stop = threading.Event()
+
+
+def _listen_loop():
+    while not _listener_stop.is_set():
+        pubsub = None
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything published while we were disconnected is lost; start clean
+            _drop_all_local()
+            while not _listener_stop.is_set():
+                msg = pubsub.get_message(timeout=1.0)
+                if msg and msg.get("type") == "message":
+                    _handle_message(msg["data"])
+        except Exception as e:
+            log.warning("Cache", f"⚠️ Cache Listener Error: {e}")
+            _listener_stop.wait(5)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+def start_invalidation_listener():
+    """Subscribes this worker to cross-worker L1 invalidations."""
+    if not redis_client:
+        return None
+    _listener_stop.clear()
+    thread = threading.Thread(target=_listen_loop, name="cache-invalidation", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_invalidation_listener():
+    _listener_stop.set()
+
+
+def stats() -> dict:
+    return {
+        "l1": rec_l1.stats(),
+        "l1_stale": stale_l1.stats(),
+        "l1_catalog": catalog_l1.stats(),
+        "l1_profile": profile_l1.stats(),
+        "l2": dict(l2_stats),
+        "single_flight": {**flights.stats(), "redis_lock": dict(lock_stats)},
+    }
@@ -0,0 +1,205 @@
+"""
+Interaction change stream for multi-replica engine sync.
+
+Each container holds a private in-memory Engine. Every Like/Unlike (and bulk
+import) is XADDed to one ordered Redis stream after it is applied locally, and
+a tail thread on every replica XREADs the stream from its own offset and
+applies each entry to its engine. Replicas apply their own entries too: adds
+and removes are idempotent, so replaying everything in stream order makes a
+concurrent Like on one replica and Unlike on another end the same way
+everywhere. Preference changes are published as well; they live in SQL, so
+applying one only drops this worker's cached lists.
+
+The consumer offset is written to a Redis hash (per REPLICA_ID) as it advances
+and saved with the graph snapshot at shutdown. At startup the tail resumes from
+the snapshot's offset, replaying whatever landed after the snapshot that the
+SQL sync cannot see (removes, and write-behind entries not yet flushed). With no
+snapshot it starts from position() taken before the SQL load, moved back by
+CHANGESTREAM_REPLAY_MS to cover writes still in the write-behind queues, rather
+than from the start of the retained stream (which would re-add edges that
+retention pruned). Applying an entry drops this worker's cached lists for the user.
+"""
+import threading
+import time
+
+from app.config import settings
+from app.core import cache, log
+from app.utils.redis import redis_client
+
+OP_ADD = "add"
+OP_REMOVE = "remove"
+OP_PREFS = "prefs"
+OFFSETS_KEY = settings.CHANGESTREAM_KEY + ":offsets"
+
+_offset = None  # last stream id applied to this engine
+_engine = None
+_thread = None
+_stop = threading.Event()
+
+stream_stats = {
+    "published": 0, "publish_errors": 0, "applied": 0, "apply_errors": 0,
+    "gaps": 0, "last_lag_ms": None, "max_lag_ms": 0,
+}
+
+
+def enabled() -> bool:
+    return settings.CHANGESTREAM_ENABLED and redis_client is not None
+
+
+def _xadd(pipe, fields: dict):
+    return pipe.xadd(settings.CHANGESTREAM_KEY, fields, maxlen=settings.CHANGESTREAM_MAXLEN, approximate=True)
+
+
+def _publish(fields: dict):
+    """Failures are logged, not raised: the local engine is already updated."""
+    if not enabled():
+        return None
+    try:
+        entry_id = _xadd(redis_client, fields)
+        stream_stats["published"] += 1
+        return entry_id
+    except Exception as e:
+        stream_stats["publish_errors"] += 1
+        log.warning("Stream", f"⚠️ Change Stream Publish Error: {e}")
+        return None
+
+
+def publish(op: str, user_id: int, item_id: int, ts: int = 0):
+    """Appends one Like/Unlike."""
+    return _publish({"op": op, "user_id": user_id, "item_id": item_id, "ts": ts})
+
+
+def publish_prefs(user_id: int, genre_names: list):
+    return _publish({"op": OP_PREFS, "user_id": user_id, "genres": ",".join(genre_names)})
+
+
+def publish_edges(edges: list):
+    """Appends (user_id, item_id, timestamp) adds in pipelined batches (bulk import)."""
+    if not enabled() or not edges:
+        return
+    try:
+        for start in range(0, len(edges), settings.CHANGESTREAM_BATCH):
+            pipe = redis_client.pipeline(transaction=False)
+            for user_id, item_id, ts in edges[start:start + settings.CHANGESTREAM_BATCH]:
+                _xadd(pipe, {"op": OP_ADD, "user_id": user_id, "item_id": item_id, "ts": ts})
+            pipe.execute()
+        stream_stats["published"] += len(edges)
+    except Exception as e:
+        stream_stats["publish_errors"] += 1
+        log.warning("Stream", f"⚠️ Change Stream Publish Error ({len(edges)} edges): {e}")
+
+
+def _apply(engine, fields: dict):
+    op = fields.get("op")
+    user_id = int(fields["user_id"])
+    if op == OP_ADD:
+        if hasattr(engine, "add_interaction"):
+            engine.add_interaction(user_id, int(fields["item_id"]), int(fields["ts"]))
+    elif op == OP_REMOVE:
+        if hasattr(engine, "remove_interaction"):
+            engine.remove_interaction(user_id, int(fields["item_id"]))
+    # Lists computed before the edge landed here are stale on this worker
+    cache.drop_local_user(user_id)
+
+
+def _id_tuple(entry_id: str):
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _check_gap(start: str):
+    """Warns when entries after `start` were trimmed (MAXLEN) before this replica read them."""
+    if start in ("0", "0-0", "$"):
+        return
+    try:
+        trimmed = redis_client.xinfo_stream(settings.CHANGESTREAM_KEY).get("max-deleted-entry-id")
+    except Exception:
+        return  # no stream yet, or Redis < 7 (no trim watermark to compare against)
+    if trimmed and _id_tuple(trimmed) > _id_tuple(start):
+        stream_stats["gaps"] += 1
+        log.warning("Stream", f"⚠️ Entries after {start} up to {trimmed} were trimmed; "
+                              f"this replica needs a full resync to catch up.")
+
+
+def _loop():
+    global _offset
+    checked = False
+    while not _stop.is_set():
+        try:
+            if not checked:
+                _check_gap(_offset)
+                checked = True
+            response = redis_client.xread(
+                {settings.CHANGESTREAM_KEY: _offset},
+                count=settings.CHANGESTREAM_BATCH,
+                block=settings.CHANGESTREAM_BLOCK_MS,
+            )
+            if not response:
+                continue
+            caught_up = True
+            for _, entries in response:
+                caught_up = caught_up and len(entries) < settings.CHANGESTREAM_BATCH
+                for entry_id, fields in entries:
+                    try:
+                        _apply(_engine, fields)
+                        stream_stats["applied"] += 1
+                    except Exception as e:
+                        stream_stats["apply_errors"] += 1
+                        log.warning("Stream", f"⚠️ Change Stream Apply Error ({entry_id}): {e}")
+                    _offset = entry_id
+
+            if caught_up:  # publish -> apply latency (not measured while replaying a backlog)
+                lag_ms = max(0, int(time.time() * 1000) - _id_tuple(_offset)[0])
+                stream_stats["last_lag_ms"] = lag_ms
+                stream_stats["max_lag_ms"] = max(stream_stats["max_lag_ms"], lag_ms)
+            redis_client.hset(OFFSETS_KEY, settings.REPLICA_ID, _offset)
+        except Exception as e:
+            log.warning("Stream", f"⚠️ Change Stream Tail Error: {e}")
+            _stop.wait(1.0)
+
+
+def offset():
+    """Last applied stream id; saved with the snapshot as its watermark."""
+    return _offset
+
+
+def position(replay_ms: int = 0):
+    """
+    Stream id of "now" minus replay_ms on the Redis clock (entry ids are Redis time),
+    to take before the SQL load; None when the stream is off or Redis is unreachable.
+    """
+    if not enabled():
+        return None
+    try:
+        seconds, micros = redis_client.time()
+    except Exception:
+        return None
+    # One ms early: XREAD returns ids after this one, and replaying an entry is harmless
+    return f"{max(0, seconds * 1000 + micros // 1000 - replay_ms - 1)}-0"
+
+
+def start(engine, from_offset: str = None):
+    """
+    Tails the stream from from_offset (the snapshot watermark, or position() taken
+    before the SQL load), or from the current end of the stream when there is none.
+    """
+    global _engine, _offset, _thread
+    if not enabled():
+        return None
+    _engine = engine
+    _offset = from_offset or position() or "$"
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="change-stream", daemon=True)
+    _thread.start()
+    log.info("Stream", f"Tailing {settings.CHANGESTREAM_KEY} from {_offset} as {settings.REPLICA_ID}")
+    return _thread
+
+
+def stop(timeout: float = 5.0):
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout)
+
+
+def stats() -> dict:
+    return {**stream_stats, "enabled": enabled(), "replica": settings.REPLICA_ID, "offset": _offset}
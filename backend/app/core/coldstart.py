@@ -0,0 +1,132 @@
+"""
+Precomputed genre-segmented cold-start lists.
+
+Users without history used to fall straight through to global trending, with
+their genre preferences ignored. A background thread ranks every catalog item
+by a time-decayed interaction score (the engine's 1 / (1 + 0.05 * days)) and
+keeps a top-N list for each genre and each combination of up to
+COLDSTART_MAX_COMBO genres, so a cold-start request is one dict lookup on the
+user's preference set. Rebuilt every COLDSTART_REFRESH_SECONDS and whenever the
+catalog changes.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core import cache, log
+from app.db import crud, models
+from app.db.session import SessionLocal
+
+DECAY_ALPHA = 0.05  # per day, same as the C++ engine
+
+_ranked = {}  # genre_id -> [(-score, item_id), ...] best first
+_lists = {}  # frozenset(genre_ids) -> [item_id, ...]
+_wake = threading.Event()
+_stop = threading.Event()
+
+coldstart_stats = {"builds": 0, "hits": 0, "merged": 0, "misses": 0, "errors": 0, "built_at": None}
+
+
+def item_scores(db: Session) -> dict:
+    """item_id -> sum of decayed interaction weights, aggregated in SQL."""
+    now = int(time.time())
+    days = (now - models.Interaction.timestamp) / 86400.0
+    rows = (
+        db.query(models.Interaction.item_id, func.sum(1.0 / (1.0 + DECAY_ALPHA * days)))
+        .group_by(models.Interaction.item_id)
+        .all()
+    )
+    return {item_id: float(score or 0.0) for item_id, score in rows}
+
+
+def build(db: Session):
+    """Recomputes every list and swaps them in atomically."""
+    scores = item_scores(db)
+    top_n = settings.COLDSTART_TOP_N
+
+    # 1. PER-GENRE RANKING (items without interactions rank last, by id)
+    by_genre = defaultdict(list)
+    for item_id, category in db.query(models.Item.id, models.Item.category):
+        genre_id = crud.get_genre_id(category)
+        if genre_id:
+            by_genre[genre_id].append((-scores.get(item_id, 0.0), item_id))
+    ranked = {g: heapq.nsmallest(top_n, entries) for g, entries in by_genre.items()}
+
+    # 2. COMBINATIONS (an item has one genre, so a combo's top-N is within its genres' top-N)
+    lists = {}
+    genre_ids = sorted(ranked)
+    for size in range(1, min(settings.COLDSTART_MAX_COMBO, len(genre_ids)) + 1):
+        for combo in itertools.combinations(genre_ids, size):
+            merged = heapq.merge(*(ranked[g] for g in combo))
+            lists[frozenset(combo)] = [item_id for _, item_id in itertools.islice(merged, top_n)]
+
+    global _ranked, _lists
+    _ranked, _lists = ranked, lists
+    coldstart_stats["builds"] += 1
+    coldstart_stats["built_at"] = int(time.time())
+
+
+def lookup(pref_ids: list) -> list:
+    """Top items across the user's preferred genres, best first ([] if none are known)."""
+    ranked, lists = _ranked, _lists  # one consistent build even if a rebuild swaps them
+    key = frozenset(g for g in pref_ids if g in ranked)
+    if not key:
+        coldstart_stats["misses"] += 1
+        return []
+    items = lists.get(key)
+    if items is not None:
+        coldstart_stats["hits"] += 1
+        return items
+
+    # More genres than precomputed combos: merge the per-genre lists (bounded by N x genres)
+    coldstart_stats["merged"] += 1
+    merged = heapq.merge(*(ranked[g] for g in key))
+    return [item_id for _, item_id in itertools.islice(merged, settings.COLDSTART_TOP_N)]
+
+
+def refresh():
+    db = SessionLocal()
+    try:
+        build(db)
+    except Exception as e:
+        coldstart_stats["errors"] += 1
+        log.warning("ColdStart", f"⚠️ Cold-Start Build Error: {e}")
+    finally:
+        db.close()
+
+
+def request_refresh():
+    """Wakes the builder now instead of at the next interval."""
+    _wake.set()
+
+
+cache.on_catalog_change(request_refresh)
+
+
+def _loop():
+    while not _stop.is_set():
+        refresh()
+        _wake.wait(settings.COLDSTART_REFRESH_SECONDS)
+        _wake.clear()
+
+
+def start():
+    _stop.clear()
+    thread = threading.Thread(target=_loop, name="coldstart-builder", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop():
+    _stop.set()
+    _wake.set()
+
+
+def stats() -> dict:
+    return {**coldstart_stats, "lists": len(_lists)}
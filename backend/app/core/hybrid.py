@@ -0,0 +1,133 @@
+"""
+Hybrid blended recommendations.
+
+BFS, PPR and GraphSAGE run concurrently on a small thread pool (the C++ calls
+release the GIL, GraphSAGE scoring is mostly numpy). Each generator's scores
+are min-max normalized to [0, 1] and summed with HYBRID_WEIGHTS. All three
+share one deadline: BFS/PPR get it as their anytime budget, GraphSAGE checks
+it between steps, and a generator still running when it passes is dropped from
+the blend. A blend that would not find a free pool thread for each generator
+(late ones still finishing) is refused with Overloaded, so callers degrade
+instead of queueing behind them.
+"""
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from app.config import settings
+from app.core import log
+from app.core.admission import Overloaded
+from app.core.recommender import PPR_DEPTH, PPR_WALKS, get_engine
+from app.ml.graphsage_serving import DeadlineExceeded, rank_graphsage
+
+
+def _parse_weights(spec: str) -> dict:
+    weights = {}
+    for part in spec.split(","):
+        algo, weight = part.split("=")
+        weights[algo.strip()] = float(weight)
+    return weights
+
+
+WEIGHTS = {algo: w for algo, w in _parse_weights(settings.HYBRID_WEIGHTS).items() if w > 0}
+
+_pool = ThreadPoolExecutor(max_workers=settings.HYBRID_WORKERS, thread_name_prefix="hybrid")
+_busy = 0  # generators submitted and not finished (including ones dropped by their blend)
+_busy_lock = threading.Lock()
+
+hybrid_stats = {"blends": 0, "rejected": 0, **{f"dropped_{algo}": 0 for algo in WEIGHTS}, "errors": 0}
+
+
+def normalize(scores: list) -> list:
+    """Min-max to [0, 1]; a flat list (incl. a single candidate) maps to all 1.0."""
+    if not scores:
+        return []
+    lo, hi = min(scores), max(scores)
+    if hi == lo:
+        return [1.0] * len(scores)
+    return [(s - lo) / (hi - lo) for s in scores]
+
+
+def _bfs(user_id, n, pref_ids, seen_ids, item_map, budget_us, deadline):
+    result = get_engine().recommend_anytime(user_id, n, pref_ids, budget_us)
+    return result.items, result.scores, result.completed
+
+
+def _ppr(user_id, n, pref_ids, seen_ids, item_map, budget_us, deadline):
+    result = get_engine().recommend_ppr_anytime(user_id, n, PPR_WALKS, PPR_DEPTH, budget_us)
+    return result.items, result.scores, result.completed
+
+
+def _graphsage(user_id, n, pref_ids, seen_ids, item_map, budget_us, deadline):
+    items, scores = rank_graphsage(item_map, seen_ids, n, deadline)
+    return items, scores, True
+
+
+GENERATORS = {"bfs": _bfs, "ppr": _ppr, "graphsage": _graphsage}
+
+
+def _release(_future):
+    global _busy
+    with _busy_lock:
+        _busy -= 1
+
+
+def _reserve(count: int):
+    """Claims pool threads for one blend, or raises Overloaded when they are all taken."""
+    global _busy
+    with _busy_lock:
+        if _busy + count > settings.HYBRID_WORKERS:
+            hybrid_stats["rejected"] += 1
+            raise Overloaded("hybrid", "pool saturated")
+        _busy += count
+
+
+def blend(user_id: int, n: int, pref_ids: list, seen_ids: set, item_map: dict, budget_ms: float):
+    """
+    Returns (top-n item ids, generators that finished complete, generators started).
+    seen_ids/item_map are passed in so no worker touches the request's DB session.
+    """
+    deadline = time.perf_counter() + budget_ms / 1000.0
+    budget_us = max(1, int(budget_ms * 1000))
+
+    # 1. FAN OUT (only onto idle threads)
+    algos = [algo for algo in WEIGHTS if algo in GENERATORS]
+    _reserve(len(algos))
+    futures = {}
+    for algo in algos:
+        future = _pool.submit(GENERATORS[algo], user_id, n, pref_ids, seen_ids, item_map, budget_us, deadline)
+        future.add_done_callback(_release)
+        futures[future] = algo
+    done, late = wait(futures, timeout=max(0.0, deadline - time.perf_counter()))
+    hybrid_stats["blends"] += 1
+
+    # 2. DROP WHAT MISSED THE DEADLINE (each generator stops at it on its own; the result is discarded)
+    for future in late:
+        future.cancel()
+        hybrid_stats[f"dropped_{futures[future]}"] += 1
+
+    # 3. NORMALIZE + WEIGHTED MERGE
+    blended = defaultdict(float)
+    finished = 0
+    for future in done:
+        algo = futures[future]
+        try:
+            items, scores, completed = future.result()
+        except DeadlineExceeded:
+            hybrid_stats[f"dropped_{algo}"] += 1
+            continue
+        except Exception as e:
+            hybrid_stats["errors"] += 1
+            log.warning("Hybrid", f"⚠️ Hybrid {algo} Error: {e}")
+            continue
+        finished += completed
+        for item_id, score in zip(items, normalize(list(scores))):
+            blended[item_id] += WEIGHTS[algo] * score
+
+    ranked = sorted(blended, key=blended.get, reverse=True)
+    return ranked[:n], finished, len(futures)
+
+
+def stats() -> dict:
+    return {"weights": WEIGHTS, **hybrid_stats, "busy": _busy, "workers": settings.HYBRID_WORKERS}
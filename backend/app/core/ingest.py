@@ -0,0 +1,621 @@
+"""
+Write-behind interaction ingestion.
+
+Like/Unlike are acknowledged once they are durably appended to a log (a Redis
+stream, or a local fsync'd append-only file when Redis is unavailable) and
+applied to the in-memory graph. A flusher thread writes them to SQL in group
+commits: the last operation per (user, item) wins, adds become multi-row
+INSERT ... ON CONFLICT DO NOTHING and removes a single DELETE, all in one
+transaction. Until its batch lands, overlay() lets reads see a user's own
+writes (from any worker, with Redis).
+
+Each worker owns its log: the stream ingest:interactions:<REPLICA_ID>:<pid>
+(kept alive by a heartbeat key, refreshed on its own thread so a stalled flush
+can't let it lapse), or a WAL file held with flock. Logs whose owner is gone
+are replayed into SQL by another worker, at startup before the graph sync and
+then periodically. The adopter removes only the entries it replayed, and
+nothing if the owner's heartbeat has come back.
+
+Appends are serialized so the log, the queue and the overlay see the same
+order, but the XADD round trip doesn't hold the queue lock the flusher takes;
+WAL fsyncs are grouped, one covering every line written before it. A batch that
+keeps failing while the database is reachable is split, and the rows that
+still fail are moved to a dead-letter log instead of being retried forever.
+"""
+import collections
+import fcntl
+import glob
+import itertools
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.core import log
+from app.db import crud
+from app.db.session import SessionLocal
+from app.utils.redis import redis_client
+
+try:
+    from prometheus_client import Gauge, Histogram
+
+    FLUSH_SECONDS = Histogram(
+        "graphrec_ingest_flush_seconds",
+        "Write-behind batch flush latency",
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    )
+    QUEUE_DEPTH = Gauge("graphrec_ingest_queue_depth", "Interactions acknowledged but not yet in SQL")
+except ImportError:
+    FLUSH_SECONDS = QUEUE_DEPTH = None
+
+OP_ADD = "add"
+OP_REMOVE = "remove"
+STREAM_KEY = "ingest:interactions"           # + ":<worker>" per worker
+WORKERS_KEY = "ingest:workers"               # worker ids that may own a stream
+ALIVE_KEY = "ingest:alive:"                  # + worker id, expires without heartbeats
+ADOPT_KEY = "ingest:adopt:"                  # + worker id, held while its stream is replayed
+PENDING_KEY = "ingest:pending:"              # + user id -> {item_id: "op:token"} until flushed
+DEAD_LETTER_KEY = "ingest:deadletter"
+PENDING_TTL = 86400
+WORKER_ID = f"{settings.REPLICA_ID}:{os.getpid()}"
+
+
+class Backpressure(Exception):
+    """The pending queue stayed full for INGEST_BACKPRESSURE_MS."""
+
+
+class FileLog:
+    """
+    Append-only JSON lines; the current segment is sealed into '.flushing' per batch.
+    Owned through an flock on '<path>.lock'; a second worker on the same host uses
+    '<path>.<pid>'. Lines are written under the ingest lock and fsync'd in groups.
+    """
+
+    name = "file"
+
+    def __init__(self, base: str):
+        self.base = base
+        self.path, self._owner = self._claim(base)
+        self.flushing_path = self.path + ".flushing"
+        self.dead_path = self.path + ".dead"
+        self._f = open(self.path, "a", encoding="utf-8")
+        self._sync_lock = threading.Lock()
+        self._written = 0  # lines written (all segments)
+        self._synced = 0   # lines known to be on disk
+
+    @staticmethod
+    def _try_lock(path: str):
+        f = open(path, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return f
+        except OSError:
+            f.close()
+            return None
+
+    def _claim(self, base: str):
+        owner = self._try_lock(base + ".lock")
+        if owner is not None:
+            return base, owner
+        path = f"{base}.{os.getpid()}"
+        return path, self._try_lock(path + ".lock")
+
+    @staticmethod
+    def _read(*paths) -> list:
+        entries = []
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    entries.extend(json.loads(line) for line in f if line.strip())
+        return entries
+
+    def append(self, entry: dict):
+        return None
+
+    def write(self, entry: dict) -> int:
+        """Called under the ingest lock, so lines and seal() stay in queue order."""
+        self._f.write(json.dumps(entry) + "\n")
+        self._f.flush()
+        self._written += 1
+        return self._written
+
+    def sync(self, ticket: int):
+        """Returns once line `ticket` is on disk; one fsync covers every waiter before it."""
+        with self._sync_lock:
+            if self._synced >= ticket:
+                return
+            target = self._written
+            os.fsync(self._f.fileno())
+            self._synced = target
+
+    def seal(self):
+        """Called under the ingest lock right after the queue is drained."""
+        with self._sync_lock:
+            os.fsync(self._f.fileno())
+            self._synced = self._written
+            self._f.close()
+            os.replace(self.path, self.flushing_path)
+            self._f = open(self.path, "a", encoding="utf-8")
+
+    def ack(self, batch: list):
+        if os.path.exists(self.flushing_path):
+            os.remove(self.flushing_path)
+
+    def pending(self) -> list:
+        return self._read(self.flushing_path, self.path)
+
+    def ack_pending(self, entries: list):
+        self.ack(entries)
+        self._f.truncate(0)
+
+    def orphans(self):
+        """(entries, release) for each WAL beside ours whose owner no longer holds its lock."""
+        for lock_path in glob.glob(self.base + ".lock") + glob.glob(self.base + ".*.lock"):
+            path = lock_path[:-len(".lock")]
+            if path == self.path:
+                continue
+            owner = self._try_lock(lock_path)
+            if owner is None:
+                continue
+
+            def release(path=path, owner=owner, lock_path=lock_path):
+                for leftover in (path, path + ".flushing"):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                os.remove(lock_path)
+                owner.close()
+
+            yield self._read(path + ".flushing", path), release
+
+    def heartbeat(self):
+        pass  # the flock lasts as long as the process
+
+    def close(self):
+        pass
+
+    def shared_pending(self, user_id: int):
+        return None  # one process per WAL: the local overlay is complete
+
+    def settle(self, batch: list):
+        pass
+
+    def dead_letter(self, entries: list, error: str):
+        with open(self.dead_path, "a", encoding="utf-8") as f:
+            for e in entries:
+                f.write(json.dumps({**e, "error": error}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class RedisStreamLog:
+    """
+    XADD to this worker's stream, XDEL once flushed. The same transaction records
+    the op in the user's pending hash, which every worker's overlay() reads.
+    """
+
+    name = "redis"
+
+    SETTLE_LUA = """
+    for i, key in ipairs(KEYS) do
+        if redis.call('HGET', key, ARGV[2 * i - 1]) == ARGV[2 * i] then
+            redis.call('HDEL', key, ARGV[2 * i - 1])
+        end
+    end
+    return 0
+    """
+
+    # Drops what the adopter replayed (ids below ARGV[1]) unless the owner came back;
+    # the worker is forgotten only once its stream is empty
+    RELEASE_LUA = """
+    redis.call('DEL', KEYS[4])
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return 0
+    end
+    redis.call('XTRIM', KEYS[2], 'MINID', ARGV[1])
+    if redis.call('XLEN', KEYS[2]) == 0 then
+        redis.call('DEL', KEYS[2])
+        redis.call('SREM', KEYS[3], ARGV[2])
+    end
+    return 1
+    """
+
+    def __init__(self, worker_id: str = WORKER_ID):
+        self.worker_id = worker_id
+        self.stream = f"{STREAM_KEY}:{worker_id}"
+        self._settle = redis_client.register_script(self.SETTLE_LUA)
+        self._release = redis_client.register_script(self.RELEASE_LUA)
+        self.heartbeat()
+
+    @staticmethod
+    def _token(entry: dict) -> str:
+        return f"{entry['op']}:{entry['token']}"
+
+    def append(self, entry: dict):
+        entry["token"] = f"{self.worker_id}:{entry['seq']}"
+        fields = {key: entry[key] for key in ("op", "user_id", "item_id", "ts", "token")}
+        pending = f"{PENDING_KEY}{entry['user_id']}"
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.xadd(self.stream, fields)
+        pipe.hset(pending, entry["item_id"], self._token(entry))
+        pipe.expire(pending, PENDING_TTL)
+        return pipe.execute()[0]
+
+    def write(self, entry: dict):
+        return None
+
+    def sync(self, ticket):
+        pass
+
+    def seal(self):
+        pass
+
+    def ack(self, batch: list, stream: str = None):
+        ids = [e["log_id"] for e in batch if e.get("log_id")]
+        for start in range(0, len(ids), crud.BULK_CHUNK):
+            redis_client.xdel(stream or self.stream, *ids[start:start + crud.BULK_CHUNK])
+
+    @staticmethod
+    def _read(stream: str) -> list:
+        return [
+            {"op": f["op"], "user_id": int(f["user_id"]), "item_id": int(f["item_id"]), "ts": int(f["ts"]),
+             "token": f.get("token"), "log_id": log_id}
+            for log_id, f in redis_client.xrange(stream)
+        ]
+
+    def pending(self) -> list:
+        return self._read(self.stream)
+
+    def ack_pending(self, entries: list):
+        self.ack(entries)
+
+    def orphans(self):
+        """(entries, release) for each worker whose heartbeat lapsed; claimed so only one worker replays it."""
+        for worker_id in redis_client.smembers(WORKERS_KEY):
+            if worker_id == self.worker_id or redis_client.exists(ALIVE_KEY + worker_id):
+                continue
+            if not redis_client.set(ADOPT_KEY + worker_id, self.worker_id, nx=True, px=settings.INGEST_OWNER_TTL_MS):
+                continue
+            stream = f"{STREAM_KEY}:{worker_id}"
+            entries = self._read(stream)
+            ms, _, seq = entries[-1]["log_id"].partition("-") if entries else ("0", "", "0")
+
+            def release(stream=stream, worker_id=worker_id, min_id=f"{ms}-{int(seq) + 1}"):
+                self._release(keys=[ALIVE_KEY + worker_id, stream, WORKERS_KEY, ADOPT_KEY + worker_id],
+                              args=[min_id, worker_id])
+
+            yield entries, release
+
+    def heartbeat(self):
+        """Re-registers this worker too, in case a peer adopted it during a stall and forgot it."""
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.sadd(WORKERS_KEY, self.worker_id)
+        pipe.set(ALIVE_KEY + self.worker_id, 1, px=settings.INGEST_OWNER_TTL_MS)
+        pipe.execute()
+
+    def close(self):
+        """Clean shutdown: give up the (drained) stream so nobody waits for the heartbeat to lapse."""
+        if redis_client.xlen(self.stream):
+            return  # unflushed entries: adopted once the heartbeat lapses
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.delete(self.stream, ALIVE_KEY + self.worker_id)
+        pipe.srem(WORKERS_KEY, self.worker_id)
+        pipe.execute()
+
+    def shared_pending(self, user_id: int):
+        """{item_id: op} for every worker's unflushed writes of this user."""
+        raw = redis_client.hgetall(f"{PENDING_KEY}{user_id}")
+        return {int(item_id): value.split(":", 1)[0] for item_id, value in raw.items()}
+
+    def settle(self, batch: list):
+        """Clears the batch's pending-hash fields unless a later write replaced them."""
+        marks = [e for e in batch if e.get("token")]
+        for start in range(0, len(marks), crud.BULK_CHUNK):
+            chunk = marks[start:start + crud.BULK_CHUNK]
+            args = []
+            for e in chunk:
+                args += [e["item_id"], self._token(e)]
+            self._settle(keys=[f"{PENDING_KEY}{e['user_id']}" for e in chunk], args=args)
+
+    def dead_letter(self, entries: list, error: str):
+        for e in entries:
+            redis_client.xadd(DEAD_LETTER_KEY, {
+                "op": e["op"], "user_id": e["user_id"], "item_id": e["item_id"], "ts": e["ts"],
+                "worker": self.worker_id, "error": error[:500],
+            }, maxlen=100000, approximate=True)
+
+
+_lock = threading.Condition()
+_append_lock = threading.Lock()  # seq + log append, so the log is in seq (and queue) order
+_queue = collections.deque()
+_overlay = collections.defaultdict(dict)  # user_id -> {item_id: (seq, op)}
+_seq = itertools.count(1)
+_log = None
+_thread = None
+_beat_thread = None
+_wake = threading.Event()
+_stop = threading.Event()
+_beat_stop = threading.Event()
+
+ingest_stats = {
+    "accepted": 0, "rejected": 0, "flushed": 0, "batches": 0, "errors": 0, "replayed": 0,
+    "adopted": 0, "dead_lettered": 0,
+    "last_flush_ms": 0.0, "max_flush_ms": 0.0, "inflight": 0,
+}
+
+
+def _open_log():
+    if settings.INGEST_LOG == "redis" or (settings.INGEST_LOG == "auto" and redis_client):
+        return RedisStreamLog()
+    return FileLog(settings.INGEST_WAL_PATH)
+
+
+def enabled() -> bool:
+    return _log is not None
+
+
+def write_batch(entries: list):
+    """Collapses entries to the last op per pair and applies them in one transaction."""
+    last = {}
+    for e in entries:
+        last[(e["user_id"], e["item_id"])] = e
+    adds = [
+        {"user_id": u, "item_id": i, "timestamp": e["ts"]}
+        for (u, i), e in last.items() if e["op"] == OP_ADD
+    ]
+    removes = [pair for pair, e in last.items() if e["op"] == OP_REMOVE]
+
+    db = SessionLocal()
+    try:
+        crud.apply_interaction_batch(db, adds, removes)
+    finally:
+        db.close()
+
+
+def adopt_orphans() -> int:
+    """Replays the logs of workers that are gone into SQL; returns the entries written."""
+    count = 0
+    for entries, release in _log.orphans():
+        if entries:
+            write_batch(entries)
+            _log.settle(entries)
+        release()
+        count += len(entries)
+    if count:
+        ingest_stats["adopted"] += count
+        log.info("Ingest", f"✅ Replayed {count} interactions left by stopped workers ({_log.name} log).")
+    return count
+
+
+def _beat_loop():
+    while not _beat_stop.wait(settings.INGEST_OWNER_TTL_MS / 3000.0):
+        try:
+            _log.heartbeat()
+        except Exception as e:
+            log.warning("Ingest", f"⚠️ Heartbeat failed: {e}")
+
+
+def _start_heartbeat():
+    """Keeps this worker's log owned on its own thread, so a stalled flush can't let it lapse."""
+    global _beat_thread
+    _beat_stop.clear()
+    _beat_thread = threading.Thread(target=_beat_loop, name="ingest-heartbeat", daemon=True)
+    _beat_thread.start()
+
+
+def recover():
+    """Writes entries left by previous runs / dead workers to SQL. Call before the graph sync."""
+    global _log
+    if not settings.INGEST_WRITE_BEHIND:
+        return 0
+    _log = _open_log()
+    _start_heartbeat()
+    replayed = adopt_orphans()
+    entries = _log.pending()
+    if entries:
+        write_batch(entries)
+        _log.ack_pending(entries)
+        _log.settle(entries)
+        ingest_stats["replayed"] += len(entries)
+        log.info("Ingest", f"✅ Replayed {len(entries)} unflushed interactions ({_log.name} log).")
+    return replayed + len(entries)
+
+
+def _admit():
+    """Waits (under _lock) for room in the queue, or raises Backpressure."""
+    if len(_queue) >= settings.INGEST_MAX_PENDING:
+        _wake.set()
+        if not _lock.wait_for(lambda: len(_queue) < settings.INGEST_MAX_PENDING,
+                              timeout=settings.INGEST_BACKPRESSURE_MS / 1000.0):
+            ingest_stats["rejected"] += 1
+            raise Backpressure()
+
+
+def submit(op: str, user_id: int, item_id: int) -> int:
+    """Durably logs one Like/Unlike and queues it for SQL. Returns its timestamp."""
+    with _lock:
+        _admit()
+
+    with _append_lock:
+        # 1. LOG (Redis round trip; the flusher's queue lock is not held)
+        entry = {"op": op, "user_id": user_id, "item_id": item_id, "ts": int(time.time()), "seq": next(_seq)}
+        entry["log_id"] = _log.append(entry)
+
+        # 2. QUEUE (+ WAL line, which must stay in order with seal()), in the log's order
+        with _lock:
+            ticket = _log.write(entry)
+            _queue.append(entry)
+            _overlay[user_id][item_id] = (entry["seq"], op)
+            ingest_stats["accepted"] += 1
+            depth = len(_queue)
+
+    # 3. FSYNC (grouped with concurrent writers)
+    _log.sync(ticket)
+    if depth >= settings.INGEST_BATCH_SIZE:
+        _wake.set()
+    return entry["ts"]
+
+
+def overlay(user_id: int, item_ids: set) -> set:
+    """Applies the user's not-yet-flushed Likes/Unlikes (any worker's, with Redis) to a set read from SQL."""
+    pending = None
+    if _log is not None:
+        try:
+            pending = _log.shared_pending(user_id)
+        except Exception:
+            pending = None  # Redis hiccup: this worker's writes only
+    if pending is None:
+        pending = {item_id: op for item_id, (_, op) in list(_overlay.get(user_id, {}).items())}
+    if not pending:
+        return item_ids
+    item_ids = set(item_ids)
+    for item_id, op in pending.items():
+        if op == OP_ADD:
+            item_ids.add(item_id)
+        else:
+            item_ids.discard(item_id)
+    return item_ids
+
+
+def _settle(batch: list):
+    """Drops overlay entries that this batch made visible in SQL (unless superseded)."""
+    with _lock:
+        for e in batch:
+            pending = _overlay.get(e["user_id"])
+            if pending and pending.get(e["item_id"], (None,))[0] == e["seq"]:
+                del pending[e["item_id"]]
+                if not pending:
+                    del _overlay[e["user_id"]]
+    _log.settle(batch)
+
+
+def _flush(batch: list):
+    start = time.perf_counter()
+    write_batch(batch)
+    _log.ack(batch)
+    _settle(batch)
+    elapsed = time.perf_counter() - start
+
+    ingest_stats["batches"] += 1
+    ingest_stats["flushed"] += len(batch)
+    ingest_stats["last_flush_ms"] = round(elapsed * 1000, 3)
+    ingest_stats["max_flush_ms"] = max(ingest_stats["max_flush_ms"], ingest_stats["last_flush_ms"])
+    if FLUSH_SECONDS is not None:
+        FLUSH_SECONDS.observe(elapsed)
+
+
+def _database_up() -> bool:
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+    finally:
+        db.close()
+
+
+def _dead_letter(batch: list, error: Exception):
+    """Writes the batch row by row; the rows that still fail go to the dead-letter log."""
+    failed = []
+    for e in batch:
+        try:
+            write_batch([e])
+        except Exception:
+            failed.append(e)
+    if failed:
+        _log.dead_letter(failed, str(error))
+    _log.ack(batch)
+    _settle(batch)
+    ingest_stats["dead_lettered"] += len(failed)
+    ingest_stats["flushed"] += len(batch) - len(failed)
+    log.error("Ingest", f"❌ Dead-lettered {len(failed)} of {len(batch)} interactions "
+                        f"after {settings.INGEST_MAX_ATTEMPTS} attempts: {error}")
+
+
+def _loop():
+    batch = None  # drained but not yet committed; retried until it lands or is dead-lettered
+    attempts = 0  # failures while the database was reachable
+    next_adopt = time.monotonic() + settings.INGEST_OWNER_TTL_MS / 1000.0
+    while True:
+        _wake.wait(settings.INGEST_FLUSH_MS / 1000.0)
+        _wake.clear()
+
+        try:
+            if time.monotonic() >= next_adopt:
+                next_adopt = time.monotonic() + settings.INGEST_OWNER_TTL_MS / 1000.0
+                adopt_orphans()
+        except Exception as e:
+            log.warning("Ingest", f"⚠️ Adoption failed: {e}")
+
+        if batch is None:
+            with _lock:
+                if _queue:
+                    batch = list(_queue)
+                    _queue.clear()
+                    _log.seal()
+                    _lock.notify_all()
+            ingest_stats["inflight"] = len(batch) if batch else 0
+
+        if batch:
+            try:
+                _flush(batch)
+                batch, attempts = None, 0
+                ingest_stats["inflight"] = 0
+            except Exception as e:
+                ingest_stats["errors"] += 1
+                # An outage is waited out; a batch the database keeps rejecting is not
+                if _database_up():
+                    attempts += 1
+                if attempts >= settings.INGEST_MAX_ATTEMPTS:
+                    _dead_letter(batch, e)
+                    batch, attempts = None, 0
+                    ingest_stats["inflight"] = 0
+                else:
+                    log.warning("Ingest", f"⚠️ Flush Error ({len(batch)} rows, will retry): {e}", attempt=attempts)
+                    _stop.wait(min(2 ** attempts, 30))
+
+        if _stop.is_set() and batch is None and not _queue:
+            break
+
+
+def start():
+    """Starts the flusher. recover() must have run first."""
+    global _thread
+    if _log is None:
+        return None
+    _stop.clear()
+    if QUEUE_DEPTH is not None:
+        QUEUE_DEPTH.set_function(lambda: len(_queue) + ingest_stats["inflight"])
+    _thread = threading.Thread(target=_loop, name="ingest-flusher", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def stop(timeout: float = 10.0):
+    """Flushes what is queued and stops the flusher; anything left stays in the log."""
+    _stop.set()
+    _wake.set()
+    if _thread is not None:
+        _thread.join(timeout)
+    # Stop beating first: close() drops the alive key, and an unflushed log must lapse
+    _beat_stop.set()
+    if _beat_thread is not None:
+        _beat_thread.join(timeout)
+    if _log is not None and (_thread is None or not _thread.is_alive()):
+        try:
+            _log.close()
+        except Exception:
+            pass
+
+
+def stats() -> dict:
+    return {
+        **ingest_stats,
+        "log": _log.name if _log else None,
+        "worker": WORKER_ID,
+        "queue_depth": len(_queue),
+        "pending_users": len(_overlay),
+    }
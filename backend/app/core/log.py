@@ -0,0 +1,191 @@
+"""
+Non-blocking structured logging.
+
+print(..., flush=True) is a write syscall on the calling thread, so request
+threads could stall on a slow stdout (container log pipe). Here a log call
+only builds a tuple and appends it to a bounded in-memory queue; one writer
+thread formats the records and writes them to stdout in batches. When the
+queue is full the record is dropped and counted, never waited for.
+
+Records carry a "[Tag]" (Auth, Startup, Core, C++, ...), the message, any
+keyword fields and the current request id (set by RequestIdMiddleware from
+X-Request-ID or generated, and echoed in the response). LOG_FORMAT=json writes
+one JSON object per line. Records below LOG_LEVEL are discarded at the call
+site; info/debug records can be sampled per tag (LOG_SAMPLE_RATES="Auth=0.1")
+or per call (sample=0.01). The C++ engine's messages arrive through
+engine_sink(), installed with recommender.set_log_callback().
+"""
+import collections
+import contextvars
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+
+from app.config import settings
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = {name.lower(): level for level, name in LEVEL_NAMES.items()}
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def _parse_rates(spec: str) -> dict:
+    rates = {}
+    for part in filter(None, spec.split(",")):
+        tag, rate = part.split("=")
+        rates[tag.strip()] = float(rate)
+    return rates
+
+
+_min_level = LEVELS.get(settings.LOG_LEVEL.lower(), INFO)
+_sample_rates = _parse_rates(settings.LOG_SAMPLE_RATES)
+_queue = collections.deque()
+_wake = threading.Event()
+_start_lock = threading.Lock()
+_thread = None
+_stop = threading.Event()
+
+log_stats = {"queued": 0, "written": 0, "dropped_full": 0, "sampled_out": 0, "write_errors": 0}
+
+
+def emit(level: int, tag: str, msg: str, sample: float = None, **fields):
+    """Queues one record; O(1) and never blocks on I/O."""
+    if level < _min_level:
+        return
+    if level < WARNING:
+        rate = sample if sample is not None else _sample_rates.get(tag)
+        if rate is not None and random.random() >= rate:
+            log_stats["sampled_out"] += 1
+            return
+    if len(_queue) >= settings.LOG_QUEUE_SIZE:
+        log_stats["dropped_full"] += 1
+        return
+    _queue.append((time.time(), level, tag, msg, request_id.get(), fields))
+    log_stats["queued"] += 1
+    if _thread is None:
+        _start()
+    _wake.set()
+
+
+def debug(tag: str, msg: str, **fields):
+    emit(DEBUG, tag, msg, **fields)
+
+
+def info(tag: str, msg: str, **fields):
+    emit(INFO, tag, msg, **fields)
+
+
+def warning(tag: str, msg: str, **fields):
+    emit(WARNING, tag, msg, **fields)
+
+
+def error(tag: str, msg: str, **fields):
+    emit(ERROR, tag, msg, **fields)
+
+
+def engine_sink(level: int, message: str):
+    """recommender.set_log_callback target: C++ engine messages join the same queue."""
+    emit(level, "C++", message)
+
+
+def _format(record) -> str:
+    ts, level, tag, msg, rid, fields = record
+    if settings.LOG_FORMAT == "json":
+        doc = {"ts": round(ts, 3), "level": LEVEL_NAMES.get(level, str(level)), "tag": tag, "msg": msg}
+        if rid:
+            doc["request_id"] = rid
+        doc.update(fields)
+        return json.dumps(doc, default=str, ensure_ascii=False)
+    line = f"[{tag}] {msg}"
+    if fields:
+        line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+    if rid:
+        line += f" (req {rid})"
+    return line
+
+
+def _drain():
+    lines = []
+    while _queue:
+        lines.append(_format(_queue.popleft()))
+    if not lines:
+        return
+    try:
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+        log_stats["written"] += len(lines)
+    except Exception:
+        log_stats["write_errors"] += 1
+
+
+def _writer():
+    while not _stop.is_set():
+        _wake.wait(1.0)
+        _wake.clear()
+        _drain()
+    _drain()
+
+
+def _start():
+    global _thread
+    with _start_lock:
+        if _thread is not None:
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_writer, name="log-writer", daemon=True)
+        _thread.start()
+
+
+def flush(timeout: float = 5.0):
+    """Waits (off the request path: shutdown, CLI) until queued records are written."""
+    deadline = time.monotonic() + timeout
+    _wake.set()
+    while _queue and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def stop(timeout: float = 5.0):
+    global _thread
+    _stop.set()
+    _wake.set()
+    if _thread is not None:
+        _thread.join(timeout)
+        _thread = None
+    _drain()
+
+
+class RequestIdMiddleware:
+    """ASGI middleware: binds X-Request-ID (or a new id) to the request's log records and echoes it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        rid = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                rid = value.decode("latin-1")[:64]
+                break
+        rid = rid or uuid.uuid4().hex[:16]
+        token = request_id.set(rid)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), (b"x-request-id", rid.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
+
+
+def stats() -> dict:
+    return {**log_stats, "pending": len(_queue), "level": LEVEL_NAMES.get(_min_level)}
@@ -1,11 +1,29 @@
 import sys
 import os
 import glob
+import itertools
 from collections import defaultdict, Counter
 
+import numpy as np
+
+from app.core import log
+
 # Global instance
 _engine = None
 
+# PPR sampling parameters shared by /recommend and the hybrid blend
+PPR_WALKS = 10000
+PPR_DEPTH = 2
+
+class AnytimeResult:
+    """Mirrors the C++ AnytimeResult returned by the *_anytime methods."""
+    def __init__(self, items, work_done, work_total, completed=True, scores=None):
+        self.items = items
+        self.scores = scores if scores is not None else [0.0] * len(items)
+        self.work_done = work_done
+        self.work_total = work_total
+        self.completed = completed
+
 class PythonFallbackEngine:
     """
     A pure-Python implementation of the graph engine.
@@ -20,12 +38,18 @@ class PythonFallbackEngine:
         self.item_adj = defaultdict(list)
 
     def add_interaction(self, user_id: int, item_id: int, timestamp: int):
+        if item_id in self.user_adj.get(user_id, ()):
+            return  # idempotent, like the C++ engine (change-stream replays)
         self.users.add(user_id)
         self.items.add(item_id)
         self.interactions.append((user_id, item_id, timestamp))
         self.user_adj[user_id].append(item_id)
         self.item_adj[item_id].append(user_id)
 
+    def add_interactions(self, user_ids, item_ids, timestamps):
+        for u, i, t in zip(user_ids, item_ids, timestamps):
+            self.add_interaction(int(u), int(i), int(t))
+
     def set_item_genre(self, item_id: int, genre_id: int):
         self.items.add(item_id)
         self.item_genres[item_id] = genre_id
@@ -37,6 +61,9 @@ class PythonFallbackEngine:
     def load_model(self, path: str): pass 
 
     def recommend(self, user_id: int, k: int, pref_ids: list = None):
+        return [item for item, _ in self._scored(user_id, k, pref_ids)]
+
+    def _scored(self, user_id: int, k: int, pref_ids: list = None):
         target_history = set(self.user_adj[user_id])
         similar_users = []
         for item_id in target_history:
@@ -57,12 +84,21 @@ class PythonFallbackEngine:
                 if self.item_genres.get(item_id) in pref_set:
                     counts[item_id] += 2
 
-        sorted_items = counts.most_common(k)
-        return [item[0] for item in sorted_items]
+        return counts.most_common(k)
 
     def recommend_ppr(self, user_id: int, k: int, walks: int, depth: int):
         return self.recommend(user_id, k)
 
+    # The fallback has no incremental work to cut short; budgets are ignored
+    def recommend_anytime(self, user_id: int, k: int, pref_ids: list = None, budget_us: int = 0):
+        history = len(self.user_adj[user_id])
+        scored = self._scored(user_id, k, pref_ids)
+        return AnytimeResult([i for i, _ in scored], history, history, scores=[float(c) for _, c in scored])
+
+    def recommend_ppr_anytime(self, user_id: int, k: int, walks: int = PPR_WALKS, depth: int = PPR_DEPTH, budget_us: int = 0):
+        scored = self._scored(user_id, k)
+        return AnytimeResult([i for i, _ in scored], walks, walks, scores=[float(c) for _, c in scored])
+
 def get_engine():
     global _engine
     if _engine:
@@ -70,7 +106,7 @@ def get_engine():
     
     # --- DEBUGGING BLOCK ---
     # We leave this in to help track if the module is loading from the right path
-    print(f"[Core Debug] Python Version: {sys.version}")
+    log.debug("Core", f"Python Version: {sys.version}")
     
     try:
         import recommender
@@ -78,17 +114,34 @@ def get_engine():
         # Changed 'Recommender()' to 'Engine()' to match your C++ definition
         if hasattr(recommender, 'Engine'):
             _engine = recommender.Engine()
-            print("[Core] ✅ C++ Optimization Engine Loaded (Class: Engine).")
+            log.info("Core", "✅ C++ Optimization Engine Loaded (Class: Engine).")
         elif hasattr(recommender, 'Recommender'):
             _engine = recommender.Recommender()
-            print("[Core] ✅ C++ Optimization Engine Loaded (Class: Recommender).")
+            log.info("Core", "✅ C++ Optimization Engine Loaded (Class: Recommender).")
         else:
-            print(f"[Core] ❌ Module loaded, but class not found. Attributes: {dir(recommender)}")
+            log.error("Core", f"❌ Module loaded, but class not found. Attributes: {dir(recommender)}")
             raise ImportError("C++ Class mismatch")
+
+        # Engine messages (save/load) go through the log queue instead of std::cout
+        if hasattr(recommender, "set_log_callback"):
+            recommender.set_log_callback(log.engine_sink)
             
     except ImportError as e:
-        print(f"[Core] ❌ C++ Module Import Failed. Error: {e}")
-        print("[Core] Switching to SLOW Python fallback.")
+        log.error("Core", f"❌ C++ Module Import Failed. Error: {e}")
+        log.warning("Core", "Switching to SLOW Python fallback.")
         _engine = PythonFallbackEngine()
         
-    return _engine
\ No newline at end of file
+    return _engine
+
+
+def add_edges(engine, rows):
+    """Adds (user_id, item_id, timestamp) rows to the graph in one vectorized call."""
+    if not rows:
+        return
+    # fromiter over the flattened rows: np.array() on a list of DB rows is ~100x slower
+    cols = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64, count=3 * len(rows)).reshape(-1, 3)
+    if hasattr(engine, "add_interactions"):
+        engine.add_interactions(cols[:, 0], cols[:, 1], cols[:, 2])
+    else:
+        for user_id, item_id, timestamp in rows:
+            engine.add_interaction(user_id, item_id, timestamp)
@@ -0,0 +1,105 @@
+"""
+Background recompute of recommendation lists.
+
+Writes (Like/Unlike/Pref change) enqueue the user; worker threads recompute the
+configured algorithms through the same single-flight path as foreground
+requests, so the next page view hits a fresh cache entry instead of paying the
+full compute latency. Jobs take an admission slot like a foreground miss and are
+dropped when the algorithm is overloaded (the next stale read enqueues again).
+"""
+import queue
+import threading
+
+from app.config import settings
+from app.core import admission, cache, log
+from app.db.session import SessionLocal
+
+_queue: "queue.Queue" = queue.Queue()
+_pending = set()
+_pending_lock = threading.Lock()
+_build = None
+_threads = []
+
+refresh_stats = {"enqueued": 0, "completed": 0, "shed": 0, "errors": 0}
+
+
+def enqueue(user_id: int, algo: str, k: int):
+    """Schedules one (user, algo, k) recompute; duplicates already queued are dropped."""
+    if _build is None:
+        return
+    job = (user_id, algo, k)
+    with _pending_lock:
+        if job in _pending:
+            return
+        _pending.add(job)
+    refresh_stats["enqueued"] += 1
+    _queue.put(job)
+
+
+def enqueue_user(user_id: int):
+    """Schedules every configured algorithm/k for a user after a write."""
+    for algo in settings.REFRESH_ALGOS:
+        for k in settings.REFRESH_K:
+            enqueue(user_id, algo, k)
+
+
+def _worker():
+    while True:
+        job = _queue.get()
+        if job is None:
+            break
+        user_id, algo, k = job
+        with _pending_lock:
+            _pending.discard(job)
+
+        build = _build
+        if build is None:
+            # Stopped while this job was queued
+            _queue.task_done()
+            continue
+
+        db = SessionLocal()
+        try:
+            ticket = cache.make_ticket(user_id, algo, k)
+
+            def compute():
+                work = {}
+                results = build(db, user_id, algo, k, work=work)
+                ticket["cacheable"] = work.get("completed", True)  # e.g. a hybrid blend missing a generator
+                return results
+
+            cache.compute_once(ticket, lambda: admission.run(algo, compute))
+            refresh_stats["completed"] += 1
+        except admission.Overloaded:
+            refresh_stats["shed"] += 1
+        except Exception as e:
+            refresh_stats["errors"] += 1
+            log.warning("Refresh", f"⚠️ Refresh Error (user {user_id}, {algo}): {e}")
+        finally:
+            db.close()
+            _queue.task_done()
+
+
+def start(build_fn):
+    """
+    Starts the refresh workers. build_fn(db, user_id, algo, k, work=dict) computes a
+    list and may set work["completed"] = False for a partial one (not cached).
+    """
+    global _build
+    _build = build_fn
+    for i in range(settings.REFRESH_WORKERS):
+        thread = threading.Thread(target=_worker, name=f"rec-refresh-{i}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+
+
+def stop():
+    global _build
+    _build = None
+    for _ in _threads:
+        _queue.put(None)
+    _threads.clear()
+
+
+def stats() -> dict:
+    return {**refresh_stats, "queue_depth": _queue.qsize()}
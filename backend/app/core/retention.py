@@ -0,0 +1,178 @@
+"""
+Decay-based retention for the live graph.
+
+BFS weighs a Like by 1 / (1 + 0.05 * age_days) (calculate_decay_score), so a
+two-year-old one contributes under 3% of a fresh one, yet it kept costing
+memory, traversal time and snapshot bytes forever. With RETENTION_MIN_WEIGHT
+set, a background thread runs every RETENTION_INTERVAL_SECONDS (and once after
+boot, which also trims edges carried in by an older snapshot):
+
+1. ENGINE - every replica drops edges whose weight is below the threshold from
+            its own graph (Engine.prune_edges), keeping each user's
+            RETENTION_KEEP_PER_USER newest so long-idle users aren't emptied.
+2. SQL    - one replica per interval (Redis lock + shared "last sweep" time)
+            moves the same rows out of interactions (db/archive.py), so the
+            startup sync doesn't load them back.
+
+The hot graph is then bounded by recent activity rather than all-time history.
+The smaller graph reaches storage with the next online snapshot, which the
+pruned edges count towards (they are graph writes).
+"""
+import threading
+import time
+
+from app.config import settings
+from app.core import coldstart, log
+from app.db import archive
+from app.db.session import engine as sql_engine
+from app.utils.redis import redis_client
+
+DECAY_ALPHA = 0.05  # calculate_decay_score's alpha (per day)
+LOCK_KEY = "retention:lock"
+LAST_KEY = "retention:last"
+LOCK_MS = 3600 * 1000
+
+_engine = None
+_thread = None
+_stop = threading.Event()
+_wake = threading.Event()
+
+retention_stats = {
+    "runs": 0, "errors": 0, "edges_pruned": 0, "rows_moved": 0, "sweeps": 0, "skipped_sql": 0,
+    "last_cutoff": None, "last_pruned": None, "last_prune_ms": None, "last_moved": None, "last_sweep_ms": None,
+}
+
+
+def enabled() -> bool:
+    return 0 < settings.RETENTION_MIN_WEIGHT < 1
+
+
+def max_age_seconds(min_weight: float = None) -> float:
+    """Age at which a Like's decayed weight falls to min_weight."""
+    w = min_weight or settings.RETENTION_MIN_WEIGHT
+    return (1.0 / w - 1.0) / DECAY_ALPHA * 86400
+
+
+def cutoff(now: float = None) -> int:
+    """Likes with a timestamp before this are below RETENTION_MIN_WEIGHT."""
+    return int((now or time.time()) - max_age_seconds())
+
+
+def _sql_due(force: bool = False) -> bool:
+    """Claims this interval's SQL sweep (always ours without Redis); force ignores the interval."""
+    if not redis_client:
+        return True
+    try:
+        last = redis_client.get(LAST_KEY)
+        if not force and last and time.time() - float(last) < settings.RETENTION_INTERVAL_SECONDS:
+            return False
+        return bool(redis_client.set(LOCK_KEY, settings.REPLICA_ID, nx=True, px=LOCK_MS))
+    except Exception:
+        return False
+
+
+def _mark_swept():
+    """Starts the interval over for every replica; only after a sweep that finished."""
+    if not redis_client:
+        return
+    try:
+        redis_client.set(LAST_KEY, time.time())
+    except Exception:
+        pass
+
+
+def _release():
+    if not redis_client:
+        return
+    try:
+        if redis_client.get(LOCK_KEY) == settings.REPLICA_ID:
+            redis_client.delete(LOCK_KEY)
+    except Exception:
+        pass
+
+
+def run(reason: str = "manual", force: bool = False) -> dict:
+    """
+    One retention pass: prune this engine, then sweep SQL unless another replica
+    already did this interval (force: sweep anyway, unless one is running now).
+    """
+    cut = cutoff()
+    keep = settings.RETENTION_KEEP_PER_USER
+    result = {"reason": reason, "cutoff": cut, "pruned": 0, "moved": None}
+
+    # 1. ENGINE (plan under the shared lock; writers wait only for the erase)
+    if _engine is not None and hasattr(_engine, "prune_edges"):
+        started = time.perf_counter()
+        result["pruned"] = _engine.prune_edges(cut, keep)
+        retention_stats["last_prune_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        retention_stats["edges_pruned"] += result["pruned"]
+
+    # 2. SQL (batches of users, one transaction each)
+    if _sql_due(force):
+        try:
+            started = time.perf_counter()
+            swept = archive.sweep(sql_engine, cut, keep, settings.RETENTION_MODE, settings.RETENTION_USER_BATCH)
+            _mark_swept()  # a failed sweep leaves the interval open: the next run retries
+            result["moved"] = swept["rows"]
+            retention_stats["last_sweep_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            retention_stats["rows_moved"] += swept["rows"]
+            retention_stats["sweeps"] += 1
+            if swept["rows"]:
+                coldstart.request_refresh()  # popularity counts changed
+        finally:
+            _release()
+    else:
+        retention_stats["skipped_sql"] += 1
+
+    retention_stats["runs"] += 1
+    retention_stats["last_cutoff"] = cut
+    retention_stats["last_pruned"] = result["pruned"]
+    retention_stats["last_moved"] = result["moved"]
+    log.info("Retention", f"✅ Pruned {result['pruned']:,} edges ({reason})",
+             cutoff=cut, moved=result["moved"], mode=settings.RETENTION_MODE)
+    return result
+
+
+def _loop():
+    reason = "boot"
+    while not _stop.is_set():
+        try:
+            run(reason)
+        except Exception as e:
+            retention_stats["errors"] += 1
+            log.warning("Retention", f"⚠️ Retention Error: {e}")
+        reason = "interval"
+        _wake.wait(settings.RETENTION_INTERVAL_SECONDS)
+        _wake.clear()
+
+
+def start(engine):
+    global _engine, _thread
+    _engine = engine
+    if not enabled():
+        return None
+    if settings.RETENTION_MODE not in archive.MODES:
+        log.error("Retention", f"Unknown RETENTION_MODE {settings.RETENTION_MODE!r}; retention disabled.")
+        return None
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="retention", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def stop(timeout: float = 30.0):
+    _stop.set()
+    _wake.set()
+    if _thread is not None:
+        _thread.join(timeout)
+
+
+def stats() -> dict:
+    return {
+        **retention_stats,
+        "enabled": _thread is not None,
+        "min_weight": settings.RETENTION_MIN_WEIGHT,
+        "max_age_days": round(max_age_seconds() / 86400, 1) if enabled() else None,
+        "keep_per_user": settings.RETENTION_KEEP_PER_USER,
+        "mode": settings.RETENTION_MODE,
+    }
@@ -1,30 +1,77 @@
-from fastapi import Depends, HTTPException, status
+import hashlib
+import hmac
+import time
+
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 from sqlalchemy.orm import Session
 from app.config import settings
+from app.core import cache, log
+from app.core.cache import LRUCache
 from app.db import session, crud
 
 security = HTTPBearer()
 
-def get_current_user_id(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(session.get_db)
-) -> int:
+# Verified tokens, keyed by SHA-256 fingerprint (raw tokens are never kept)
+token_l1 = LRUCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+
+
+def decode_token(token: str) -> dict:
+    """
+    Verifies a Supabase JWT (HS256) and returns its payload. A token seen before
+    is answered from token_l1 without the HMAC check, for at most
+    AUTH_TOKEN_CACHE_TTL seconds and never past its own exp. Raises jwt errors.
+    """
+    fingerprint = hashlib.sha256(token.encode()).digest()
+    payload = token_l1.get(fingerprint)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(
+        token,
+        settings.SUPABASE_JWT_SECRET,
+        algorithms=["HS256"],
+        options={"verify_aud": False}  # Supabase aud varies
+    )
+    ttl = settings.AUTH_TOKEN_CACHE_TTL
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_l1.set(fingerprint, payload, ttl)
+    return payload
+
+
+def resolve_user_id(uuid: str, db: Session = None):
+    """uuid -> graph user_id (None if not registered); cached until the profile is re-registered."""
+    user_id = cache.profile_l1.get(uuid)
+    if user_id is not None:
+        return user_id
+
+    own_session = db is None
+    db = db or session.SessionLocal()
+    try:
+        profile = crud.get_profile_by_uuid(db, uuid)
+    finally:
+        if own_session:
+            db.close()
+    if profile is None or profile.user_id is None:
+        return None  # not cached: the user may register any moment
+    cache.profile_l1.set(uuid, profile.user_id)
+    return profile.user_id
+
+
+def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
     """
     Verifies JWT token from Supabase using the secret from .env
     Returns the user's graph ID (user_id from profiles table).
+    Both steps are cached, so a repeat caller costs no HMAC and no SQL.
     """
     token = credentials.credentials
     
     try:
         # Verify JWT signature using the secret from .env
-        payload = jwt.decode(
-            token, 
-            settings.SUPABASE_JWT_SECRET, 
-            algorithms=["HS256"],
-            options={"verify_aud": False}  # Supabase aud varies
-        )
+        payload = decode_token(token)
         
         uuid = payload.get("sub")
         if not uuid:
@@ -34,16 +81,16 @@ def get_current_user_id(
             )
 
         # Lookup user's profile to get their graph ID
-        profile = crud.get_profile_by_uuid(db, uuid)
+        user_id = resolve_user_id(uuid)
         
-        if not profile:
+        if user_id is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="User profile not found. Please register first."
             )
         
         # Return the user's graph ID (not the DB primary key)
-        return profile.user_id
+        return user_id
 
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -63,8 +110,20 @@ def get_current_user_id(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[Auth] Verification error: {e}")
+        log.warning("Auth", f"Verification error: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Authentication failed"
-        )
\ No newline at end of file
+        )
+
+
+def stats() -> dict:
+    return {"tokens": token_l1.stats(), "profiles": cache.profile_l1.stats()}
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Guards /admin/*: requires the X-Admin-Token header to match ADMIN_TOKEN (unset = disabled)."""
+    if not settings.ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
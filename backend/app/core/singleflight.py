@@ -0,0 +1,60 @@
+"""
+In-process request coalescing.
+
+Concurrent callers that ask for the same key while a computation is in flight
+wait for the leader and share its result instead of recomputing it.
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn):
+        """
+        Runs fn() once per key at a time.
+        Returns (result, shared) where shared is True for callers that waited on a leader.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+            else:
+                self.followers += 1
+                leader = False
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "followers": self.followers}
@@ -0,0 +1,190 @@
+"""
+Periodic online graph snapshots.
+
+Snapshots used to be taken only on shutdown, so a crash lost everything since
+boot. A background thread now snapshots every SNAPSHOT_INTERVAL_SECONDS, or
+sooner once SNAPSHOT_EDGE_DELTA graph writes have accumulated, while traffic
+continues: Engine.dumps() copies a consistent point-in-time image into a bytes
+object under the engine's shared lock (writers wait only for that copy), and
+compression and the chunked upload (snapshots.save) run afterwards, off the
+graph entirely. The change-stream offset is read before the copy, so the
+saved watermark never claims entries the image might not contain.
+
+With Redis, one replica snapshots per interval (a short lock plus a shared
+"last snapshot" timestamp); the others reset their timers from it.
+"""
+import threading
+import time
+
+from app.config import settings
+from app.core import changestream, log
+from app.db import snapshots
+from app.db.session import SessionLocal
+from app.utils.redis import redis_client
+
+try:
+    from prometheus_client import Gauge, Histogram
+
+    SNAPSHOT_SECONDS = Histogram(
+        "graphrec_snapshot_seconds",
+        "Online snapshot duration by phase",
+        ["phase"],
+        buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+    )
+    SNAPSHOT_AGE = Gauge("graphrec_snapshot_age_seconds", "Seconds since the last stored graph snapshot")
+except ImportError:
+    SNAPSHOT_SECONDS = SNAPSHOT_AGE = None
+
+LOCK_KEY = "snapshot:lock"
+LAST_KEY = "snapshot:last"
+
+_engine = None
+_thread = None
+_stop = threading.Event()
+_wake = threading.Event()
+_started_at = time.time()
+_last_at = None  # last snapshot stored by any replica (as far as we know)
+_base_mutations = 0
+
+snapshot_stats = {
+    "snapshots": 0, "errors": 0, "skipped_locked": 0, "last_reason": None,
+    "last_serialize_ms": None, "last_upload_ms": None, "last_total_ms": None, "max_total_ms": 0.0,
+    "last_raw_bytes": None, "last_stored_bytes": None,
+}
+
+
+def enabled() -> bool:
+    return settings.SNAPSHOT_INTERVAL_SECONDS > 0 or settings.SNAPSHOT_EDGE_DELTA > 0
+
+
+def age_seconds() -> float:
+    return time.time() - (_last_at or _started_at)
+
+
+def mutations_since() -> int:
+    return _engine.get_mutation_count() - _base_mutations if _engine is not None else 0
+
+
+def _observe_remote():
+    """Adopts a newer snapshot taken by another replica."""
+    global _last_at, _base_mutations
+    if not redis_client:
+        return
+    try:
+        remote = redis_client.get(LAST_KEY)
+    except Exception:
+        return
+    if remote and float(remote) > (_last_at or 0):
+        _last_at = float(remote)
+        _base_mutations = _engine.get_mutation_count()
+
+
+def _due():
+    if settings.SNAPSHOT_INTERVAL_SECONDS > 0 and age_seconds() >= settings.SNAPSHOT_INTERVAL_SECONDS:
+        return "interval"
+    if settings.SNAPSHOT_EDGE_DELTA > 0 and mutations_since() >= settings.SNAPSHOT_EDGE_DELTA:
+        return "edge_delta"
+    return None
+
+
+def take(reason: str = "manual") -> bool:
+    """Snapshots the live engine now. Returns False if another replica holds the lock."""
+    global _last_at, _base_mutations
+    if redis_client and not redis_client.set(LOCK_KEY, settings.REPLICA_ID, nx=True, px=settings.SNAPSHOT_LOCK_MS):
+        snapshot_stats["skipped_locked"] += 1
+        return False
+
+    try:
+        started = time.perf_counter()
+
+        # 1. POINT-IN-TIME IMAGE (offset first: the image contains at least that much)
+        offset = changestream.offset()
+        mutations = _engine.get_mutation_count()
+        image = _engine.dumps()
+        serialized = time.perf_counter()
+
+        # 2. COMPRESS + CHUNKED UPLOAD (previous snapshot stays until this one completes)
+        db = SessionLocal()
+        try:
+            manifest = snapshots.save(db, image, stream_offset=offset)
+        finally:
+            db.close()
+            del image
+        finished = time.perf_counter()
+
+        # 3. BOOKKEEPING
+        _last_at = time.time()
+        _base_mutations = mutations
+        if redis_client:
+            redis_client.set(LAST_KEY, _last_at)
+
+        serialize_s, upload_s, total_s = serialized - started, finished - serialized, finished - started
+        snapshot_stats["snapshots"] += 1
+        snapshot_stats["last_reason"] = reason
+        snapshot_stats["last_serialize_ms"] = round(serialize_s * 1000, 1)
+        snapshot_stats["last_upload_ms"] = round(upload_s * 1000, 1)
+        snapshot_stats["last_total_ms"] = round(total_s * 1000, 1)
+        snapshot_stats["max_total_ms"] = max(snapshot_stats["max_total_ms"], snapshot_stats["last_total_ms"])
+        snapshot_stats["last_raw_bytes"] = manifest.raw_size
+        snapshot_stats["last_stored_bytes"] = manifest.stored_size
+        if SNAPSHOT_SECONDS is not None:
+            SNAPSHOT_SECONDS.labels("serialize").observe(serialize_s)
+            SNAPSHOT_SECONDS.labels("upload").observe(upload_s)
+        log.info("Snapshot", f"✅ Online snapshot ({reason}) in {snapshot_stats['last_total_ms']} ms")
+        return True
+    finally:
+        if redis_client:
+            try:
+                if redis_client.get(LOCK_KEY) == settings.REPLICA_ID:  # not if it expired and moved on
+                    redis_client.delete(LOCK_KEY)
+            except Exception:
+                pass
+
+
+def _loop():
+    while not _stop.is_set():
+        _wake.wait(settings.SNAPSHOT_CHECK_SECONDS)
+        _wake.clear()
+        if _stop.is_set():
+            break
+        _observe_remote()
+        reason = _due()
+        if reason is None:
+            continue
+        try:
+            take(reason)
+        except Exception as e:
+            snapshot_stats["errors"] += 1
+            log.warning("Snapshot", f"⚠️ Snapshot Error: {e}")
+
+
+def start(engine):
+    """Starts the snapshotter for a native engine (the Python fallback has no dumps())."""
+    global _engine, _thread, _base_mutations
+    if not enabled() or not hasattr(engine, "dumps"):
+        return None
+    _engine = engine
+    _base_mutations = engine.get_mutation_count()
+    if SNAPSHOT_AGE is not None:
+        SNAPSHOT_AGE.set_function(age_seconds)
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="snapshotter", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def stop(timeout: float = 30.0):
+    """Waits for an in-flight snapshot so the shutdown save doesn't race it."""
+    _stop.set()
+    _wake.set()
+    if _thread is not None:
+        _thread.join(timeout)
+
+
+def stats() -> dict:
+    return {
+        **snapshot_stats,
+        "enabled": _thread is not None,
+        "age_s": round(age_seconds(), 1),
+        "mutations_since": mutations_since(),
+    }
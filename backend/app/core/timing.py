@@ -0,0 +1,78 @@
+"""
+Per-stage request timing.
+
+A StageTimer records how long each stage of a request took (monotonic clock)
+and renders it as a Server-Timing header. Sampled requests are also observed
+into a labeled Prometheus histogram when prometheus_client is installed.
+Unsampled requests only pay for two perf_counter() calls.
+"""
+import random
+import time
+from contextlib import contextmanager
+
+from app.config import settings
+
+try:
+    from prometheus_client import Histogram
+
+    STAGE_SECONDS = Histogram(
+        "graphrec_stage_seconds",
+        "Time spent per request stage",
+        ["endpoint", "stage", "algo", "tier"],
+        buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    )
+except ImportError:
+    STAGE_SECONDS = None
+
+
+class StageTimer:
+    def __init__(self, endpoint: str, algo: str = "-", sampled: bool = True):
+        self.endpoint = endpoint
+        self.algo = algo
+        self.tier = "-"
+        self.sampled = sampled
+        self.stages = {}  # stage -> seconds
+        self.t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.sampled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.t0) * 1000
+
+    def breakdown_ms(self) -> dict:
+        return {name: round(sec * 1000, 3) for name, sec in self.stages.items()}
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={sec * 1000:.3f}" for name, sec in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed_ms():.3f}")
+        return ", ".join(parts)
+
+    def observe(self):
+        """Flushes sampled stages (and the total) into the Prometheus histogram."""
+        if not self.sampled or STAGE_SECONDS is None:
+            return
+        labels = {"endpoint": self.endpoint, "algo": self.algo, "tier": self.tier}
+        for name, sec in self.stages.items():
+            STAGE_SECONDS.labels(stage=name, **labels).observe(sec)
+        STAGE_SECONDS.labels(stage="total", **labels).observe(time.perf_counter() - self.t0)
+
+    def finish(self, response):
+        """Sets the Server-Timing header on a response and records the sample."""
+        response.headers["Server-Timing"] = self.server_timing()
+        self.observe()
+        return response
+
+
+def start(endpoint: str, algo: str = "-", force: bool = False) -> StageTimer:
+    """Starts a timer; only TIMING_SAMPLE_RATE of requests record stages unless forced."""
+    sampled = force or random.random() < settings.TIMING_SAMPLE_RATE
+    return StageTimer(endpoint, algo, sampled)
@@ -0,0 +1,115 @@
+"""
+Moves decayed Likes out of the live interactions table.
+
+The startup sync replays every interactions row into the engine, so an edge
+the retention sweep drops from the graph must leave that table too, or the
+next boot would bring it back. For each range of RETENTION_USER_BATCH users,
+in one transaction:
+
+1. SELECT  - rows older than the cutoff outside the user's keep_per_user newest
+             (ROW_NUMBER() by timestamp, then item id: the engine's prune_edges rule)
+2. DELETE ... RETURNING those ids, so a row Unliked in the meantime is not carried over
+3. ARCHIVE - the deleted rows into interactions_archive, or (aggregate) their
+             per-(user, genre) counts into user_genre_affinity
+
+Archived Likes still count as "seen" (get_user_interacted_ids reads both tables)
+and an Unlike removes them from the archive as well. Aggregated ones are gone.
+"""
+import time
+
+from sqlalchemy import case, insert, select, text
+from sqlalchemy.engine import Engine
+
+from app.db import crud, models
+from app.db.crud import BULK_CHUNK
+
+MODES = ("archive", "aggregate")
+
+CANDIDATES_SQL = """
+    WITH ranked AS (
+        SELECT id, COALESCE(timestamp, 0) AS ts,
+               ROW_NUMBER() OVER (
+                   PARTITION BY user_id ORDER BY COALESCE(timestamp, 0) DESC, item_id DESC
+               ) AS rn
+        FROM interactions
+        WHERE user_id >= :lo AND user_id < :hi
+    )
+    SELECT id FROM ranked WHERE rn > :keep AND ts < :cutoff
+"""
+
+
+def _user_range(conn):
+    user_id = models.Interaction.user_id
+    lo = conn.execute(select(user_id).where(user_id.isnot(None)).order_by(user_id).limit(1)).scalar()
+    hi = conn.execute(select(user_id).where(user_id.isnot(None)).order_by(user_id.desc()).limit(1)).scalar()
+    return lo, hi
+
+
+def _archive(conn, rows: list, now: int):
+    conn.execute(insert(models.InteractionArchive), [
+        {"source_id": pk, "user_id": user_id, "item_id": item_id, "timestamp": ts, "archived_at": now}
+        for pk, user_id, item_id, ts in rows
+    ])
+
+
+def _aggregate(conn, rows: list, genres: dict):
+    counts = {}
+    for _, user_id, item_id, ts in rows:
+        key = (user_id, genres.get(item_id, 0))
+        likes, last_ts = counts.get(key, (0, 0))
+        counts[key] = (likes + 1, max(last_ts, ts or 0))
+
+    table = models.UserGenreAffinity
+    values = [{"user_id": u, "genre_id": g, "likes": n, "last_ts": ts} for (u, g), (n, ts) in counts.items()]
+    for start in range(0, len(values), BULK_CHUNK):
+        crud.upsert(conn, table, values[start:start + BULK_CHUNK], ["user_id", "genre_id"], lambda new: {
+            "likes": table.likes + new.likes,
+            "last_ts": case((new.last_ts > table.last_ts, new.last_ts), else_=table.last_ts),
+        })
+
+
+def sweep(engine: Engine, cutoff_ts: int, keep_per_user: int, mode: str = "archive", user_batch: int = 10000) -> dict:
+    """Moves every row the retention rule drops; returns {"rows", "batches"}. Safe to rerun."""
+    if mode not in MODES:
+        raise ValueError(f"RETENTION_MODE must be one of {MODES}, not {mode!r}")
+
+    with engine.connect() as conn:
+        lo, hi = _user_range(conn)
+        genres = {} if mode == "archive" else {
+            item_id: crud.get_genre_id(category)
+            for item_id, category in conn.execute(select(models.Item.id, models.Item.category))
+        }
+    moved = batches = 0
+    if lo is None:
+        return {"rows": 0, "batches": 0}
+
+    now = int(time.time())
+    returning = (
+        models.Interaction.id, models.Interaction.user_id, models.Interaction.item_id, models.Interaction.timestamp
+    )
+    for start in range(lo, hi + 1, user_batch):
+        with engine.begin() as conn:
+            # 1. SELECT
+            ids = conn.execute(
+                text(CANDIDATES_SQL),
+                {"lo": start, "hi": start + user_batch, "keep": keep_per_user, "cutoff": cutoff_ts},
+            ).scalars().all()
+            if not ids:
+                continue
+
+            # 2. DELETE ... RETURNING
+            rows = []
+            for chunk in range(0, len(ids), BULK_CHUNK):
+                rows.extend(crud.delete_returning(
+                    conn, models.Interaction, models.Interaction.id.in_(ids[chunk:chunk + BULK_CHUNK]), returning
+                ))
+
+            # 3. ARCHIVE / AGGREGATE
+            if rows:
+                if mode == "archive":
+                    _archive(conn, rows, now)
+                else:
+                    _aggregate(conn, rows, genres)
+            moved += len(rows)
+            batches += 1
+    return {"rows": moved, "batches": batches}
@@ -0,0 +1,196 @@
+"""
+Streaming bulk import of historical interactions.
+
+Reads CSV / JSONL / Parquet files with user_id, item_id[, timestamp] columns in
+fixed-size chunks, so memory stays O(chunk). Each chunk is one transaction
+(crud.import_interactions: COPY on Postgres, multi-row INSERT on SQLite, both
+ON CONFLICT DO NOTHING), and only the newly inserted edges are fed to the
+engine in one vectorized add_interactions() call. A checkpoint file records how
+many source rows are committed, so an interrupted import resumes where it
+stopped; re-running a chunk is harmless.
+
+Usage (from backend/):
+    python -m app.db.bulk_import history.csv --chunk-size 50000
+    python -m app.db.bulk_import events.parquet --no-resume
+Parquet needs pyarrow. Inserted edges are also published to the change stream
+(when Redis is configured), so running servers pick them up either way.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+from app.config import settings
+from app.core import changestream, log
+from app.core.recommender import add_edges
+from app.db import crud, migrations, models, session
+from app.db.session import SessionLocal
+from app.utils import fastjson
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+COLUMNS = ("user_id", "item_id", "timestamp")
+
+
+def detect_format(path: str) -> str:
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unknown file type for {path}; pass --format csv|jsonl|parquet")
+    return fmt
+
+
+def _records(path: str, fmt: str, chunk_size: int):
+    """Yields raw records (dicts or tuples with user_id, item_id, timestamp) in file order."""
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield row.get("user_id"), row.get("item_id"), row.get("timestamp")
+    elif fmt == "jsonl":
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    obj = fastjson.loads(line)
+                    yield obj.get("user_id"), obj.get("item_id"), obj.get("timestamp")
+    elif fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet import needs pyarrow (pip install pyarrow)")
+        source = pq.ParquetFile(path)
+        columns = [c for c in COLUMNS if c in source.schema_arrow.names]
+        for batch in source.iter_batches(batch_size=chunk_size, columns=columns):
+            data = batch.to_pydict()
+            timestamps = data.get("timestamp") or [None] * batch.num_rows
+            yield from zip(data["user_id"], data["item_id"], timestamps)
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def iter_chunks(path: str, fmt: str, chunk_size: int, skip: int = 0):
+    """
+    Yields (rows, consumed, invalid) per chunk, after skipping `skip` source rows.
+    rows are validated (user_id, item_id, timestamp) int tuples; consumed counts
+    source rows, including invalid ones, so checkpoints line up with the file.
+    """
+    now = int(time.time())
+    rows, consumed, invalid = [], 0, 0
+    for n, (user_id, item_id, timestamp) in enumerate(_records(path, fmt, chunk_size)):
+        if n < skip:
+            continue
+        consumed += 1
+        try:
+            rows.append((int(user_id), int(item_id), int(timestamp) if timestamp not in (None, "") else now))
+        except (TypeError, ValueError):
+            invalid += 1
+        if consumed == chunk_size:
+            yield rows, consumed, invalid
+            rows, consumed, invalid = [], 0, 0
+    if consumed:
+        yield rows, consumed, invalid
+
+
+class Checkpoint:
+    """Committed source-row count for one input file, stored as JSON next to it."""
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.size = os.path.getsize(source)
+
+    def load(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get("source") != self.source or state.get("size") != self.size:
+            log.warning("Import", f"Checkpoint {self.path} is for a different file; starting over.")
+            return 0
+        return int(state.get("rows_done", 0))
+
+    def save(self, rows_done: int):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"source": self.source, "size": self.size, "rows_done": rows_done}, f)
+        os.replace(tmp, self.path)
+
+
+def run_import(
+    path: str,
+    fmt: str = None,
+    chunk_size: int = None,
+    checkpoint_path: str = None,
+    resume: bool = True,
+    engine=None,
+    progress=None,
+) -> dict:
+    """
+    Imports one file. engine (optional) receives the inserted edges; progress
+    (optional) is called with the running totals after every committed chunk.
+    """
+    fmt = fmt or detect_format(path)
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    checkpoint = Checkpoint(checkpoint_path or path + ".ckpt", path)
+    start_row = checkpoint.load() if resume else 0
+    if start_row:
+        log.info("Import", f"Resuming {path} at row {start_row:,}")
+
+    totals = {"rows_done": start_row, "read": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        for rows, consumed, invalid in iter_chunks(path, fmt, chunk_size, skip=start_row):
+            # 1. SQL (one transaction per chunk)
+            inserted = crud.import_interactions(db, rows) if rows else []
+            db.commit()
+
+            # 2. ENGINE (only edges that were not already there) + OTHER REPLICAS
+            if engine is not None:
+                add_edges(engine, inserted)
+            changestream.publish_edges(inserted)
+
+            # 3. CHECKPOINT + PROGRESS
+            totals["rows_done"] += consumed
+            totals["read"] += consumed
+            totals["inserted"] += len(inserted)
+            totals["duplicates"] += len(rows) - len(inserted)
+            totals["invalid"] += invalid
+            checkpoint.save(totals["rows_done"])
+
+            elapsed = time.perf_counter() - started
+            totals["elapsed_s"] = round(elapsed, 3)
+            totals["rows_per_s"] = round(totals["read"] / elapsed, 1) if elapsed else None
+            log.info(
+                "Import",
+                f"{totals['rows_done']:,} rows (+{totals['inserted']:,} new, "
+                f"{totals['duplicates']:,} dup, {totals['invalid']:,} invalid) {totals['rows_per_s']:,} rows/s",
+            )
+            if progress is not None:
+                progress(dict(totals))
+    finally:
+        db.close()
+
+    totals["elapsed_s"] = round(time.perf_counter() - started, 3)
+    log.info("Import", f"✅ Done: {totals['inserted']:,} interactions added from {path}")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a CSV/JSONL/Parquet interaction file into the database")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), default=None)
+    parser.add_argument("--chunk-size", type=int, default=settings.IMPORT_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <path>.ckpt)")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    # Same schema the server creates at startup (ON CONFLICT needs the pair index)
+    models.Base.metadata.create_all(bind=session.engine)
+    migrations.run(session.engine)
+
+    summary = run_import(args.path, args.format, args.chunk_size, args.checkpoint, resume=not args.no_resume)
+    log.info("Import", "Summary", **summary)
+    log.stop()  # the writer is a daemon thread: drain it before the process exits
+
+
+if __name__ == "__main__":
+    main()
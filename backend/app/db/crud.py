@@ -1,8 +1,94 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, desc
+from sqlalchemy import func, and_, desc, delete, insert, select, text, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from . import models
+import io
 import time
 
+BULK_CHUNK = 500  # rows / pairs per statement (keeps bind parameters well under driver limits)
+
+INTERACTION_KEYS = ["user_id", "item_id"]
+
+# --- DIALECT HELPERS ---
+# Upserts and RETURNING differ per backend. PostgreSQL and SQLite share
+# ON CONFLICT ... RETURNING; MySQL has ON DUPLICATE KEY UPDATE / INSERT IGNORE and
+# no RETURNING, so there the affected rows are selected first (check-then-write).
+
+CONFLICT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+SUPPORTED_DIALECTS = (*CONFLICT_INSERTS, "mysql")
+
+
+def check_dialect(bind):
+    """Refuses, once at startup (migrations.run), a backend these helpers don't speak."""
+    if bind.dialect.name not in SUPPORTED_DIALECTS:
+        raise RuntimeError(
+            f"Unsupported database {bind.dialect.name!r}; expected one of {', '.join(SUPPORTED_DIALECTS)}"
+        )
+
+
+def dialect_name(db) -> str:
+    """Backend name ("postgresql", "sqlite", "mysql", ...) of a Session or Connection."""
+    bind = db.get_bind() if isinstance(db, Session) else db
+    return bind.dialect.name
+
+
+def insert_ignore(db, table, rows: list, keys: list, returning=()) -> list:
+    """
+    Multi-row INSERT that skips rows whose unique `keys` already exist.
+    Returns the `returning` columns of the rows actually inserted.
+    """
+    if not rows:
+        return []
+    name = dialect_name(db)
+    if name in CONFLICT_INSERTS:
+        stmt = CONFLICT_INSERTS[name](table).values(rows).on_conflict_do_nothing(index_elements=keys)
+        if not returning:
+            db.execute(stmt)
+            return []
+        return [tuple(r) for r in db.execute(stmt.returning(*returning))]
+
+    # Check-then-insert (a row inserted concurrently in between is skipped by IGNORE)
+    key_cols = tuple_(*(table.__table__.c[key] for key in keys))
+    wanted = list({tuple(row[key] for key in keys): row for row in rows}.items())
+    existing = set(db.execute(select(key_cols).where(key_cols.in_([k for k, _ in wanted]))).all())
+    new = [(k, row) for k, row in wanted if k not in existing]
+    if not new:
+        return []
+    db.execute(insert(table).prefix_with("IGNORE").values([row for _, row in new]))
+    if not returning:
+        return []
+    return [tuple(r) for r in db.execute(select(*returning).where(key_cols.in_([k for k, _ in new])))]
+
+
+def upsert(db, table, rows: list, keys: list, update):
+    """
+    Multi-row INSERT ... ON CONFLICT (keys) DO UPDATE / ON DUPLICATE KEY UPDATE.
+    update(new) returns {column: expression}; new.<column> is the incoming value.
+    """
+    if not rows:
+        return
+    name = dialect_name(db)
+    if name in CONFLICT_INSERTS:
+        stmt = CONFLICT_INSERTS[name](table).values(rows)
+        db.execute(stmt.on_conflict_do_update(index_elements=keys, set_=update(stmt.excluded)))
+    else:  # mysql (check_dialect refused anything else at startup)
+        stmt = mysql.insert(table).values(rows)
+        db.execute(stmt.on_duplicate_key_update(**update(stmt.inserted)))
+
+
+def delete_returning(db, table, where, returning) -> list:
+    """DELETE ... WHERE ... RETURNING; on MySQL the rows are selected FOR UPDATE first."""
+    if dialect_name(db) in CONFLICT_INSERTS:
+        return [tuple(r) for r in db.execute(delete(table).where(where).returning(*returning))]
+    rows = [tuple(r) for r in db.execute(select(*returning).where(where).with_for_update())]
+    if rows:
+        db.execute(delete(table).where(where))
+    return rows
+
+INTERACTION_COLUMNS = (
+    models.Interaction.id, models.Interaction.user_id, models.Interaction.item_id, models.Interaction.timestamp
+)
+
 # --- MAPPING CONFIG ---
 GENRE_MAP = {
     "Action": 1, "Animation": 2, "Comedy": 3, "Crime": 4, 
@@ -25,36 +111,147 @@ def get_profile_by_user_id(db: Session, user_id: int):
 def get_items(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Item).offset(skip).limit(limit).all()
 
+async def get_items_async(db, skip: int = 0, limit: int = 100):
+    result = await db.execute(select(models.Item).order_by(models.Item.id).offset(skip).limit(limit))
+    return result.scalars().all()
+
 def get_item_map(db: Session):
     items = db.query(models.Item).all()
     return {i.id: {"title": i.title, "category": i.category} for i in items}
 
 def create_interaction(db: Session, user_id: int, item_id: int):
-    existing = db.query(models.Interaction).filter(
+    """
+    Idempotent Like: one INSERT ... ON CONFLICT DO NOTHING RETURNING round-trip.
+    Returns the (id, user_id, item_id, timestamp) row, existing or new.
+    """
+    ts = int(time.time())
+    inserted = insert_ignore(
+        db, models.Interaction, [{"user_id": user_id, "item_id": item_id, "timestamp": ts}],
+        INTERACTION_KEYS, returning=INTERACTION_COLUMNS,
+    )
+    db.commit()
+    if inserted:
+        return inserted[0]
+
+    # Already liked (rare): return the original row
+    return db.query(*INTERACTION_COLUMNS).filter(
         and_(models.Interaction.user_id == user_id, models.Interaction.item_id == item_id)
     ).first()
-    
-    if existing: return existing
 
-    ts = int(time.time())
-    db_interaction = models.Interaction(user_id=user_id, item_id=item_id, timestamp=ts)
-    db.add(db_interaction)
+def delete_interaction(db: Session, user_id: int, item_id: int) -> bool:
+    """Unlike (the live row and any archived copy); True if a row was removed."""
+    deleted = delete_returning(
+        db, models.Interaction,
+        and_(models.Interaction.user_id == user_id, models.Interaction.item_id == item_id),
+        (models.Interaction.id,),
+    )
+    archived = db.execute(
+        delete(models.InteractionArchive)
+        .where(and_(models.InteractionArchive.user_id == user_id, models.InteractionArchive.item_id == item_id))
+    ).rowcount
     db.commit()
-    db.refresh(db_interaction)
-    return db_interaction
+    return bool(deleted) or bool(archived)
 
-def delete_interaction(db: Session, user_id: int, item_id: int):
-    db.query(models.Interaction).filter(
-        and_(models.Interaction.user_id == user_id, models.Interaction.item_id == item_id)
-    ).delete(synchronize_session=False)
+def bulk_create_interactions(db: Session, rows: list) -> list:
+    """
+    Multi-row idempotent insert of [{"user_id", "item_id", "timestamp"}].
+    Returns the (user_id, item_id) pairs actually inserted. Caller commits.
+    """
+    inserted = []
+    for start in range(0, len(rows), BULK_CHUNK):
+        inserted.extend(insert_ignore(
+            db, models.Interaction, rows[start:start + BULK_CHUNK], INTERACTION_KEYS,
+            returning=(models.Interaction.user_id, models.Interaction.item_id),
+        ))
+    return inserted
+
+def bulk_delete_interactions(db: Session, pairs: list) -> list:
+    """
+    Deletes many (user_id, item_id) pairs (archived copies too); returns the pairs
+    that existed in interactions. Caller commits.
+    """
+    pair = tuple_(models.Interaction.user_id, models.Interaction.item_id)
+    archived = tuple_(models.InteractionArchive.user_id, models.InteractionArchive.item_id)
+    deleted = []
+    for start in range(0, len(pairs), BULK_CHUNK):
+        deleted.extend(delete_returning(
+            db, models.Interaction, pair.in_(pairs[start:start + BULK_CHUNK]),
+            (models.Interaction.user_id, models.Interaction.item_id),
+        ))
+        db.execute(
+            delete(models.InteractionArchive)
+            .where(archived.in_(pairs[start:start + BULK_CHUNK]))
+        )
+    return deleted
+
+def import_interactions(db: Session, rows: list) -> list:
+    """
+    Bulk-loads [(user_id, item_id, timestamp)] and returns the rows actually inserted.
+    Postgres: COPY into a temp staging table, then one INSERT ... SELECT ... ON CONFLICT.
+    Others: chunked multi-row idempotent INSERTs. Caller commits.
+    """
+    if dialect_name(db) != "postgresql":
+        timestamps = {(u, i): t for u, i, t in rows}
+        inserted = bulk_create_interactions(db, [{"user_id": u, "item_id": i, "timestamp": t} for u, i, t in rows])
+        return [(u, i, timestamps[(u, i)]) for u, i in inserted]
+
+    conn = db.connection()
+    conn.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS interactions_import "
+        "(user_id INTEGER, item_id INTEGER, timestamp BIGINT) ON COMMIT DELETE ROWS"
+    ))
+    buf = io.StringIO()
+    buf.writelines(f"{u},{i},{t}\n" for u, i, t in rows)
+    copy_sql = "COPY interactions_import (user_id, item_id, timestamp) FROM STDIN WITH (FORMAT csv)"
+    cursor = conn.connection.cursor()
+    if hasattr(cursor, "copy_expert"):  # psycopg2
+        buf.seek(0)
+        cursor.copy_expert(copy_sql, buf)
+    else:  # psycopg 3
+        with cursor.copy(copy_sql) as copy:
+            copy.write(buf.getvalue())
+    result = conn.execute(text(
+        "INSERT INTO interactions (user_id, item_id, timestamp) "
+        "SELECT user_id, item_id, timestamp FROM interactions_import "
+        "ON CONFLICT (user_id, item_id) DO NOTHING RETURNING user_id, item_id, timestamp"
+    ))
+    return [tuple(r) for r in result]
+
+def apply_interaction_batch(db: Session, adds: list, removes: list):
+    """
+    Applies many Like/Unlike edges in one transaction.
+    adds: [{"user_id", "item_id", "timestamp"}], removes: [(user_id, item_id)].
+    """
+    bulk_delete_interactions(db, removes)
+    bulk_create_interactions(db, adds)
     db.commit()
 
-def get_all_interactions(db: Session):
-    return db.query(models.Interaction).all()
+def iter_interaction_chunks(db: Session, chunk_size: int = 100_000):
+    """
+    Streams every interaction as lists of (user_id, item_id, timestamp) Core rows.
+    yield_per makes Postgres use a server-side cursor, so memory is O(chunk_size)
+    instead of one ORM object per row.
+    """
+    stmt = select(
+        models.Interaction.user_id,
+        models.Interaction.item_id,
+        func.coalesce(models.Interaction.timestamp, 0),
+    ).execution_options(yield_per=chunk_size)
+    yield from db.execute(stmt).partitions()
+
+def _interacted_ids_stmt(user_id: int):
+    # Likes moved out of the live graph by retention still count as seen
+    return select(models.Interaction.item_id).where(models.Interaction.user_id == user_id).union(
+        select(models.InteractionArchive.item_id).where(models.InteractionArchive.user_id == user_id)
+    )
 
 def get_user_interacted_ids(db: Session, user_id: int):
-    results = db.query(models.Interaction.item_id).filter(models.Interaction.user_id == user_id).all()
-    return {r[0] for r in results}
+    return set(db.execute(_interacted_ids_stmt(user_id)).scalars().all())
+
+async def get_user_interacted_ids_async(db, user_id: int):
+    """get_user_interacted_ids on an AsyncSession (session.get_async_read_db)."""
+    result = await db.execute(_interacted_ids_stmt(user_id))
+    return set(result.scalars().all())
 
 # --- PREFERENCES ---
 
@@ -85,6 +282,21 @@ def get_user_preference_ids(db: Session, user_id: int):
     results = db.query(models.UserPreference.genre_id).filter(models.UserPreference.user_id == user_id).all()
     return [r[0] for r in results]
 
+def get_user_affinity_genre_ids(db: Session, user_id: int, limit: int = 3):
+    """Genres of the user's most aggregated old Likes (RETENTION_MODE=aggregate)."""
+    table = models.UserGenreAffinity
+    results = db.execute(
+        select(table.genre_id)
+        .where(table.user_id == user_id, table.genre_id != 0)
+        .order_by(desc(table.likes), desc(table.last_ts))
+        .limit(limit)
+    )
+    return list(results.scalars().all())
+
+async def get_user_preference_ids_async(db, user_id: int):
+    result = await db.execute(select(models.UserPreference.genre_id).where(models.UserPreference.user_id == user_id))
+    return list(result.scalars().all())
+
 # --- POPULARITY & DEFAULTS ---
 
 def get_popular_item_ids(db: Session, limit: int = 10):
@@ -100,18 +312,6 @@ def get_default_items(db: Session, limit: int = 10):
     results = db.query(models.Item.id).order_by(models.Item.id).limit(limit).all()
     return [r[0] for r in results]
 
-# --- SNAPSHOTS ---
-
-def save_snapshot(db: Session, binary_content: bytes):
-    db.query(models.GraphSnapshot).delete()
-    snapshot = models.GraphSnapshot(binary_data=binary_content)
-    db.add(snapshot)
-    db.commit()
-
-def get_latest_snapshot(db: Session):
-    snapshot = db.query(models.GraphSnapshot).order_by(desc(models.GraphSnapshot.created_at)).first()
-    return snapshot.binary_data if snapshot else None
-
 # --- SEEDING ---
 
 def seed_items(db: Session):
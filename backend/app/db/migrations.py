@@ -0,0 +1,113 @@
+"""
+Idempotent schema upgrades for databases created before a model change.
+
+create_all() only creates missing tables, so constraints added to existing
+tables are applied here at startup. Every step is safe to run repeatedly and
+from several workers at once.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.core import log
+from app.db import crud, user_ids
+
+INTERACTION_PAIR_INDEX = "ux_interactions_user_item"
+
+
+def dedupe_interactions(conn) -> int:
+    """Keeps the oldest row (lowest id) per (user_id, item_id); returns rows deleted."""
+    if conn.dialect.name == "postgresql":
+        result = conn.execute(text("""
+            DELETE FROM interactions a
+            USING interactions b
+            WHERE a.user_id = b.user_id AND a.item_id = b.item_id AND a.id > b.id
+        """))
+    elif conn.dialect.name == "mysql":
+        # MySQL can't read the table it deletes from in a subquery; a self-join works
+        result = conn.execute(text("""
+            DELETE a FROM interactions a
+            JOIN interactions b ON a.user_id = b.user_id AND a.item_id = b.item_id AND a.id > b.id
+        """))
+    else:
+        result = conn.execute(text("""
+            DELETE FROM interactions
+            WHERE id NOT IN (SELECT MIN(id) FROM interactions GROUP BY user_id, item_id)
+        """))
+    return result.rowcount or 0
+
+
+def add_interaction_pair_index(engine: Engine):
+    """
+    Unique (user_id, item_id) index for ON CONFLICT upserts. On Postgres it also
+    INCLUDEs timestamp so history reads are index-only scans. The old single-column
+    user_id index becomes redundant (user_id leads the new one) and is dropped.
+    """
+    existing = {ix["name"] for ix in inspect(engine).get_indexes("interactions")}
+    if INTERACTION_PAIR_INDEX in existing:
+        return
+
+    try:
+        with engine.begin() as conn:
+            removed = dedupe_interactions(conn)
+            if removed:
+                log.info("Migrate", f"Removed {removed} duplicate interactions.")
+
+            # MySQL has neither IF [NOT] EXISTS on index DDL nor INCLUDE: the inspector
+            # result above is the guard there, and a racing worker is handled below
+            mysql = conn.dialect.name == "mysql"
+            guard = "" if mysql else " IF NOT EXISTS"
+            include = " INCLUDE (timestamp)" if conn.dialect.name == "postgresql" else ""
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX{guard} {INTERACTION_PAIR_INDEX} "
+                f"ON interactions (user_id, item_id){include}"
+            ))
+            if "ix_interactions_user_id" in existing:
+                on = " ON interactions" if mysql else ""
+                conn.execute(text(f"DROP INDEX{'' if mysql else ' IF EXISTS'} ix_interactions_user_id{on}"))
+    except Exception:
+        # Another worker created it first (MySQL reports the duplicate name as an error)
+        if INTERACTION_PAIR_INDEX in {ix["name"] for ix in inspect(engine).get_indexes("interactions")}:
+            return
+        raise
+    # SQLite connections already in the pool can keep resolving ON CONFLICT against
+    # the schema they last saw; new ones see the index
+    engine.dispose()
+    log.info("Migrate", f"✅ Created {INTERACTION_PAIR_INDEX}.")
+
+
+SNAPSHOT_COLUMNS = {
+    "stream_offset": "VARCHAR(64)",
+    "codec": "VARCHAR(16)",
+    "chunk_count": "INTEGER",
+    "raw_size": "BIGINT",
+    "stored_size": "BIGINT",
+    "sha256": "VARCHAR(64)",
+    "complete": "BOOLEAN",
+}
+
+
+def add_snapshot_manifest_columns(engine: Engine):
+    """Change-stream watermark and chunked-snapshot manifest columns on graph_snapshots."""
+    existing = {c["name"] for c in inspect(engine).get_columns("graph_snapshots")}
+    missing = {name: ddl for name, ddl in SNAPSHOT_COLUMNS.items() if name not in existing}
+    if not missing:
+        return
+    with engine.begin() as conn:
+        guard = " IF NOT EXISTS" if conn.dialect.name == "postgresql" else ""
+        for name, ddl in missing.items():
+            conn.execute(text(f"ALTER TABLE graph_snapshots ADD COLUMN{guard} {name} {ddl}"))
+    log.info("Migrate", f"✅ Added graph_snapshots columns: {', '.join(missing)}.")
+
+
+def reclaim_user_ids(engine: Engine):
+    """Free-list entries for graph ids left unused by deleted profiles (see db/user_ids.py)."""
+    reclaimed = user_ids.reclaim_gaps(engine)
+    if reclaimed:
+        log.info("Migrate", f"✅ Reclaimed {reclaimed} free user ids.")
+
+
+def run(engine: Engine):
+    crud.check_dialect(engine)
+    add_interaction_pair_index(engine)
+    add_snapshot_manifest_columns(engine)
+    reclaim_user_ids(engine)
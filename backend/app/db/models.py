@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, JSON, BigInteger, LargeBinary, TIMESTAMP, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, JSON, BigInteger, Boolean, LargeBinary, TIMESTAMP, DateTime, Index
 from datetime import datetime, timezone
 from sqlalchemy.sql import func
 from .session import Base
@@ -11,13 +11,52 @@ class Profile(Base):
     email = Column(String, unique=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class FreeUserId(Base):
+    """Graph ids below the highest issued one that are free for reuse (see db/user_ids.py)."""
+    __tablename__ = "user_id_free"
+    user_id = Column(Integer, primary_key=True)
+
+class UserIdReclaimCursor(Base):
+    """Where the next incremental gap scan starts (single row, see db/user_ids.py)."""
+    __tablename__ = "user_id_reclaim"
+    id = Column(Integer, primary_key=True)
+    next_id = Column(Integer, nullable=False)
+
 class Interaction(Base):
     __tablename__ = "interactions"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)  # leads ux_interactions_user_item
     item_id = Column(Integer, index=True)
     timestamp = Column(BigInteger)
 
+    # One row per (user, item); Postgres also covers timestamp for index-only history reads.
+    # Existing databases get it from migrations.add_interaction_pair_index()
+    __table_args__ = (
+        Index("ux_interactions_user_item", "user_id", "item_id", unique=True, postgresql_include=["timestamp"]),
+    )
+
+class InteractionArchive(Base):
+    """Likes moved out of the live graph by the retention sweep (see db/archive.py)."""
+    __tablename__ = "interactions_archive"
+    id = Column(Integer, primary_key=True, index=True)
+    source_id = Column(Integer)  # interactions.id it was moved from
+    user_id = Column(Integer)
+    item_id = Column(Integer)
+    timestamp = Column(BigInteger)
+    archived_at = Column(BigInteger)
+
+    __table_args__ = (
+        Index("ix_interactions_archive_user_item", "user_id", "item_id"),
+    )
+
+class UserGenreAffinity(Base):
+    """Aggregated old Likes per (user, genre) when RETENTION_MODE=aggregate."""
+    __tablename__ = "user_genre_affinity"
+    user_id = Column(Integer, primary_key=True)
+    genre_id = Column(Integer, primary_key=True)
+    likes = Column(Integer, default=0)
+    last_ts = Column(BigInteger)
+
 class Item(Base):
     __tablename__ = "items"
     id = Column(Integer, primary_key=True, index=True)
@@ -31,11 +70,25 @@ class UserPreference(Base):
     genre_id = Column(Integer)
 
 class GraphSnapshot(Base):
+    """Snapshot manifest; the compressed graph.bin lives in graph_snapshot_chunks."""
     __tablename__ = "graph_snapshots"
     id = Column(Integer, primary_key=True, index=True)
-    binary_data = Column(LargeBinary)  # Stores graph.bin file content
+    binary_data = Column(LargeBinary)  # Legacy: whole uncompressed graph.bin in one row
+    stream_offset = Column(String(64), nullable=True)  # change-stream id the graph includes
+    codec = Column(String(16), nullable=True)  # zstd | lz4 | zlib
+    chunk_count = Column(Integer, nullable=True)
+    raw_size = Column(BigInteger, nullable=True)
+    stored_size = Column(BigInteger, nullable=True)
+    sha256 = Column(String(64), nullable=True)  # of the uncompressed graph.bin
+    complete = Column(Boolean, nullable=True)  # set once every chunk is written
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class GraphSnapshotChunk(Base):
+    __tablename__ = "graph_snapshot_chunks"
+    snapshot_id = Column(Integer, ForeignKey("graph_snapshots.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    data = Column(LargeBinary)
+
 class GraphSageItem(Base):
     __tablename__ = "graphsage_items"
     id = Column(Integer, primary_key=True, index=True)
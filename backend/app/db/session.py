@@ -1,28 +1,62 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.config import settings
 
-# Optimized for Supabase Transaction Pooler (Port 6543)
-engine = create_engine(
-    settings.DATABASE_URL,
-    # 1. Check connection health before use (Fixes "Closed unexpectedly")
-    pool_pre_ping=True, 
-    # 2. Refresh connections frequently
-    pool_recycle=300, 
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+except ImportError:  # SQLAlchemy < 2.0
+    create_async_engine = None
+
+IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+READ_URL = settings.DATABASE_READ_URL or settings.DATABASE_URL
+
+if IS_SQLITE:
+    # Local / benchmark database: share connections across FastAPI's threadpool
+    connect_args = {"check_same_thread": False}
+    pool_args = {}
+else:
     # 3. Aggressive timeouts & Disable Prepared Statements
-    connect_args={
-        "connect_timeout": 20, 
+    connect_args = {
+        "connect_timeout": 20,
         "keepalives": 1,
         "keepalives_idle": 5,
         "keepalives_interval": 2,
         "keepalives_count": 5,
         # CRITICAL: Disable prepared statements for PGBouncer/Supabase Pooler
         # If this is missing, the connection hangs and times out.
-        "prepare_threshold": None 
+        "prepare_threshold": None
     }
+    # 4. Bounded pools: at most DB_POOL_SIZE + DB_MAX_OVERFLOW connections per
+    #    engine; a checkout waits DB_POOL_TIMEOUT seconds before erroring
+    pool_args = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
+# Optimized for Supabase Transaction Pooler (Port 6543)
+engine = create_engine(
+    settings.DATABASE_URL,
+    # 1. Check connection health before use (Fixes "Closed unexpectedly")
+    pool_pre_ping=True,
+    # 2. Refresh connections frequently
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    connect_args=connect_args,
+    **pool_args,
+)
+
+# Read-only traffic goes to DATABASE_READ_URL (a replica) when set, in its own pool
+read_engine = engine if READ_URL == settings.DATABASE_URL else create_engine(
+    READ_URL,
+    pool_pre_ping=True,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    connect_args=connect_args,
+    **pool_args,
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
 def get_db():
@@ -30,4 +64,129 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# --- ASYNC SESSIONS ---
+# Same databases through non-blocking drivers (asyncpg / aiosqlite), so async
+# endpoints don't hold a threadpool slot while they wait on SQL.
+
+def async_url(url: str):
+    """postgresql[+driver]:// -> postgresql+asyncpg://, sqlite:// -> sqlite+aiosqlite://"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+        # asyncpg takes ssl=, not libpq's sslmode=
+        if "sslmode" in parsed.query:
+            parsed = parsed.update_query_dict({"ssl": parsed.query["sslmode"]}).difference_update_query(["sslmode"])
+        # PgBouncer in transaction mode can't keep prepared statements across transactions
+        parsed = parsed.update_query_dict({"prepared_statement_cache_size": "0"})
+    elif backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed
+
+
+def _create_async(url: str):
+    if create_async_engine is None:
+        return None
+    target = async_url(url)
+    args = {"statement_cache_size": 0, "timeout": 20} if target.get_backend_name() == "postgresql" else {}
+    try:
+        return create_async_engine(
+            target,
+            pool_pre_ping=True,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            connect_args=args,
+            **pool_args,
+        )
+    except ImportError:  # asyncpg / aiosqlite (or greenlet) not installed
+        return None
+
+
+# Only the read endpoints are async, so only the read database gets an async engine
+async_read_engine = _create_async(READ_URL)
+AsyncReadSessionLocal = (
+    async_sessionmaker(async_read_engine, class_=AsyncSession, expire_on_commit=False)
+    if async_read_engine is not None else None
+)
+
+
+class ThreadedSession:
+    """
+    Fallback when no async driver is installed: the AsyncSession calls the
+    endpoints use (execute/commit/close), run on a sync session in the threadpool.
+    """
+
+    def __init__(self, factory):
+        self._db = factory()
+
+    async def execute(self, *args, **kwargs):
+        from starlette.concurrency import run_in_threadpool
+        return await run_in_threadpool(self._db.execute, *args, **kwargs)
+
+    async def commit(self):
+        from starlette.concurrency import run_in_threadpool
+        await run_in_threadpool(self._db.commit)
+
+    async def close(self):
+        from starlette.concurrency import run_in_threadpool
+        await run_in_threadpool(self._db.close)
+
+
+async def get_async_read_db():
+    """Async session on the read replica; only for endpoints that never write."""
+    db = AsyncReadSessionLocal() if AsyncReadSessionLocal else ThreadedSession(ReadSessionLocal)
+    try:
+        yield db
+    finally:
+        await db.close()
+
+async def dispose_async():
+    """Closes the async pools' connections (shutdown); the sync pools close at exit."""
+    if async_read_engine is not None:
+        await async_read_engine.dispose()
+
+
+# --- POOL METRICS ---
+
+def _pool_stats(pool) -> dict:
+    # QueuePool-style pools only; SQLite's may not track these
+    return {
+        name: getattr(pool, name)()
+        for name in ("size", "checkedin", "checkedout", "overflow")
+        if hasattr(pool, name)
+    }
+
+
+def pools() -> dict:
+    """name -> Pool for every distinct engine (the replica ones only when DATABASE_READ_URL is set)."""
+    found = {"primary": engine.pool}
+    if read_engine is not engine:
+        found["replica"] = read_engine.pool
+    if async_read_engine is not None:
+        found["async_replica" if read_engine is not engine else "async_primary"] = async_read_engine.sync_engine.pool
+    return found
+
+
+def pool_stats() -> dict:
+    return {
+        "read_replica": read_engine is not engine,
+        "async_driver": async_read_engine.dialect.driver if async_read_engine is not None else None,
+        "limits": {k.removeprefix("pool_"): v for k, v in pool_args.items()},
+        "pools": {name: _pool_stats(pool) for name, pool in pools().items()},
+    }
+
+
+try:
+    from prometheus_client import Gauge
+
+    POOL_CONNECTIONS = Gauge(
+        "graphrec_db_pool_connections", "Connections per DB pool and state", ["pool", "state"]
+    )
+    for _name, _pool in pools().items():
+        for _state in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(_pool, _state):
+                POOL_CONNECTIONS.labels(_name, _state).set_function(getattr(_pool, _state))
+except ImportError:
+    POOL_CONNECTIONS = None
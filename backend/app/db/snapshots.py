@@ -0,0 +1,265 @@
+"""
+Compressed, chunked graph snapshots.
+
+The engine's image (Engine.dumps(), the graph.bin format) is compressed in
+blocks (zstd or lz4 when installed, zlib otherwise) and written as fixed-size
+SNAPSHOT_CHUNK_BYTES rows in graph_snapshot_chunks. Its graph_snapshots row is
+the manifest: codec, sizes, chunk count, SHA-256 of the uncompressed image and
+the change-stream offset. Restores stream the chunks through the decompressor
+straight into Engine.load_from(), so no temp file is written and the
+uncompressed image is never held whole in Python memory.
+
+A new snapshot only becomes visible when its manifest is marked complete, in
+the same transaction that deletes the previous one, so a crash mid-upload
+leaves the old snapshot in place. Restores verify size and checksum before
+the engine swaps the new graph in. Legacy single-blob rows (binary_data) still load.
+"""
+import hashlib
+import zlib
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core import log
+from app.db import models
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+COMPRESS_BLOCK = 1 << 20
+
+
+class SnapshotError(Exception):
+    """The stored snapshot is missing chunks, fails its checksum, or uses an unavailable codec."""
+
+
+class _Lz4Decompressor:
+    def __init__(self):
+        self._d = lz4_frame.LZ4FrameDecompressor()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._d.decompress(data)
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class _Lz4Compressor:
+    def __init__(self):
+        self._c = lz4_frame.LZ4FrameCompressor()
+        self._header = self._c.begin()
+
+    def compress(self, data: bytes) -> bytes:
+        out = self._header + self._c.compress(data)
+        self._header = b""
+        return out
+
+    def flush(self) -> bytes:
+        return self._header + self._c.flush()
+
+
+def available_codecs() -> list:
+    codecs = []
+    if zstandard is not None:
+        codecs.append("zstd")
+    if lz4_frame is not None:
+        codecs.append("lz4")
+    return codecs + ["zlib"]
+
+
+def pick_codec() -> str:
+    if settings.SNAPSHOT_CODEC != "auto":
+        if settings.SNAPSHOT_CODEC not in available_codecs():
+            raise SnapshotError(f"Snapshot codec {settings.SNAPSHOT_CODEC} is not installed")
+        return settings.SNAPSHOT_CODEC
+    return available_codecs()[0]
+
+
+def compressor(codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    if codec == "lz4":
+        return _Lz4Compressor()
+    return zlib.compressobj(1)
+
+
+def decompressor(codec: str):
+    if codec not in available_codecs():
+        raise SnapshotError(f"Snapshot was written with {codec}, which is not installed")
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj()
+    if codec == "lz4":
+        return _Lz4Decompressor()
+    return zlib.decompressobj()
+
+
+def latest(db: Session):
+    """Newest restorable manifest: complete chunked snapshots, or a legacy blob row."""
+    return (
+        db.query(models.GraphSnapshot)
+        .filter(or_(models.GraphSnapshot.complete.is_(True), models.GraphSnapshot.binary_data.isnot(None)))
+        .order_by(models.GraphSnapshot.id.desc())
+        .first()
+    )
+
+
+def _delete_snapshots(db: Session, ids: list):
+    if ids:
+        db.execute(delete(models.GraphSnapshotChunk).where(models.GraphSnapshotChunk.snapshot_id.in_(ids)))
+        db.execute(delete(models.GraphSnapshot).where(models.GraphSnapshot.id.in_(ids)))
+
+
+class _ChunkReader:
+    """
+    file.read()-style view of a snapshot's decompressed chunks, for Engine.load_from().
+    The read that delivers the last byte, or the first read past the end, checks size
+    and checksum. The engine reads until EOF before installing, so a corrupt snapshot
+    raises first even when its parse stops short of raw_size.
+    """
+
+    def __init__(self, manifest: models.GraphSnapshot, rows):
+        self.manifest = manifest
+        self._rows = iter(rows)
+        self._decomp = decompressor(manifest.codec)
+        self._digest = hashlib.sha256()
+        self._buf = bytearray()
+        self._seq = 0
+        self._raw = 0
+        self._delivered = 0
+        self._eof = False
+
+    def _take(self, block: bytes):
+        self._digest.update(block)
+        self._raw += len(block)
+        self._buf += block
+
+    def _fill(self):
+        for chunk_seq, data in self._rows:
+            if chunk_seq != self._seq:
+                raise SnapshotError(f"Snapshot {self.manifest.id} is missing chunk {self._seq}")
+            self._seq += 1
+            self._take(self._decomp.decompress(data))
+            return
+        self._take(self._decomp.flush())
+        self._eof = True
+
+    def _verify(self):
+        while not self._eof:
+            self._fill()
+        m = self.manifest
+        if self._seq != m.chunk_count or self._raw != m.raw_size or self._digest.hexdigest() != m.sha256:
+            raise SnapshotError(f"Snapshot {m.id} failed its size/checksum check")
+
+    def read(self, n: int) -> bytes:
+        try:
+            while len(self._buf) < n and not self._eof:
+                self._fill()
+            out = bytes(self._buf[:n])
+            del self._buf[:n]
+            self._delivered += len(out)
+            if self._delivered >= self.manifest.raw_size or not out:
+                self._verify()
+            return out
+        except SnapshotError:
+            raise
+        except Exception as e:
+            raise SnapshotError(f"Snapshot {self.manifest.id} could not be decoded: {e}") from e
+
+
+def save(db: Session, image, stream_offset: str = None) -> models.GraphSnapshot:
+    """Stores an engine image (bytes-like, from Engine.dumps()) and retires older snapshots."""
+    codec = pick_codec()
+    chunk_bytes = settings.SNAPSHOT_CHUNK_BYTES
+
+    # 1. MANIFEST (invisible to readers until complete)
+    manifest = models.GraphSnapshot(codec=codec, stream_offset=stream_offset, complete=False)
+    db.add(manifest)
+    db.commit()
+
+    # 2. CHUNKS (compressed as the file is read, one row per chunk_bytes)
+    digest = hashlib.sha256()
+    comp = compressor(codec)
+    pending = bytearray()
+    seq = raw_size = stored_size = 0
+
+    def emit(final: bool = False):
+        nonlocal seq, stored_size
+        while len(pending) >= chunk_bytes or (final and pending):
+            data = bytes(pending[:chunk_bytes])
+            del pending[:chunk_bytes]
+            db.execute(models.GraphSnapshotChunk.__table__.insert().values(snapshot_id=manifest.id, seq=seq, data=data))
+            db.commit()
+            seq += 1
+            stored_size += len(data)
+
+    view = memoryview(image)
+    try:
+        for start in range(0, len(view), COMPRESS_BLOCK):
+            block = view[start:start + COMPRESS_BLOCK]  # zero-copy slice
+            raw_size += len(block)
+            digest.update(block)
+            pending += comp.compress(block)
+            emit()
+        pending += comp.flush()
+        emit(final=True)
+
+        # 3. SWAP (mark complete + drop older snapshots in one transaction). Only lower
+        # ids: a newer upload from another worker may still be in progress.
+        older = [
+            row[0] for row in db.execute(
+                select(models.GraphSnapshot.id).where(models.GraphSnapshot.id < manifest.id)
+            )
+        ]
+        db.execute(
+            update(models.GraphSnapshot)
+            .where(models.GraphSnapshot.id == manifest.id)
+            .values(chunk_count=seq, raw_size=raw_size, stored_size=stored_size,
+                    sha256=digest.hexdigest(), complete=True)
+        )
+        _delete_snapshots(db, older)
+        db.commit()
+    except Exception:
+        db.rollback()
+        _delete_snapshots(db, [manifest.id])
+        db.commit()
+        raise
+
+    db.refresh(manifest)
+    ratio = raw_size / stored_size if stored_size else 0
+    log.info(
+        "Snapshot",
+        f"✅ Saved {raw_size:,} bytes as {seq} {codec} chunks ({stored_size:,} bytes, {ratio:.1f}x)",
+    )
+    return manifest
+
+
+def restore(db: Session, engine):
+    """
+    Loads the latest snapshot into the engine and returns its manifest (None if
+    there is none). Raises SnapshotError, leaving the engine untouched, if the
+    snapshot is incomplete or corrupt.
+    """
+    manifest = latest(db)
+    if manifest is None:
+        return None
+
+    if manifest.complete is not True:  # legacy single-blob row
+        engine.loads(manifest.binary_data)
+        return manifest
+
+    stmt = (
+        select(models.GraphSnapshotChunk.seq, models.GraphSnapshotChunk.data)
+        .where(models.GraphSnapshotChunk.snapshot_id == manifest.id)
+        .order_by(models.GraphSnapshotChunk.seq)
+        .execution_options(yield_per=1)
+    )
+    engine.load_from(_ChunkReader(manifest, db.execute(stmt)).read, manifest.raw_size)
+    return manifest
@@ -0,0 +1,131 @@
+"""
+Contiguous graph user-id allocation for /auth/register.
+
+Registration used to read every profile id into a Python set and scan for the
+smallest gap: O(users) per signup, and two concurrent signups could both pick
+the same n. Now, inside one transaction:
+
+1. locked()   - pg_advisory_xact_lock, held until the caller commits or rolls back
+                (plus an in-process lock, which is all SQLite gets)
+2. allocate() - the lowest id on the user_id_free list (ids freed below the
+                highest issued one), else the highest id in use + 1. Both are
+                single index probes, O(log n).
+
+Ids a profile moves off are pushed back with release(); gaps left by deleted
+profiles are put on the free list by reclaim_gaps() at startup, which scans one
+window of USER_ID_RECLAIM_BATCH ids per run from a stored cursor (wrapping at
+the highest id), so a boot costs O(batch) rather than O(users).
+"""
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import delete, insert, or_, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import models
+
+LOCK_KEY = 0x75736572  # "user": pg advisory lock shared by every allocator
+_local_lock = threading.Lock()
+
+def _lock_sql(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+
+
+@contextmanager
+def locked(db: Session):
+    """Serializes allocators until the session's transaction ends (commit inside the block)."""
+    with _local_lock:
+        _lock_sql(db.connection())
+        yield
+
+
+def _highest(conn, column, exclude_id: int = None):
+    # ORDER BY ... LIMIT 1 is one index probe on both Postgres and SQLite
+    stmt = select(column).where(column.isnot(None)).order_by(column.desc()).limit(1)
+    if exclude_id is not None:
+        stmt = stmt.where(models.Profile.id != exclude_id)
+    return conn.execute(stmt).scalar() or 0
+
+
+def _in_use(db: Session, n: int) -> bool:
+    stmt = select(models.Profile.id).where(or_(models.Profile.id == n, models.Profile.user_id == n)).limit(1)
+    return db.execute(stmt).first() is not None
+
+
+def allocate(db: Session, own_id: int = None) -> int:
+    """
+    Next free graph id; call inside locked(). own_id is the primary key of the
+    profile being assigned, which doesn't count as taken (it can keep its id).
+    """
+    # 1. REUSE the lowest freed id (skipping any that were taken since)
+    free = models.FreeUserId.user_id
+    while True:
+        n = db.execute(select(free).order_by(free).limit(1)).scalar()
+        if n is None:
+            break
+        db.execute(delete(models.FreeUserId).where(free == n))
+        if n == own_id or not _in_use(db, n):
+            return n
+
+    # 2. EXTEND past the highest id in use
+    return max(_highest(db, models.Profile.id, own_id), _highest(db, models.Profile.user_id)) + 1
+
+
+def release(db: Session, n: int):
+    """Returns an id a profile moved off to the free list; call inside locked()."""
+    if n is not None and n > 0 and db.get(models.FreeUserId, n) is None:
+        db.add(models.FreeUserId(user_id=n))
+        db.flush()  # so a second release in this transaction finds it
+
+
+def sync_sequence(db: Session):
+    """Keeps the profiles id sequence (used by the Supabase signup trigger) above every assigned id."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(text("""
+        SELECT setval(
+            pg_get_serial_sequence('profiles', 'id'),
+            (SELECT COALESCE(MAX(id), 0) FROM profiles),
+            TRUE
+        )
+    """))
+
+
+def _in_range(conn, column, lo: int, hi: int) -> set:
+    return set(conn.execute(select(column).where(column >= lo, column < hi)).scalars())
+
+
+def _save_cursor(conn, next_id: int):
+    cursor = models.UserIdReclaimCursor
+    if not conn.execute(update(cursor).where(cursor.id == 1).values(next_id=next_id)).rowcount:
+        conn.execute(insert(cursor).values(id=1, next_id=next_id))
+
+
+def reclaim_gaps(engine: Engine, batch: int = None) -> int:
+    """
+    Puts unused ids of the next window (up to `batch` ids from the stored cursor)
+    on the free list and advances the cursor, back to 1 past the highest id.
+    """
+    batch = batch or settings.USER_ID_RECLAIM_BATCH
+    with _local_lock, engine.begin() as conn:
+        _lock_sql(conn)
+        top = max(_highest(conn, models.Profile.id), _highest(conn, models.Profile.user_id))
+        if top == 0:
+            return 0
+        lo = conn.execute(select(models.UserIdReclaimCursor.next_id).where(models.UserIdReclaimCursor.id == 1)).scalar()
+        lo = lo if lo and lo < top else 1
+        hi = min(lo + batch, top)  # ids in [lo, hi); top itself is in use
+
+        taken = (
+            _in_range(conn, models.Profile.id, lo, hi)
+            | _in_range(conn, models.Profile.user_id, lo, hi)
+            | _in_range(conn, models.FreeUserId.user_id, lo, hi)
+        )
+        gaps = [{"user_id": n} for n in range(lo, hi) if n not in taken]
+        for start in range(0, len(gaps), 500):
+            conn.execute(insert(models.FreeUserId), gaps[start:start + 500])
+        _save_cursor(conn, hi if hi < top else 1)
+        return len(gaps)
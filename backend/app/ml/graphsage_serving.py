@@ -2,12 +2,13 @@ from __future__ import annotations
 
 import re
 import threading
+import time
 import numpy as np
 from dataclasses import dataclass
 from sqlalchemy.orm import Session
 
 from app.db.session import SessionLocal
-from app.db import models, crud
+from app.db import models
 
 
 @dataclass(frozen=True)
@@ -19,6 +20,12 @@ class GraphSageIndex:
 
 _LOCK = threading.Lock()
 _CACHE: GraphSageIndex | None = None
+# (item_map, index) -> [(db_item_id, embedding row)]; the catalog map is replaced, not mutated
+_CANDIDATES: tuple | None = None
+
+
+class DeadlineExceeded(TimeoutError):
+    """rank_graphsage ran past its deadline (hybrid blend); nothing was ranked."""
 
 
 def normalize_title(title: str) -> str:
@@ -72,46 +79,61 @@ def get_graphsage_index() -> GraphSageIndex | None:
     return _CACHE
 
 
-def recommend_graphsage_for_user(db: Session, user_id: int, k: int):
-    index = get_graphsage_index()
-    if index is None:
-        return []
-
-    item_map = crud.get_item_map(db)
+def _candidates(item_map: dict, index: GraphSageIndex) -> list:
+    """Catalog items that have an embedding, matched by normalized title (cached per catalog)."""
+    global _CANDIDATES
+    cached = _CANDIDATES
+    if cached is not None and cached[0] is item_map and cached[1] is index:
+        return cached[2]
     candidates = []
     for db_item_id, details in item_map.items():
-        norm = normalize_title(details["title"])
-        idx = index.title_to_idx.get(norm)
+        idx = index.title_to_idx.get(normalize_title(details["title"]))
         if idx is not None:
             candidates.append((db_item_id, idx))
+    _CANDIDATES = (item_map, index, candidates)
+    return candidates
+
 
+def _check(deadline: float | None):
+    if deadline is not None and time.perf_counter() > deadline:
+        raise DeadlineExceeded()
+
+
+def rank_graphsage(item_map: dict, seen_ids: set, k: int, deadline: float | None = None):
+    """
+    Top-k unseen items with their scores (embedding similarity, or TMDb popularity
+    for cold-start users). Needs no DB session, so it can run off the request thread.
+    With a deadline (time.perf_counter() value) it raises DeadlineExceeded between
+    steps instead of finishing late.
+    """
+    index = get_graphsage_index()
+    if index is None:
+        return [], []
+
+    _check(deadline)
+    candidates = _candidates(item_map, index)
     if not candidates:
-        return []
+        return [], []
 
-    seen_ids = crud.get_user_interacted_ids(db, user_id)
+    _check(deadline)
     user_item_idxs = [idx for db_id, idx in candidates if db_id in seen_ids]
 
     if user_item_idxs:
         user_emb = index.embeddings[user_item_idxs].mean(axis=0)
         candidate_idxs = [idx for _, idx in candidates]
         scores = index.embeddings[candidate_idxs] @ user_emb
-        scored = list(zip(candidates, scores))
-        scored.sort(key=lambda x: x[1], reverse=True)
-        results = []
-        for (db_item_id, _), _score in scored:
-            if db_item_id not in seen_ids:
-                results.append(db_item_id)
-            if len(results) >= k:
-                break
-        return results
-
-    # Cold-start: rank by TMDb popularity
-    scored = list(zip(candidates, index.popularity[[idx for _, idx in candidates]]))
+    else:
+        # Cold-start: rank by TMDb popularity
+        scores = index.popularity[[idx for _, idx in candidates]]
+
+    _check(deadline)
+    scored = list(zip(candidates, scores))
     scored.sort(key=lambda x: x[1], reverse=True)
-    results = []
-    for (db_item_id, _), _score in scored:
+    ids, top_scores = [], []
+    for (db_item_id, _), score in scored:
         if db_item_id not in seen_ids:
-            results.append(db_item_id)
-        if len(results) >= k:
+            ids.append(db_item_id)
+            top_scores.append(float(score))
+        if len(ids) >= k:
             break
-    return results
\ No newline at end of file
+    return ids, top_scores
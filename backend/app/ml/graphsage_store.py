@@ -1,6 +1,7 @@
 import numpy as np
 from sqlalchemy.orm import Session
 from app.db import models
+from app.core import cache
 
 
 def save_item_embeddings(
@@ -23,4 +24,7 @@ def save_item_embeddings(
         )
         db.add(row)
     db.merge(models.GraphSageMeta(key="embedding_dim", value=str(embeddings.shape[1])))
-    db.commit()
\ No newline at end of file
+    db.commit()
+
+    # New embeddings change every user's GraphSAGE ranking
+    cache.bump_epoch()
\ No newline at end of file
@@ -0,0 +1,22 @@
+"""
+Fast JSON encoding for hot paths.
+
+Uses orjson when installed and falls back to the stdlib encoder otherwise.
+Both return compact UTF-8 bytes.
+"""
+import json
+
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+    BACKEND = "orjson"
+except ImportError:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    loads = json.loads
+    BACKEND = "json"
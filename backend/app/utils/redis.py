@@ -1,5 +1,6 @@
 import redis
 from app.config import settings
+from app.core import log
 
 def get_redis_client():
     """
@@ -25,14 +26,14 @@ def get_redis_client():
         
         # Quick test to see if it works
         client.ping()
-        print(f"✅ Redis Connected: {'Secure Cloud' if redis_url.startswith('rediss') else 'Local'}")
+        log.info("Redis", f"✅ Connected: {'Secure Cloud' if redis_url.startswith('rediss') else 'Local'}")
         return client
         
     except redis.ConnectionError as e:
-        print(f"⚠️ Redis Connection Failed: {e}")
+        log.warning("Redis", f"⚠️ Connection Failed: {e}")
         return None
     except Exception as e:
-        print(f"⚠️ Redis Error: {e}")
+        log.warning("Redis", f"⚠️ Redis Error: {e}")
         return None
 
 # Create a single instance to be imported anywhere in your app
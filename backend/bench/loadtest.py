@@ -0,0 +1,269 @@
+"""
+HTTP load test against the real FastAPI app.
+
+Seeds a fresh SQLite database with a synthetic power-law graph, boots the app
+(in-process over ASGI, or with uvicorn on localhost), drives it with concurrent
+clients at a configurable read/write mix and prints throughput and latency
+percentiles per operation as JSON.
+
+Usage (from backend/):
+    python -m bench.loadtest --users 2000 --items 500 --edges 50000 \\
+        --mix bfs=60,ppr=10,graphsage=5,like=20,unlike=5 --concurrency 32 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_JWT_SECRET = "graphrec-bench-secret-0123456789abcdef"
+RECOMMEND_OPS = ("bfs", "ppr", "graphsage")
+WRITE_OPS = ("like", "unlike")
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        op, weight = part.split("=")
+        if op not in RECOMMEND_OPS + WRITE_OPS:
+            raise SystemExit(f"Unknown op in --mix: {op}")
+        mix[op] = float(weight)
+    return mix
+
+
+def configure_environment(args):
+    """Points the app at the bench database/Redis. Must run before any app import."""
+    os.chdir(args.workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(args.workdir, 'bench.db')}"
+    os.environ["SUPABASE_JWT_SECRET"] = BENCH_JWT_SECRET
+    os.environ.setdefault("TIMING_SAMPLE_RATE", "1.0")
+
+    import redis
+
+    if args.redis == "fake":
+        import fakeredis
+
+        server = fakeredis.FakeServer()
+        redis.from_url = lambda url, **kwargs: fakeredis.FakeRedis(
+            server=server, decode_responses=kwargs.get("decode_responses", False)
+        )
+    elif args.redis == "none":
+        def _unavailable(url, **kwargs):
+            raise redis.ConnectionError("Redis disabled for benchmark")
+        redis.from_url = _unavailable
+    else:
+        os.environ["REDIS_URL"] = args.redis
+
+
+def percentiles(latencies: list) -> dict:
+    import numpy as np
+
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    arr = np.array(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+        "max_ms": round(float(arr.max()), 3),
+    }
+
+
+class LoadGenerator:
+    def __init__(self, client, args, item_ids, user_weights):
+        import jwt
+
+        self.client = client
+        self.args = args
+        self.ops = list(args.mix)
+        self.op_weights = [args.mix[op] for op in self.ops]
+        self.item_ids = item_ids
+        self.user_ids = list(range(1, args.users + 1))
+        self.user_weights = user_weights
+        self.tokens = {}
+        self._jwt = jwt
+        self.latencies = {op: [] for op in self.ops}
+        self.errors = {op: 0 for op in self.ops}
+        self.recording = False
+
+    def auth_header(self, user_id: int) -> dict:
+        token = self.tokens.get(user_id)
+        if token is None:
+            token = self._jwt.encode({"sub": f"bench-{user_id}"}, BENCH_JWT_SECRET, algorithm="HS256")
+            self.tokens[user_id] = token
+        return {"Authorization": f"Bearer {token}"}
+
+    async def request(self, op: str, rng: random.Random):
+        user_id = rng.choices(self.user_ids, weights=self.user_weights)[0]
+        if op in RECOMMEND_OPS:
+            return await self.client.get(f"/recommend/{user_id}", params={"k": self.args.k, "algo": op})
+        body = {"user_id": user_id, "item_id": rng.choice(self.item_ids)}
+        method = "POST" if op == "like" else "DELETE"
+        return await self.client.request(method, "/interaction/", json=body, headers=self.auth_header(user_id))
+
+    async def worker(self, seed: int, deadline: float):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            op = rng.choices(self.ops, weights=self.op_weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await self.request(op, rng)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if not self.recording:
+                continue
+            if ok:
+                self.latencies[op].append(elapsed)
+            else:
+                self.errors[op] += 1
+
+    async def run(self) -> float:
+        loop_start = time.perf_counter()
+        deadline = loop_start + self.args.warmup + self.args.duration
+        workers = [asyncio.create_task(self.worker(self.args.seed + i, deadline)) for i in range(self.args.concurrency)]
+        await asyncio.sleep(self.args.warmup)
+        self.recording = True
+        measured_from = time.perf_counter()
+        await asyncio.gather(*workers)
+        return time.perf_counter() - measured_from
+
+    def report(self, elapsed: float) -> dict:
+        ops = {}
+        for op in self.ops:
+            count = len(self.latencies[op])
+            ops[op] = {
+                "requests": count,
+                "errors": self.errors[op],
+                "throughput_rps": round(count / elapsed, 2),
+                **percentiles(self.latencies[op]),
+            }
+        everything = [lat for lats in self.latencies.values() for lat in lats]
+        total = {
+            "requests": len(everything),
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(len(everything) / elapsed, 2),
+            **percentiles(everything),
+        }
+        return {"duration_s": round(elapsed, 3), "total": total, "ops": ops}
+
+
+async def wait_ready(client, timeout: float = 600.0):
+    """The app loads its graph after it starts listening; measure only once /ready says so."""
+    deadline = time.perf_counter() + timeout
+    while (await client.get("/ready")).status_code != 200:
+        if time.perf_counter() > deadline:
+            raise SystemExit("App did not become ready in time")
+        await asyncio.sleep(0.1)
+
+
+async def drive(app, args, item_ids, user_weights) -> dict:
+    import httpx
+
+    if args.mode == "asgi":
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                return await _drive_client(client, args, item_ids, user_weights)
+
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+            return await _drive_client(client, args, item_ids, user_weights)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=30)
+
+
+async def _drive_client(client, args, item_ids, user_weights) -> dict:
+    await wait_ready(client)
+    generator = LoadGenerator(client, args, item_ids, user_weights)
+    elapsed = await generator.run()
+    report = generator.report(elapsed)
+    report["server_metrics"] = (await client.get("/metrics/")).json()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test GraphRec on a synthetic power-law graph")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--edges", type=int, default=50000, help="Sampled edges (before dedupe)")
+    parser.add_argument("--alpha", type=float, default=1.1, help="Power-law exponent")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("bfs=60,ppr=10,graphsage=5,like=20,unlike=5"))
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before recording")
+    parser.add_argument("--mode", choices=["asgi", "http"], default="asgi",
+                        help="asgi: in-process transport; http: uvicorn on localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--redis", default="fake", help="'fake' (fakeredis), 'none', or a redis:// URL")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="Where bench.db / graph.bin go (default: temp dir)")
+    parser.add_argument("--out", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    args.workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="graphrec-bench-"))
+    os.makedirs(args.workdir, exist_ok=True)
+    db_path = os.path.join(args.workdir, "bench.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    configure_environment(args)
+
+    # The app (and the C++ engine) log to stdout; keep it clean for the JSON report
+    report_fd = os.dup(1)
+    os.dup2(2, 1)
+
+    # App imports read settings at import time, so they come after configure_environment()
+    from app.db import session
+    from app.main import app
+    from bench.synthetic import FIRST_ITEM_ID, seed_synthetic_graph, zipf_weights
+
+    import numpy as np
+
+    t0 = time.perf_counter()
+    db = session.SessionLocal()
+    try:
+        graph = seed_synthetic_graph(db, args.users, args.items, args.edges, args.alpha, args.seed)
+    finally:
+        db.close()
+    seed_s = time.perf_counter() - t0
+    print(f"[Bench] Seeded {graph} in {seed_s:.1f}s", file=sys.stderr, flush=True)
+
+    item_ids = list(range(FIRST_ITEM_ID, FIRST_ITEM_ID + args.items))
+    user_weights = zipf_weights(args.users, args.alpha, np.random.default_rng(args.seed + 2)).tolist()
+
+    report = asyncio.run(drive(app, args, item_ids, user_weights))
+    report = {
+        "timestamp": int(time.time()),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out",)},
+        "graph": {**graph, "seed_s": round(seed_s, 3)},
+        **report,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+        print(f"[Bench] Report written to {args.out}", file=sys.stderr, flush=True)
+    else:
+        with os.fdopen(report_fd, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
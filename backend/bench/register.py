@@ -0,0 +1,202 @@
+"""
+Registration load test: /auth/register latency as the profiles table grows.
+
+For each population size it bulk-seeds profiles up to that size, deletes a few
+(the freed ids are reclaimed onto the free list, as at startup), then fires
+concurrent registrations at the real app and reports latency percentiles. It
+also checks that every registration got a distinct id and that graph ids are
+still contiguous afterwards, and times the old "load every id and scan for
+the smallest gap" query at the same size for comparison.
+
+Usage (from backend/):
+    python -m bench.register --sizes 1000,10000,100000 --requests 500 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench.loadtest import configure_environment, percentiles, wait_ready
+
+
+def seed_profiles(db, start: int, stop: int, chunk_size: int = 10000):
+    """Inserts profiles with id = user_id = start..stop-1."""
+    from sqlalchemy import insert
+
+    from app.db import models
+
+    for lo in range(start, stop, chunk_size):
+        rows = [
+            {"id": n, "user_id": n, "uuid": f"seed-{n}", "email": f"seed-{n}@bench.local"}
+            for n in range(lo, min(lo + chunk_size, stop))
+        ]
+        db.execute(insert(models.Profile), rows)
+        db.commit()
+
+
+def punch_gaps(db, top: int, count: int, rng: random.Random) -> list:
+    """Deletes `count` random seeded profiles so the allocator has ids to reuse."""
+    from sqlalchemy import delete
+
+    from app.db import models
+
+    victims = rng.sample(range(1, top + 1), min(count, top))
+    db.execute(delete(models.Profile).where(models.Profile.id.in_(victims)))
+    db.commit()
+    return victims
+
+
+def legacy_scan_ms(db) -> float:
+    """The pre-allocator algorithm: every id into a set, then a linear gap search."""
+    from sqlalchemy import text
+
+    started = time.perf_counter()
+    used = set()
+    for pk, user_id in db.execute(text("SELECT id, user_id FROM profiles ORDER BY id")).all():
+        if pk is not None:
+            used.add(int(pk))
+        if user_id is not None:
+            used.add(int(user_id))
+    n = 1
+    while n in used:
+        n += 1
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def contiguous(db) -> bool:
+    from sqlalchemy import func, select
+
+    from app.db import models
+
+    count, top = db.execute(select(func.count(models.Profile.user_id), func.max(models.Profile.user_id))).one()
+    return count == (top or 0)
+
+
+async def register_many(client, prefix: str, requests: int, concurrency: int) -> tuple:
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+    latencies, ids, errors = [], [], 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            body = {"uuid": f"{prefix}-{i}", "email": f"{prefix}-{i}@bench.local"}
+            started = time.perf_counter()
+            response = await client.post("/auth/register", json=body)
+            elapsed = time.perf_counter() - started
+            if response.status_code == 200:
+                latencies.append(elapsed)
+                ids.append(response.json()["user_id"])
+            else:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, ids, errors
+
+
+async def run(app, args) -> list:
+    import httpx
+
+    from app.db import session, user_ids
+
+    rng = random.Random(args.seed)
+    levels = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            await wait_ready(client)
+            populated = 0
+            for size in args.sizes:
+                db = session.SessionLocal()
+                try:
+                    # 1. GROW the table to `size` and free a few ids, as deletions would
+                    t0 = time.perf_counter()
+                    seed_profiles(db, populated + 1, size + 1)
+                    punch_gaps(db, size, args.gaps, rng)
+                    reclaimed = user_ids.reclaim_gaps(session.engine)
+                    seed_s = time.perf_counter() - t0
+                    legacy_ms = legacy_scan_ms(db)
+                finally:
+                    db.close()
+
+                # 2. CONCURRENT REGISTRATIONS
+                t0 = time.perf_counter()
+                latencies, ids, errors = await register_many(client, f"size{size}", args.requests, args.concurrency)
+                elapsed = time.perf_counter() - t0
+
+                # 3. CHECK: distinct ids, still contiguous
+                db = session.SessionLocal()
+                try:
+                    is_contiguous = contiguous(db)
+                finally:
+                    db.close()
+                populated = max([size, populated] + ids)
+
+                level = {
+                    "profiles": size,
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "throughput_rps": round(len(latencies) / elapsed, 2),
+                    **percentiles(latencies),
+                    "reclaimed_ids": reclaimed,
+                    "duplicate_ids": len(ids) - len(set(ids)),
+                    "contiguous": is_contiguous,
+                    "legacy_scan_ms": legacy_ms,
+                    "seed_s": round(seed_s, 3),
+                }
+                print(f"[Bench] {json.dumps(level)}", file=sys.stderr, flush=True)
+                levels.append(level)
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /auth/register as the profiles table grows")
+    parser.add_argument("--sizes", type=lambda s: sorted(int(x) for x in s.split(",")), default=[1000, 10000, 100000],
+                        help="Comma-separated profile counts to measure at")
+    parser.add_argument("--requests", type=int, default=500, help="Registrations per size")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--gaps", type=int, default=50, help="Profiles deleted per size (ids to reuse)")
+    parser.add_argument("--redis", default="fake", help="'fake' (fakeredis), 'none', or a redis:// URL")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="Where bench.db goes (default: temp dir)")
+    parser.add_argument("--out", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    args.workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="graphrec-bench-"))
+    os.makedirs(args.workdir, exist_ok=True)
+    db_path = os.path.join(args.workdir, "bench.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    configure_environment(args)
+
+    # Keep the app's stdout logging out of the JSON report
+    report_fd = os.dup(1)
+    os.dup2(2, 1)
+
+    from app.main import app
+
+    levels = asyncio.run(run(app, args))
+    report = {
+        "timestamp": int(time.time()),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out",)},
+        "levels": levels,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+        print(f"[Bench] Report written to {args.out}", file=sys.stderr, flush=True)
+    else:
+        with os.fdopen(report_fd, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
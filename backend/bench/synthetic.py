@@ -0,0 +1,81 @@
+"""
+Synthetic power-law user-item graphs for benchmarks.
+
+Both item popularity and user activity follow a Zipf-like distribution, so a
+few items/users own most of the edges, like real interaction data.
+"""
+import time
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.db import crud, models
+
+FIRST_ITEM_ID = 1000
+GENRES = [g for g in crud.GENRE_MAP if g != "Unknown"]
+
+
+def zipf_weights(n: int, alpha: float, rng: np.random.Generator) -> np.ndarray:
+    """Normalized 1/rank^alpha weights, randomly assigned to ids."""
+    weights = 1.0 / np.arange(1, n + 1) ** alpha
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def generate_edges(n_users: int, n_items: int, n_edges: int, alpha: float, seed: int):
+    """
+    Samples unique (user_id, item_id, timestamp) edges.
+    User ids are 1..n_users, item ids FIRST_ITEM_ID..FIRST_ITEM_ID + n_items - 1.
+    """
+    rng = np.random.default_rng(seed)
+    users = rng.choice(n_users, size=n_edges, p=zipf_weights(n_users, alpha, rng)) + 1
+    items = rng.choice(n_items, size=n_edges, p=zipf_weights(n_items, alpha, rng)) + FIRST_ITEM_ID
+
+    pairs = np.unique(np.stack([users, items], axis=1), axis=0)
+    now = int(time.time())
+    ages = rng.exponential(scale=90 * 86400, size=len(pairs)).astype(np.int64)
+    return pairs, now - ages
+
+
+def seed_synthetic_graph(
+    db: Session,
+    n_users: int,
+    n_items: int,
+    n_edges: int,
+    alpha: float = 1.1,
+    seed: int = 42,
+    chunk_size: int = 10000,
+) -> dict:
+    """
+    Fills profiles, items, user_preferences and interactions with a synthetic graph.
+    Profiles get uuid 'bench-{user_id}' so the load generator can mint JWTs for them.
+    """
+    models.Base.metadata.create_all(bind=db.get_bind())
+    rng = np.random.default_rng(seed + 1)
+
+    db.execute(insert(models.Item), [
+        {"id": FIRST_ITEM_ID + i, "title": f"Synthetic Item {i}", "category": GENRES[i % len(GENRES)]}
+        for i in range(n_items)
+    ])
+    db.execute(insert(models.Profile), [
+        {"id": u, "uuid": f"bench-{u}", "email": f"bench-{u}@example.com", "user_id": u}
+        for u in range(1, n_users + 1)
+    ])
+
+    prefs = []
+    for u in range(1, n_users + 1):
+        for g in rng.choice(len(GENRES), size=rng.integers(0, 3), replace=False):
+            prefs.append({"user_id": u, "genre_id": crud.get_genre_id(GENRES[g])})
+    if prefs:
+        db.execute(insert(models.UserPreference), prefs)
+
+    pairs, timestamps = generate_edges(n_users, n_items, n_edges, alpha, seed)
+    for start in range(0, len(pairs), chunk_size):
+        db.execute(insert(models.Interaction), [
+            {"user_id": int(u), "item_id": int(i), "timestamp": int(ts)}
+            for (u, i), ts in zip(pairs[start:start + chunk_size], timestamps[start:start + chunk_size])
+        ])
+    db.commit()
+
+    return {"users": n_users, "items": n_items, "edges": int(len(pairs)), "preferences": len(prefs)}
@@ -0,0 +1,79 @@
+"""
+Test setup: a throwaway SQLite database and an in-memory Redis (fakeredis).
+
+App modules read settings and connect to Redis when first imported, so the
+environment is configured here, before any test module imports app.
+Tests that need the C++ engine skip when the recommender module isn't built.
+"""
+import os
+import tempfile
+
+import pytest
+
+WORKDIR = tempfile.mkdtemp(prefix="graphrec-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ["INGEST_WAL_PATH"] = os.path.join(WORKDIR, "ingest.wal")
+os.environ["SUPABASE_JWT_SECRET"] = "graphrec-test-secret-0123456789abcdef"
+
+import redis  # noqa: E402
+
+try:
+    import fakeredis
+
+    _server = fakeredis.FakeServer()
+    redis.from_url = lambda url, **kwargs: fakeredis.FakeRedis(
+        server=_server, decode_responses=kwargs.get("decode_responses", False)
+    )
+except ImportError:  # Redis-backed tests skip themselves (see the redis fixture)
+    def _unavailable(url, **kwargs):
+        raise redis.ConnectionError("fakeredis is not installed")
+    redis.from_url = _unavailable
+
+from app.db import models  # noqa: E402,F401  (registers every table on Base)
+from app.db.session import Base, engine  # noqa: E402
+
+Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture
+def redis_client():
+    """The app's Redis client, emptied before each test."""
+    from app.utils.redis import redis_client
+
+    if redis_client is None:
+        pytest.skip("needs fakeredis")
+    redis_client.flushall()
+    return redis_client
+
+
+@pytest.fixture
+def cache(redis_client):
+    """app.core.cache with empty L1 tiers and an empty Redis."""
+    from app.core import cache
+
+    for tier in (cache.rec_l1, cache.stale_l1, cache.catalog_l1, cache.profile_l1):
+        tier.clear()
+    return cache
+
+
+@pytest.fixture
+def db():
+    """A session on the test database; every table is emptied afterwards."""
+    from app.db.session import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+
+@pytest.fixture
+def cpp_engine():
+    """A fresh C++ Engine (not the app's shared instance)."""
+    recommender = pytest.importorskip("recommender")
+    return recommender.Engine()
@@ -0,0 +1,102 @@
+"""Per-algorithm admission gates and load shedding."""
+import threading
+
+import pytest
+
+from app.config import settings
+from app.core import admission, hybrid
+from app.core.admission import AlgoGate, Overloaded
+
+
+@pytest.fixture
+def occupied():
+    """Runs fn inside the gate on a background thread until the returned release() is called."""
+    releases = []
+
+    def occupy(gate):
+        entered, release = threading.Event(), threading.Event()
+
+        def hold():
+            entered.set()
+            release.wait(5)
+
+        thread = threading.Thread(target=gate.run, args=(hold,))
+        thread.start()
+        entered.wait(5)
+        releases.append((release, thread))
+
+    yield occupy
+    for release, thread in releases:
+        release.set()
+        thread.join()
+
+
+def test_admits_up_to_the_limit(occupied):
+    gate = AlgoGate("bfs", limit=2, max_queue=0, max_wait_ms=50)
+    occupied(gate)
+
+    assert gate.run(lambda: "ok") == "ok"
+    assert gate.stats["admitted"] == 2
+
+
+def test_sheds_without_waiting_when_asked(occupied):
+    gate = AlgoGate("bfs", limit=1, max_queue=4, max_wait_ms=50)
+    occupied(gate)
+
+    with pytest.raises(Overloaded) as exc:
+        gate.run(lambda: "ok", wait=False)
+    assert exc.value.reason == "busy"
+
+
+def test_sheds_when_the_queue_is_full(occupied):
+    gate = AlgoGate("bfs", limit=1, max_queue=0, max_wait_ms=50)
+    occupied(gate)
+
+    with pytest.raises(Overloaded) as exc:
+        gate.run(lambda: "ok")
+    assert exc.value.reason == "queue full"
+    assert gate.stats["shed_queue"] == 1
+
+
+def test_sheds_when_the_predicted_wait_is_over_budget(occupied):
+    gate = AlgoGate("ppr", limit=1, max_queue=4, max_wait_ms=50)
+    occupied(gate)
+    gate.ewma_service = 0.2  # each queued request waits ~200 ms
+
+    with pytest.raises(Overloaded) as exc:
+        gate.run(lambda: "ok")
+    assert exc.value.reason == "latency"
+
+
+def test_sheds_after_waiting_out_the_budget(occupied):
+    gate = AlgoGate("ppr", limit=1, max_queue=4, max_wait_ms=30)
+    occupied(gate)
+
+    with pytest.raises(Overloaded) as exc:
+        gate.run(lambda: "ok")
+    assert exc.value.reason == "timeout"
+    assert gate.waiting == 0
+
+
+def test_slot_is_released_when_fn_raises():
+    gate = AlgoGate("bfs", limit=1, max_queue=0, max_wait_ms=10)
+
+    with pytest.raises(ZeroDivisionError):
+        gate.run(lambda: 1 / 0)
+
+    assert gate.run(lambda: "ok") == "ok"
+    assert gate.running == 0
+
+
+def test_ungated_algorithms_run_unrestricted():
+    assert "unknown" not in admission.GATES
+    assert admission.run("unknown", lambda: "ok") == "ok"
+
+
+def test_hybrid_refuses_blends_when_its_pool_is_taken(monkeypatch):
+    monkeypatch.setattr(hybrid, "_busy", settings.HYBRID_WORKERS)
+    rejected = hybrid.hybrid_stats["rejected"]
+
+    with pytest.raises(Overloaded):
+        hybrid._reserve(1)
+    assert hybrid.hybrid_stats["rejected"] == rejected + 1
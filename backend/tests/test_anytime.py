@@ -0,0 +1,73 @@
+"""Deadline-aware (anytime) BFS / PPR: partial work under a budget, reported back to the caller."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.api import recommend
+
+
+@pytest.fixture
+def dense(cpp_engine):
+    """User 1 liked 200 items, each liked by 100 other users with 20 more items apiece."""
+    users, items = [], []
+    for i in range(200):
+        users.append(1)
+        items.append(i)
+    for u in range(2, 102):
+        for i in range(0, 200, 2):
+            users.append(u)
+            items.append(i)
+        for i in range(1000 + u, 1020 + u):
+            users.append(u)
+            items.append(i)
+    cpp_engine.add_interactions(users, items, [1_700_000_000] * len(users))
+    return cpp_engine
+
+
+def test_unlimited_budget_finishes(dense):
+    result = dense.recommend_anytime(1, 10, [], 0)
+
+    assert result.completed and result.work_done == result.work_total == 200
+    assert result.items == dense.recommend(1, 10, [])
+    assert len(result.scores) == len(result.items) == 10
+    assert result.scores == sorted(result.scores, reverse=True)
+
+
+def test_bfs_stops_at_the_budget_with_a_ranking(dense):
+    result = dense.recommend_anytime(1, 10, [], 1)  # 1 us: the first history item only
+
+    assert not result.completed
+    assert 1 <= result.work_done < result.work_total
+    assert result.items  # still a best-so-far answer
+
+
+def test_ppr_stops_at_the_budget(dense):
+    result = dense.recommend_ppr_anytime(1, 10, 1_000_000, 2, 1)
+
+    assert not result.completed
+    assert 0 < result.work_done < result.work_total == 1_000_000
+    assert result.items
+
+
+def test_unknown_user_is_an_empty_complete_answer(dense):
+    result = dense.recommend_anytime(999, 10, [], 1)
+
+    assert (result.items, result.work_done, result.completed) == ([], 0, True)
+
+
+def test_budgeted_request_reports_completeness(db, monkeypatch):
+    partial = SimpleNamespace(items=[5, 6], scores=[2.0, 1.0], work_done=1, work_total=4, completed=False)
+    budgets = []
+
+    def recommend_anytime(user_id, k, pref_ids, budget_us):
+        budgets.append(budget_us)
+        return partial
+
+    monkeypatch.setattr(recommend, "get_engine", lambda: SimpleNamespace(recommend_anytime=recommend_anytime))
+    work = {}
+
+    results = recommend.build_recommendations(db, 1, "bfs", 2, budget_ms=50, work=work)
+
+    assert [r["id"] for r in results] == [5, 6]
+    assert work == {"work_done": 1, "work_total": 4, "completed": False}
+    assert 0 < budgets[0] <= 50_000  # what is left of the request's budget, in microseconds
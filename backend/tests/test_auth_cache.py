@@ -0,0 +1,107 @@
+"""Auth caching: verified tokens and uuid -> user_id lookups answered from L1, dropped on re-registration."""
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.config import settings
+from app.core import security
+from app.db import models
+
+SECRET = "test-secret-of-at-least-32-bytes!"
+
+
+@pytest.fixture(autouse=True)
+def signing(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", SECRET)
+    security.token_l1.clear()
+    yield
+    security.token_l1.clear()
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Counts the signature checks that actually run."""
+    calls = []
+    real = jwt.decode
+
+    def counting(*args, **kwargs):
+        calls.append(1)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(security.jwt, "decode", counting)
+    return calls
+
+
+def _token(sub="uuid-1", **claims):
+    return jwt.encode({"sub": sub, **claims}, SECRET, algorithm="HS256")
+
+
+def test_repeat_token_skips_the_signature_check(decodes):
+    token = _token(exp=int(time.time()) + 3600)
+
+    assert security.decode_token(token)["sub"] == "uuid-1"
+    assert security.decode_token(token)["sub"] == "uuid-1"
+    assert len(decodes) == 1
+    assert [len(key) for key in security.token_l1._data] == [32]  # keyed by SHA-256, never the raw token
+
+
+def test_token_is_never_cached_past_its_exp(decodes):
+    token = _token(exp=int(time.time()) + 1)
+
+    security.decode_token(token)
+    time.sleep(1.1)
+
+    with pytest.raises(jwt.ExpiredSignatureError):
+        security.decode_token(token)
+    assert len(decodes) == 2
+
+
+def test_bad_signature_is_not_cached(decodes):
+    forged = jwt.encode({"sub": "uuid-1"}, "another-secret-of-32-bytes-or-more", algorithm="HS256")
+
+    for _ in range(2):
+        with pytest.raises(jwt.InvalidSignatureError):
+            security.decode_token(forged)
+    assert len(decodes) == 2
+
+
+def test_profile_lookup_is_cached_until_re_registration(db, cache):
+    db.add(models.Profile(id=7, uuid="uuid-7", email="a@example.com", user_id=7))
+    db.commit()
+
+    assert security.resolve_user_id("uuid-7", db) == 7
+    db.query(models.Profile).filter_by(uuid="uuid-7").update({"user_id": 8})
+    db.commit()
+    assert security.resolve_user_id("uuid-7", db) == 7  # served from profile_l1
+
+    cache.invalidate_profile("uuid-7")
+
+    assert security.resolve_user_id("uuid-7", db) == 8
+
+
+def test_unregistered_uuid_is_not_cached(db, cache):
+    assert security.resolve_user_id("uuid-9", db) is None
+
+    db.add(models.Profile(id=9, uuid="uuid-9", email="b@example.com", user_id=9))
+    db.commit()
+
+    assert security.resolve_user_id("uuid-9", db) == 9
+
+
+def test_current_user_from_a_bearer_token(db, cache):
+    db.add(models.Profile(id=3, uuid="uuid-3", email="c@example.com", user_id=3))
+    db.commit()
+
+    def bearer(token):
+        return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    assert security.get_current_user_id(bearer(_token("uuid-3"))) == 3
+    with pytest.raises(HTTPException) as exc:
+        security.get_current_user_id(bearer(_token("uuid-unknown")))
+    assert exc.value.status_code == 404
+    with pytest.raises(HTTPException) as exc:
+        security.get_current_user_id(bearer(_token("uuid-3", exp=int(time.time()) - 10)))
+    assert exc.value.status_code == 401
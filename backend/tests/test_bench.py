@@ -0,0 +1,54 @@
+"""Benchmark harness helpers: synthetic power-law graphs, the op mix and latency percentiles."""
+import numpy as np
+import pytest
+
+from app.db import models
+from bench import loadtest, synthetic
+
+
+def test_edges_are_unique_and_in_range():
+    pairs, timestamps = synthetic.generate_edges(n_users=50, n_items=30, n_edges=2000, alpha=1.1, seed=1)
+
+    assert len({tuple(p) for p in pairs}) == len(pairs) == len(timestamps)
+    assert pairs[:, 0].min() >= 1 and pairs[:, 0].max() <= 50
+    assert pairs[:, 1].min() >= synthetic.FIRST_ITEM_ID and pairs[:, 1].max() < synthetic.FIRST_ITEM_ID + 30
+
+
+def test_same_seed_same_graph():
+    a, _ = synthetic.generate_edges(100, 100, 3000, 1.1, seed=7)
+    b, _ = synthetic.generate_edges(100, 100, 3000, 1.1, seed=7)
+
+    assert np.array_equal(a, b)
+
+
+def test_popularity_is_skewed():
+    pairs, _ = synthetic.generate_edges(n_users=2000, n_items=500, n_edges=20000, alpha=1.1, seed=3)
+
+    _, degree = np.unique(pairs[:, 1], return_counts=True)
+    top = np.sort(degree)[::-1][: len(degree) // 10]
+    assert top.sum() > 0.3 * degree.sum()  # top 10% of items hold well over 10% of edges
+
+
+def test_seed_fills_every_table(db):
+    summary = synthetic.seed_synthetic_graph(db, n_users=20, n_items=15, n_edges=200, chunk_size=50)
+
+    assert db.query(models.Profile).count() == 20
+    assert db.query(models.Item).count() == 15
+    assert db.query(models.Interaction).count() == summary["edges"]
+    assert db.query(models.UserPreference).count() == summary["preferences"]
+    assert db.query(models.Profile).filter_by(user_id=3).one().uuid == "bench-3"
+
+
+def test_mix_rejects_unknown_ops():
+    assert loadtest.parse_mix("bfs=60,like=40") == {"bfs": 60.0, "like": 40.0}
+    with pytest.raises(SystemExit):
+        loadtest.parse_mix("bfs=60,delete_everything=40")
+
+
+def test_percentiles():
+    stats = loadtest.percentiles([i / 1000 for i in range(1, 101)])  # 1..100 ms
+
+    assert stats["p50_ms"] == pytest.approx(50.5)
+    assert stats["p99_ms"] == pytest.approx(99.01)
+    assert stats["max_ms"] == pytest.approx(100)
+    assert loadtest.percentiles([])["p50_ms"] is None
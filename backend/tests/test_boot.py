@@ -0,0 +1,98 @@
+"""Background boot: the readiness gate, deferred engine writes, retries and a boot that gives up."""
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app import main
+from app.config import settings
+from app.core import boot
+
+
+@pytest.fixture(autouse=True)
+def fresh_boot(monkeypatch):
+    monkeypatch.setattr(boot, "state", {
+        "phase": boot.PHASE_STARTING, "db_ready": False, "ready": False,
+        "error": None, "attempts": 0, "deferred_applied": 0,
+    })
+    monkeypatch.setattr(boot, "timings", {})
+    monkeypatch.setattr(boot, "_done", set())
+    monkeypatch.setattr(boot, "_deferred", [])
+    monkeypatch.setattr(settings, "BOOT_RETRY_SECONDS", 0)
+    monkeypatch.setattr(settings, "BOOT_MAX_ATTEMPTS", 3)
+
+
+def _status(response):
+    return response.status_code, json.loads(response.body)
+
+
+def test_engine_writes_wait_for_the_graph_in_order():
+    applied = []
+
+    assert not boot.apply_or_defer(lambda: applied.append("like"))
+    assert not boot.apply_or_defer(lambda: applied.append("unlike"))
+    assert applied == []
+
+    boot.mark_ready()
+
+    assert applied == ["like", "unlike"]
+    assert boot.apply_or_defer(lambda: applied.append("later"))
+    assert applied[-1] == "later" and boot.state["deferred_applied"] == 2
+
+
+def test_db_endpoints_answer_503_until_the_schema_is_in_place():
+    with pytest.raises(HTTPException) as exc:
+        boot.require_db()
+    assert exc.value.status_code == 503 and exc.value.headers == {"Retry-After": "1"}
+
+    boot.mark_db_ready()
+    boot.require_db()
+
+
+def test_ready_turns_200_after_a_boot():
+    assert _status(main.readiness_check())[0] == 503
+
+    def sequence():
+        with boot.phase("db"):
+            boot.mark_db_ready()
+        with boot.phase("sync"):
+            pass
+
+    boot.start(sequence, import_seconds=0.5)
+    assert boot.wait(5)
+
+    code, body = _status(main.readiness_check())
+    assert code == 200 and body["phase"] == boot.PHASE_READY
+    assert list(body["timings_s"]) == ["imports", "db", "sync"]
+    assert main.health_check() == {"status": "healthy"}
+
+
+def test_failed_attempts_are_retried_without_repeating_finished_steps():
+    starts, attempts = [], []
+
+    def sequence():
+        boot.once("ingest", lambda: starts.append("ingest"))
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("database not up yet")
+
+    boot.start(sequence)
+
+    assert boot.wait(5)
+    assert starts == ["ingest"] and len(attempts) == 3
+    assert boot.state["attempts"] == 3 and boot.state["error"] is None
+
+
+def test_boot_that_gives_up_fails_health_and_ready():
+    def sequence():
+        with boot.phase("snapshot"):
+            raise RuntimeError("disk on fire")
+
+    boot.start(sequence)
+
+    assert not boot.wait(5)
+    assert boot.failed()
+    code, body = _status(main.health_check())
+    assert code == 503 and body == {"status": "failed", "error": "snapshot: disk on fire"}
+    assert main.health_check_head().status_code == 503
+    assert _status(main.readiness_check())[0] == 503
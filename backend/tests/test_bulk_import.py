@@ -0,0 +1,137 @@
+"""Streaming bulk import: formats, idempotent chunks, checkpoint resume and the admin path guard."""
+import json
+import os
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.api import admin
+from app.config import settings
+from app.db import bulk_import, models
+from app.db.session import engine
+
+pytestmark = pytest.mark.usefixtures("db")
+
+ROWS = [(1, 10, 100), (1, 11, 101), (2, 10, 102), (1, 10, 999), (3, 12, 103)]  # (1, 10) twice
+
+
+class Recorder:
+    """Stands in for the engine: keeps what add_interactions() received."""
+
+    def __init__(self):
+        self.edges = []
+
+    def add_interactions(self, user_ids, item_ids, timestamps):
+        self.edges += [tuple(map(int, row)) for row in zip(user_ids, item_ids, timestamps)]
+
+
+def _edges():
+    with engine.connect() as conn:
+        return set(conn.execute(select(models.Interaction.user_id, models.Interaction.item_id)).all())
+
+
+def _write_csv(path, rows, extra=()):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("user_id,item_id,timestamp\n")
+        f.writelines(f"{u},{i},{t}\n" for u, i, t in rows)
+        f.writelines(extra)
+    return str(path)
+
+
+def test_csv_lands_in_sql_and_the_engine(tmp_path):
+    path = _write_csv(tmp_path / "likes.csv", ROWS, extra=["oops,10,1\n"])
+    recorder = Recorder()
+
+    totals = bulk_import.run_import(path, chunk_size=2, engine=recorder)
+
+    assert _edges() == {(1, 10), (1, 11), (2, 10), (3, 12)}
+    assert sorted(recorder.edges) == [(1, 10, 100), (1, 11, 101), (2, 10, 102), (3, 12, 103)]
+    assert {k: totals[k] for k in ("rows_done", "inserted", "duplicates", "invalid")} == \
+        {"rows_done": 6, "inserted": 4, "duplicates": 1, "invalid": 1}
+
+
+def test_jsonl_without_timestamps_uses_now(tmp_path):
+    path = tmp_path / "likes.jsonl"
+    path.write_text('{"user_id": 4, "item_id": 40}\n\n{"user_id": 4, "item_id": 41, "timestamp": 7}\n')
+
+    totals = bulk_import.run_import(str(path))
+
+    assert totals["inserted"] == 2
+    assert _edges() == {(4, 40), (4, 41)}
+
+
+def test_parquet(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    path = str(tmp_path / "likes.parquet")
+    pq.write_table(pa.table({"user_id": [5, 5], "item_id": [50, 51], "timestamp": [1, 2]}), path)
+
+    assert bulk_import.run_import(path, chunk_size=1)["inserted"] == 2
+    assert _edges() == {(5, 50), (5, 51)}
+
+
+def test_interrupted_import_resumes_at_the_checkpoint(tmp_path):
+    path = _write_csv(tmp_path / "likes.csv", ROWS)
+
+    def crash_after_first_chunk(totals):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        bulk_import.run_import(path, chunk_size=2, progress=crash_after_first_chunk)
+    with open(path + ".ckpt") as f:
+        assert json.load(f)["rows_done"] == 2
+
+    recorder = Recorder()
+    totals = bulk_import.run_import(path, chunk_size=2, engine=recorder)
+
+    assert totals["read"] == 3 and totals["rows_done"] == 5
+    assert sorted(recorder.edges) == [(2, 10, 102), (3, 12, 103)]  # the first chunk is not re-added
+    assert len(_edges()) == 4
+
+
+def test_checkpoint_of_another_file_is_ignored(tmp_path):
+    path = _write_csv(tmp_path / "likes.csv", ROWS)
+    bulk_import.Checkpoint(path + ".ckpt", path).save(5)
+    _write_csv(path, ROWS + [(6, 60, 1)])  # same name, different file
+
+    assert bulk_import.run_import(path)["rows_done"] == 6
+
+
+def test_unknown_extension_is_refused():
+    with pytest.raises(ValueError, match="Unknown file type"):
+        bulk_import.detect_format("likes.xlsx")
+
+
+class TestAdminPath:
+    @pytest.fixture(autouse=True)
+    def import_dir(self, tmp_path, monkeypatch):
+        self.root = tmp_path / "imports"
+        self.root.mkdir()
+        (self.root / "ok.csv").write_text("user_id,item_id\n")
+        monkeypatch.setattr(settings, "IMPORT_DIR", str(self.root))
+
+    def test_file_inside_import_dir(self):
+        assert admin._resolve_import_path("ok.csv") == os.path.realpath(self.root / "ok.csv")
+
+    @pytest.mark.parametrize("path", ["../secret.csv", "/etc/passwd"])
+    def test_paths_outside_are_refused(self, path):
+        with pytest.raises(HTTPException) as exc:
+            admin._resolve_import_path(path)
+        assert exc.value.status_code == 400
+
+    def test_symlink_out_is_refused(self, tmp_path):
+        (tmp_path / "outside.csv").write_text("user_id,item_id\n")
+        os.symlink(tmp_path / "outside.csv", self.root / "link.csv")
+
+        with pytest.raises(HTTPException) as exc:
+            admin._resolve_import_path("link.csv")
+        assert exc.value.status_code == 400
+
+    def test_disabled_without_import_dir(self, monkeypatch):
+        monkeypatch.setattr(settings, "IMPORT_DIR", "")
+
+        with pytest.raises(HTTPException) as exc:
+            admin._resolve_import_path("ok.csv")
+        assert exc.value.status_code == 403
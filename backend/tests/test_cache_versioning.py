@@ -0,0 +1,104 @@
+"""Versioned cache keys (generation / epoch) and the L1 tier in front of Redis."""
+import json
+
+import pytest
+
+from app.config import settings
+
+
+@pytest.fixture(autouse=True)
+def no_stale(monkeypatch):
+    # These tests look at the fresh tiers only; SWR has its own module
+    monkeypatch.setattr(settings, "STALE_WHILE_REVALIDATE", False)
+
+
+def _store(cache, user_id, algo="bfs", k=10, items=(1, 2, 3)):
+    body = cache.encode_body(user_id, [{"id": i} for i in items])
+    cache.set_recs(cache.make_ticket(user_id, algo, k), body)
+    return body
+
+
+def test_key_embeds_generation_and_epoch(cache):
+    assert cache.rec_key(7, "bfs", 10) == "rec:7:g0:e0:bfs:10"
+    cache.invalidate_user(7)
+    assert cache.rec_key(7, "bfs", 10) == "rec:7:g1:e0:bfs:10"
+    cache.bump_epoch()
+    assert cache.rec_key(7, "bfs", 10) == "rec:7:g1:e1:bfs:10"
+
+
+def test_invalidate_user_is_a_counter_bump(cache, redis_client):
+    _store(cache, 1)
+    old_key = cache.rec_key(1, "bfs", 10)
+
+    cache.invalidate_user(1)
+
+    body, tier, _ = cache.get_recs(1, "bfs", 10)
+    assert (body, tier) == (None, None)
+    # The old entry is left to expire instead of being deleted
+    assert redis_client.exists(old_key)
+    assert 0 < redis_client.ttl(old_key) <= cache.ttl_for("bfs")
+
+
+def test_invalidate_user_leaves_other_users(cache):
+    body = _store(cache, 2)
+    _store(cache, 3)
+
+    cache.invalidate_user(3)
+
+    assert cache.get_recs(2, "bfs", 10)[:2] == (body, "l1")
+    assert cache.get_recs(3, "bfs", 10)[1] is None
+
+
+def test_bump_epoch_invalidates_everyone(cache):
+    for user_id in (1, 2):
+        _store(cache, user_id)
+
+    cache.bump_epoch()
+
+    for user_id in (1, 2):
+        assert cache.get_recs(user_id, "bfs", 10)[1] is None
+
+
+def test_every_algorithm_gets_its_own_ttl(cache, redis_client):
+    for algo in ("bfs", "ppr", "graphsage", "hybrid"):
+        _store(cache, 1, algo=algo)
+        assert 0 < redis_client.ttl(cache.rec_key(1, algo, 10)) <= cache.ttl_for(algo)
+
+
+def test_l2_hit_refills_l1(cache):
+    body = _store(cache, 4)
+    cache.rec_l1.clear()  # as on another worker
+
+    assert cache.get_recs(4, "bfs", 10)[:2] == (body, "l2")
+    assert cache.get_recs(4, "bfs", 10)[:2] == (body, "l1")
+
+
+def test_peer_invalidation_drops_l1(cache):
+    _store(cache, 5)
+
+    cache._handle_message(json.dumps({"type": "user", "user_id": 5}))
+
+    assert cache.rec_l1.get((5, "bfs", 10)) is None
+
+
+def test_write_racing_an_invalidation_is_not_served(cache):
+    ticket = cache.make_ticket(6, "bfs", 10)
+    cache.invalidate_user(6)  # a Like lands while the list is being computed
+
+    cache.set_recs(ticket, cache.encode_body(6, [{"id": 1}]))
+
+    assert cache.rec_l1.get((6, "bfs", 10)) is None
+    assert cache.get_recs(6, "bfs", 10)[1] is None
+
+
+def test_invalidation_stamps_stay_bounded(cache, monkeypatch):
+    monkeypatch.setattr(settings, "L1_CACHE_SIZE", 4)
+    ticket = cache.make_ticket(1, "bfs", 10)  # taken before user 1's invalidation
+
+    for user_id in range(1, 11):
+        cache.drop_local_user(user_id)
+
+    assert len(cache._stamps) <= 4 and 1 not in cache._stamps
+    # User 1's stamp is forgotten, yet the racing write still doesn't reach L1
+    cache.set_recs(ticket, cache.encode_body(1, [{"id": 9}]))
+    assert cache.rec_l1.get((1, "bfs", 10)) is None
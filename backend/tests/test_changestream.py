@@ -0,0 +1,114 @@
+"""Interaction change stream: publish, tail, resume offsets and replay windows."""
+import time
+
+import pytest
+
+from app.config import settings
+from app.core import changestream
+
+
+class Graph:
+    """Just the engine writes the stream applies."""
+
+    def __init__(self):
+        self.edges = set()
+
+    def add_interaction(self, user_id, item_id, ts):
+        self.edges.add((user_id, item_id))
+
+    def remove_interaction(self, user_id, item_id):
+        self.edges.discard((user_id, item_id))
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "change stream did not catch up"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def tail(redis_client, monkeypatch):
+    """Starts a tail on a fresh Graph; returns (graph, start_fn)."""
+    monkeypatch.setattr(settings, "CHANGESTREAM_BLOCK_MS", 50)
+    graph = Graph()
+    yield graph, lambda offset=None: changestream.start(graph, offset)
+    changestream.stop()
+
+
+def test_replicas_converge_on_stream_order(tail):
+    graph, start = tail
+    start("0-0")
+
+    changestream.publish(changestream.OP_ADD, 1, 10, 100)
+    changestream.publish(changestream.OP_ADD, 1, 11, 101)
+    last = changestream.publish(changestream.OP_REMOVE, 1, 10)  # e.g. from another replica
+
+    _wait_until(lambda: changestream.offset() == last)
+    assert graph.edges == {(1, 11)}
+
+
+def test_tail_resumes_after_its_offset(tail, redis_client):
+    graph, start = tail
+    changestream.publish(changestream.OP_ADD, 2, 20, 1)
+    watermark = changestream.publish(changestream.OP_ADD, 2, 21, 1)
+    last = changestream.publish(changestream.OP_ADD, 2, 22, 1)
+
+    start(watermark)  # a snapshot that already includes 20 and 21
+
+    _wait_until(lambda: changestream.offset() == last)
+    assert graph.edges == {(2, 22)}
+    assert redis_client.hget(changestream.OFFSETS_KEY, settings.REPLICA_ID) == last
+
+
+def test_position_replays_recent_entries(tail):
+    graph, start = tail
+    changestream.publish(changestream.OP_ADD, 3, 30, 1)
+
+    start(changestream.position(settings.CHANGESTREAM_REPLAY_MS))
+    last = changestream.publish(changestream.OP_ADD, 3, 31, 1)
+
+    _wait_until(lambda: changestream.offset() == last)
+    assert graph.edges == {(3, 30), (3, 31)}
+
+
+def test_position_includes_an_entry_from_the_same_millisecond(redis_client, monkeypatch):
+    entry_id = changestream.publish(changestream.OP_ADD, 4, 40, 1)
+    ms = int(entry_id.split("-")[0])
+    monkeypatch.setattr(redis_client, "time", lambda: (ms // 1000, (ms % 1000) * 1000))
+
+    ((_, entries),) = redis_client.xread({settings.CHANGESTREAM_KEY: changestream.position()})
+
+    assert [entry for entry, _ in entries] == [entry_id]
+
+
+def test_without_an_offset_only_new_entries_are_applied(tail):
+    graph, start = tail
+    changestream.publish(changestream.OP_ADD, 5, 50, 1)
+    time.sleep(0.005)  # position() is taken on a later millisecond
+
+    start()
+    last = changestream.publish(changestream.OP_ADD, 5, 51, 1)
+
+    _wait_until(lambda: changestream.offset() == last)
+    assert graph.edges == {(5, 51)}
+
+
+def test_applied_entries_drop_local_lists(tail, cache):
+    graph, start = tail
+    cache.set_recs(cache.make_ticket(6, "bfs", 10), cache.encode_body(6, [{"id": 1}]))
+    start("0-0")
+
+    last = changestream.publish(changestream.OP_ADD, 6, 60, 1)
+
+    _wait_until(lambda: changestream.offset() == last)
+    assert cache.rec_l1.get((6, "bfs", 10)) is None
+
+
+def test_bulk_edges_are_published_in_batches(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "CHANGESTREAM_BATCH", 3)
+
+    changestream.publish_edges([(7, item, 1) for item in range(10)])
+
+    entries = redis_client.xrange(settings.CHANGESTREAM_KEY)
+    assert [int(fields["item_id"]) for _, fields in entries] == list(range(10))
@@ -0,0 +1,87 @@
+"""Genre-segmented cold-start lists: decayed ranking, precomputed combos and the merge fallback."""
+import time
+
+import pytest
+
+from app.api import recommend
+from app.config import settings
+from app.core import coldstart
+from app.db import crud, models
+
+DAY = 86400
+DRAMA, HORROR, COMEDY = (crud.get_genre_id(g) for g in ("Drama", "Horror", "Comedy"))
+
+
+@pytest.fixture
+def catalog(db, monkeypatch):
+    monkeypatch.setattr(coldstart, "_ranked", {})
+    monkeypatch.setattr(coldstart, "_lists", {})
+    now = int(time.time())
+    db.add_all([
+        models.Item(id=1, category="Drama"), models.Item(id=2, category="Drama"), models.Item(id=3, category="Drama"),
+        models.Item(id=4, category="Horror"), models.Item(id=5, category="Comedy"),
+    ])
+    db.add_all([
+        # Item 1: three Likes a year old (~0.15 each); item 2: one fresh Like (1.0)
+        *(models.Interaction(user_id=u, item_id=1, timestamp=now - 365 * DAY) for u in (1, 2, 3)),
+        models.Interaction(user_id=1, item_id=2, timestamp=now),
+        models.Interaction(user_id=2, item_id=4, timestamp=now - 10 * DAY),
+        models.Interaction(user_id=3, item_id=5, timestamp=now),
+        models.Interaction(user_id=4, item_id=5, timestamp=now),
+    ])
+    db.commit()
+    coldstart.build(db)
+    return db
+
+
+def test_recent_likes_outrank_older_ones(catalog):
+    # Item 3 has no Likes: last, but still listed
+    assert coldstart.lookup([DRAMA]) == [2, 1, 3]
+
+
+def test_combos_merge_genres_by_score(catalog):
+    assert coldstart.lookup([DRAMA, COMEDY])[:2] == [5, 2]  # 2.0 beats 1.0
+    assert coldstart.lookup([COMEDY, DRAMA]) == coldstart.lookup([DRAMA, COMEDY])
+    assert frozenset({DRAMA, COMEDY}) in coldstart._lists
+
+
+def test_more_genres_than_precomputed_combos_are_merged(catalog, monkeypatch):
+    monkeypatch.setattr(settings, "COLDSTART_MAX_COMBO", 1)
+    coldstart.build(catalog)
+    merged = coldstart.coldstart_stats["merged"]
+
+    assert coldstart.lookup([DRAMA, HORROR, COMEDY]) == [5, 2, 4, 1, 3]
+    assert coldstart.coldstart_stats["merged"] == merged + 1
+
+
+def test_unknown_genres_miss(catalog):
+    assert coldstart.lookup([]) == []
+    assert coldstart.lookup([999]) == []
+
+
+def test_top_n_bounds_every_list(catalog, monkeypatch):
+    monkeypatch.setattr(settings, "COLDSTART_TOP_N", 2)
+    coldstart.build(catalog)
+
+    assert coldstart.lookup([DRAMA]) == [2, 1]
+    assert len(coldstart.lookup([DRAMA, HORROR, COMEDY])) == 2
+
+
+def test_new_user_gets_their_genres_first(catalog, monkeypatch):
+    monkeypatch.setattr(recommend, "get_engine", lambda: None)
+    catalog.add(models.UserPreference(user_id=50, genre_id=HORROR))
+    catalog.commit()
+
+    results = recommend.build_recommendations(catalog, 50, "bfs", 3)
+
+    assert (results[0]["id"], results[0]["reason"]) == (4, "Popular in Your Genres")
+    assert {r["reason"] for r in results[1:]} == {"Global Trending"}
+
+
+def test_catalog_change_wakes_the_builder(cache):
+    coldstart._wake.clear()
+
+    cache.invalidate_catalog()
+
+    assert coldstart._wake.is_set()
+    coldstart._wake.clear()
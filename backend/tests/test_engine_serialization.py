@@ -0,0 +1,162 @@
+"""
+Engine.dumps / loads / dump_to / load_from checked against a Python reader and
+writer of the graph.bin layout:
+
+    size_t n_genres, n_genres x (int item, int genre)
+    2 x (size_t n_nodes, n_nodes x (int node, size_t degree, degree x pair<int, long>))
+
+user -> items first, then item -> users. Native byte order; pair<int, long> is
+padded to 16 bytes on LP64, the only layout this test knows.
+"""
+import io
+import struct
+
+import pytest
+
+pytestmark = pytest.mark.skipif(struct.calcsize("l") != 8, reason="graph.bin layout here assumes LP64")
+
+SIZE = struct.Struct("=Q")
+GENRE = struct.Struct("=ii")
+NODE = struct.Struct("=iQ")
+EDGE = struct.Struct("=i4xq")
+
+
+def decode(image: bytes):
+    """Returns (genres, user_items, item_users) with edge lists as sets of (node, ts)."""
+    pos = 0
+
+    def take(fmt):
+        nonlocal pos
+        values = fmt.unpack_from(image, pos)
+        pos += fmt.size
+        return values
+
+    (n_genres,) = take(SIZE)
+    genres = dict(take(GENRE) for _ in range(n_genres))
+    graphs = []
+    for _ in range(2):
+        (n_nodes,) = take(SIZE)
+        graph = {}
+        for _ in range(n_nodes):
+            node, degree = take(NODE)
+            graph[node] = {take(EDGE) for _ in range(degree)}
+        graphs.append(graph)
+    assert pos == len(image), "trailing bytes"
+    return genres, graphs[0], graphs[1]
+
+
+def encode(genres: dict, user_items: dict, item_users: dict) -> bytes:
+    out = [SIZE.pack(len(genres))] + [GENRE.pack(item, genre) for item, genre in genres.items()]
+    for graph in (user_items, item_users):
+        out.append(SIZE.pack(len(graph)))
+        for node, edges in graph.items():
+            out.append(NODE.pack(node, len(edges)))
+            out.extend(EDGE.pack(other, ts) for other, ts in edges)
+    return b"".join(out)
+
+
+EDGES = [(u, i, 1_700_000_000 + 37 * u + i) for u in range(1, 30) for i in range(u % 5, 40, 3)]
+GENRES = {3: 28, 7: 12, 11: 35}
+
+
+def reference():
+    """What the engine should hold for EDGES / GENRES, built in Python."""
+    user_items, item_users = {}, {}
+    for u, i, ts in EDGES:
+        user_items.setdefault(u, set()).add((i, ts))
+        item_users.setdefault(i, set()).add((u, ts))
+    return GENRES, user_items, item_users
+
+
+@pytest.fixture
+def loaded(cpp_engine):
+    for u, i, ts in EDGES:
+        cpp_engine.add_interaction(u, i, ts)
+    for item, genre in GENRES.items():
+        cpp_engine.set_item_genre(item, genre)
+    return cpp_engine
+
+
+def test_dumps_matches_the_python_reader(loaded):
+    assert decode(loaded.dumps()) == reference()
+
+
+def test_loads_accepts_a_python_written_image(cpp_engine):
+    genres, user_items, item_users = reference()
+
+    cpp_engine.loads(encode(genres, user_items, item_users))
+
+    assert cpp_engine.get_edge_count() == len(EDGES)
+    assert cpp_engine.get_user_count() == len(user_items)
+    assert decode(cpp_engine.dumps()) == reference()
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview])
+def test_loads_takes_any_buffer(loaded, wrap):
+    recommender = pytest.importorskip("recommender")
+    copy = recommender.Engine()
+
+    copy.loads(wrap(loaded.dumps()))
+
+    assert decode(copy.dumps()) == reference()
+
+
+def test_dump_to_and_load_from_stream_the_same_image(loaded):
+    recommender = pytest.importorskip("recommender")
+    sink = io.BytesIO()
+
+    size = loaded.dump_to(sink.write, 100)
+
+    assert size == len(sink.getvalue())
+    assert decode(sink.getvalue()) == reference()
+    copy = recommender.Engine()
+    sink.seek(0)
+    copy.load_from(sink.read)
+    assert decode(copy.dumps()) == reference()
+
+
+def test_truncated_image_leaves_the_graph_alone(loaded):
+    image = loaded.dumps()
+
+    with pytest.raises(RuntimeError, match="Truncated"):
+        loaded.loads(image[:-5])
+    with pytest.raises(RuntimeError, match="Truncated"):
+        loaded.load_from(io.BytesIO(image[: len(image) // 2]).read)
+
+    assert decode(loaded.dumps()) == reference()
+
+
+def test_dumps_is_a_point_in_time_copy(loaded):
+    image = loaded.dumps()
+    loaded.add_interaction(99, 1, 5)
+    loaded.remove_interaction(1, 1)
+
+    _, user_items, _ = decode(loaded.dumps())
+
+    assert user_items[99] == {(1, 5)}
+    assert 1 not in {i for i, _ in user_items[1]}
+    assert decode(image) == reference()
+
+
+def test_corrupt_degree_is_refused_before_allocating(loaded):
+    _, user_items, item_users = reference()
+    image = bytearray(encode({}, user_items, item_users))
+    SIZE.pack_into(image, 2 * SIZE.size + 4, 1 << 40)  # n_genres, n_nodes, first node: its degree
+
+    with pytest.raises(RuntimeError, match="Truncated"):
+        loaded.loads(image)
+    with pytest.raises(RuntimeError, match="Truncated"):
+        loaded.load_from(io.BytesIO(image).read)  # size unknown: fails on the first missing read
+
+    assert decode(loaded.dumps()) == reference()
+
+
+def test_trailing_bytes_are_refused(loaded):
+    image = loaded.dumps()
+
+    with pytest.raises(RuntimeError, match="trailing bytes"):
+        loaded.loads(image + b"\0" * 8)
+    with pytest.raises(RuntimeError, match="trailing bytes"):
+        loaded.load_from(io.BytesIO(image + b"\0" * 8).read, len(image) + 8)
+
+    assert decode(loaded.dumps()) == reference()
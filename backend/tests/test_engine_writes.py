@@ -0,0 +1,68 @@
+"""Engine writes: idempotent adds (single and bulk) and the delta buffer that takes writes during a dump."""
+import threading
+
+from .test_engine_serialization import decode
+
+
+def _edges(engine):
+    _, user_items, _ = decode(engine.dumps())
+    return {(u, i) for u, items in user_items.items() for i, _ in items}
+
+
+def test_adds_are_idempotent(cpp_engine):
+    cpp_engine.add_interaction(1, 10, 100)
+    mutations = cpp_engine.get_mutation_count()
+
+    cpp_engine.add_interaction(1, 10, 200)  # a replay: the first timestamp stays
+
+    assert cpp_engine.get_mutation_count() == mutations
+    assert decode(cpp_engine.dumps())[1] == {1: {(10, 100)}}
+
+
+def test_bulk_add_skips_rows_the_graph_or_the_batch_already_has(cpp_engine):
+    cpp_engine.add_interaction(1, 10, 100)
+
+    cpp_engine.add_interactions([1, 1, 2, 1, 2], [10, 11, 10, 11, 10], [1, 2, 3, 4, 5])
+
+    assert cpp_engine.get_edge_count() == 3
+    assert cpp_engine.get_mutation_count() == 3
+    _, user_items, item_users = decode(cpp_engine.dumps())
+    assert user_items == {1: {(10, 100), (11, 2)}, 2: {(10, 3)}}
+    assert item_users == {10: {(1, 100), (2, 3)}, 11: {(1, 2)}}
+
+
+def test_bulk_add_of_one_heavy_user(cpp_engine):
+    items = list(range(20_000))
+
+    cpp_engine.add_interactions([7] * len(items), items, items)
+    cpp_engine.add_interactions([7] * len(items), items, items)  # the whole load replayed
+
+    assert cpp_engine.get_edge_count() == len(items)
+    assert cpp_engine.get_item_count() == len(items)
+
+
+def test_writes_during_dumps_land_once(cpp_engine):
+    # Big enough that dumps() takes a while: writes overlapping it go to the delta buffer
+    users = list(range(1, 200))
+    for u in users:
+        cpp_engine.add_interactions([u] * 500, list(range(500)), [1] * 500)
+    done = threading.Event()
+
+    def writer():
+        for round_ in range(200):
+            cpp_engine.add_interactions([1, 1, 2], [900, 900, 901], [round_] * 3)
+            cpp_engine.remove_interaction(3, round_)
+            cpp_engine.add_interaction(3, round_, 5)
+            cpp_engine.remove_interaction(2, 901)
+        done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while not done.is_set():
+        _, user_items, _ = decode(cpp_engine.dumps())
+        assert all(len({i for i, _ in edges}) == len(edges) for edges in user_items.values())
+    thread.join()
+
+    edges = _edges(cpp_engine)
+    assert (1, 900) in edges and (2, 901) not in edges
+    assert cpp_engine.get_edge_count() == len(edges) == len(users) * 500 + 1
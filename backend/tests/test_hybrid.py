@@ -0,0 +1,52 @@
+"""Hybrid blend: normalization, the shared deadline, and keeping partial blends out of the cache."""
+import time
+
+import pytest
+
+from app.api import recommend
+from app.core import hybrid
+
+
+def _generator(items, scores, delay=0.0):
+    def run(user_id, n, pref_ids, seen_ids, item_map, budget_us, deadline):
+        time.sleep(delay)
+        return items, scores, True
+    return run
+
+
+@pytest.fixture
+def generators(monkeypatch):
+    monkeypatch.setattr(hybrid, "WEIGHTS", {"bfs": 1.0, "ppr": 0.4, "graphsage": 1.0})
+    monkeypatch.setattr(hybrid, "GENERATORS", {
+        "bfs": _generator([1, 2, 3], [30.0, 20.0, 10.0]),
+        "ppr": _generator([3, 4], [9.0, 1.0]),
+        "graphsage": _generator([5], [0.9], delay=0.3),  # misses a 50 ms deadline
+    })
+
+
+def test_normalize_maps_to_unit_range():
+    assert hybrid.normalize([10.0, 20.0, 30.0]) == [0.0, 0.5, 1.0]
+    assert hybrid.normalize([7.0]) == [1.0]
+    assert hybrid.normalize([]) == []
+
+
+def test_late_generator_is_dropped_from_the_blend(generators):
+    dropped = hybrid.hybrid_stats["dropped_graphsage"]
+
+    ranked, finished, total = hybrid.blend(1, 10, [], set(), {}, budget_ms=50)
+
+    # bfs: 1 -> 1.0, 2 -> 0.5, 3 -> 0.0; ppr (x0.4): 3 -> 0.4, 4 -> 0.0
+    assert ranked[:3] == [1, 2, 3] and set(ranked) == {1, 2, 3, 4}
+    assert (finished, total) == (2, 3)
+    assert hybrid.hybrid_stats["dropped_graphsage"] == dropped + 1
+
+
+def test_partial_blend_is_reported_without_a_budget(db, monkeypatch):
+    monkeypatch.setattr(recommend, "get_engine", lambda: None)
+    monkeypatch.setattr(hybrid, "blend", lambda *args: ([11, 12], 2, 3))
+    work = {}
+
+    results = recommend.build_recommendations(db, 1, "hybrid", 2, work=work)
+
+    assert [r["id"] for r in results] == [11, 12]
+    assert work == {"work_done": 2, "work_total": 3, "completed": False}
@@ -0,0 +1,239 @@
+"""Write-behind ingestion: log durability, replay after a crash, adoption and dead-lettering."""
+import json
+import os
+import threading
+import time
+
+import pytest
+from sqlalchemy import select
+
+from app.config import settings
+from app.core import ingest
+from app.db.models import Interaction
+from app.db.session import engine
+
+pytestmark = pytest.mark.usefixtures("db")
+
+
+def _edges():
+    with engine.connect() as conn:
+        return set(conn.execute(select(Interaction.user_id, Interaction.item_id)).all())
+
+
+def _entry(seq, user_id, item_id, op=ingest.OP_ADD):
+    return {"op": op, "user_id": user_id, "item_id": item_id, "ts": 1_700_000_000 + seq, "seq": seq}
+
+
+def _crash(wal):
+    """Drops a FileLog's handles without flushing, as if its process died."""
+    wal._f.close()
+    wal._owner.close()
+
+
+@pytest.fixture
+def wal_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "ingest.wal")
+    monkeypatch.setattr(settings, "INGEST_WAL_PATH", path)
+    monkeypatch.setattr(settings, "INGEST_LOG", "file")
+    return path
+
+
+@pytest.fixture(autouse=True)
+def reset_ingest():
+    yield
+    ingest.stop(timeout=5)
+    ingest._log = ingest._thread = None
+    ingest._queue.clear()
+    ingest._overlay.clear()
+
+
+def test_wal_lines_survive_a_crash(wal_path):
+    wal = ingest.FileLog(wal_path)
+    entries = [_entry(1, 1, 10), _entry(2, 1, 11), _entry(3, 1, 10, ingest.OP_REMOVE)]
+    for e in entries:
+        wal.sync(wal.write(e))
+    _crash(wal)
+
+    assert ingest.FileLog(wal_path).pending() == entries
+
+
+def test_recover_replays_the_last_op_per_pair(wal_path):
+    wal = ingest.FileLog(wal_path)
+    for e in (_entry(1, 1, 10), _entry(2, 1, 11), _entry(3, 1, 10, ingest.OP_REMOVE), _entry(4, 2, 10)):
+        wal.write(e)
+    wal.seal()  # one batch was mid-flush ...
+    wal.write(_entry(5, 2, 12))  # ... and one line still in the live segment
+    _crash(wal)
+
+    assert ingest.recover() == 5
+    assert _edges() == {(1, 11), (2, 10), (2, 12)}
+    assert ingest._log.pending() == []
+
+
+def test_group_fsync_covers_earlier_lines(wal_path, monkeypatch):
+    wal = ingest.FileLog(wal_path)
+    fsyncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: fsyncs.append(fd) or real_fsync(fd))
+
+    tickets = [wal.write(_entry(i, 1, i)) for i in range(1, 4)]
+    for ticket in reversed(tickets):
+        wal.sync(ticket)
+
+    assert len(fsyncs) == 1
+
+
+def test_a_dead_workers_wal_is_adopted(wal_path):
+    dead = ingest.FileLog(wal_path)
+    live = ingest.FileLog(wal_path)  # lock taken: falls back to '<path>.<pid>'
+    assert live.path != dead.path
+    dead.write(_entry(1, 3, 30))
+
+    assert list(live.orphans()) == []  # owner still holds its lock
+    _crash(dead)
+    ingest._log = live
+
+    assert ingest.adopt_orphans() == 1
+    assert _edges() == {(3, 30)}
+    assert not os.path.exists(dead.path)
+
+
+def test_submit_is_visible_before_and_after_the_flush(wal_path, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_FLUSH_MS", 10)
+    ingest.recover()
+    ingest.start()
+
+    ingest.submit(ingest.OP_ADD, 4, 40)
+    assert ingest.overlay(4, set()) == {40}
+
+    deadline = time.monotonic() + 5
+    while (4, 40) not in _edges():
+        assert time.monotonic() < deadline, "batch was not flushed"
+        time.sleep(0.01)
+    ingest.stop(timeout=5)
+    assert ingest.stats()["pending_users"] == 0
+    assert ingest._log.pending() == []
+
+
+def test_rows_that_keep_failing_are_dead_lettered(wal_path, monkeypatch):
+    ingest._log = ingest.FileLog(wal_path)
+    real_write = ingest.write_batch
+
+    def write_batch(entries):
+        if any(e["item_id"] == 666 for e in entries):
+            raise ValueError("rejected row")
+        real_write(entries)
+
+    monkeypatch.setattr(ingest, "write_batch", write_batch)
+    batch = [_entry(1, 5, 50), _entry(2, 5, 666)]
+
+    ingest._dead_letter(batch, ValueError("rejected row"))
+
+    assert _edges() == {(5, 50)}
+    with open(ingest._log.dead_path, encoding="utf-8") as f:
+        dead = [json.loads(line) for line in f]
+    assert [(d["item_id"], d["error"]) for d in dead] == [(666, "rejected row")]
+
+
+class TestRedisLog:
+    @pytest.fixture(autouse=True)
+    def _redis(self, redis_client):
+        self.redis = redis_client
+
+    def _append(self, log, *entries):
+        for e in entries:
+            e["log_id"] = log.append(e)
+        return list(entries)
+
+    def test_pending_writes_are_shared_across_workers(self):
+        w1, w2 = ingest.RedisStreamLog("w1"), ingest.RedisStreamLog("w2")
+        self._append(w1, _entry(1, 6, 60), _entry(2, 6, 61, ingest.OP_REMOVE))
+
+        assert w2.shared_pending(6) == {60: ingest.OP_ADD, 61: ingest.OP_REMOVE}
+
+    def test_settle_keeps_a_newer_write(self):
+        w1, w2 = ingest.RedisStreamLog("w1"), ingest.RedisStreamLog("w2")
+        (first,) = self._append(w1, _entry(1, 7, 70))
+        self._append(w2, _entry(1, 7, 70, ingest.OP_REMOVE))
+
+        w1.settle([first])
+
+        assert w1.shared_pending(7) == {70: ingest.OP_REMOVE}
+
+    def test_only_lapsed_workers_are_adopted(self):
+        dead, alive = ingest.RedisStreamLog("dead"), ingest.RedisStreamLog("alive")
+        self._append(dead, _entry(1, 8, 80))
+        self._append(alive, _entry(1, 8, 81))
+        self.redis.delete(ingest.ALIVE_KEY + "dead")  # heartbeat lapsed
+        ingest._log = ingest.RedisStreamLog("adopter")
+
+        assert ingest.adopt_orphans() == 1
+        assert _edges() == {(8, 80)}
+        assert not self.redis.exists(f"{ingest.STREAM_KEY}:dead")
+        assert self.redis.xlen(f"{ingest.STREAM_KEY}:alive") == 1
+        assert ingest._log.shared_pending(8) == {81: ingest.OP_ADD}
+
+    def test_adoption_keeps_entries_logged_after_the_read(self):
+        stalled = ingest.RedisStreamLog("stalled")
+        self._append(stalled, _entry(1, 9, 90))
+        self.redis.delete(ingest.ALIVE_KEY + "stalled")
+        adopter = ingest.RedisStreamLog("adopter")
+
+        ((entries, release),) = adopter.orphans()
+        self._append(stalled, _entry(2, 9, 91))  # logged between the read and the release
+        release()
+
+        remaining = ingest.RedisStreamLog._read(stalled.stream)
+        assert [e["item_id"] for e in entries] == [90]
+        assert [e["item_id"] for e in remaining] == [91]
+        assert "stalled" in self.redis.smembers(ingest.WORKERS_KEY)
+
+    def test_adoption_backs_off_when_the_owner_comes_back(self):
+        stalled = ingest.RedisStreamLog("stalled")
+        self._append(stalled, _entry(1, 9, 90))
+        self.redis.delete(ingest.ALIVE_KEY + "stalled")
+
+        ((_, release),) = ingest.RedisStreamLog("adopter").orphans()
+        stalled.heartbeat()
+        release()
+
+        assert self.redis.xlen(stalled.stream) == 1
+        assert not self.redis.exists(ingest.ADOPT_KEY + "stalled")
+
+    def test_heartbeat_re_registers_a_forgotten_worker(self):
+        worker = ingest.RedisStreamLog("w1")
+        self.redis.srem(ingest.WORKERS_KEY, "w1")
+
+        worker.heartbeat()
+
+        assert "w1" in self.redis.smembers(ingest.WORKERS_KEY)
+
+    def test_heartbeat_runs_while_the_flusher_is_stuck(self, monkeypatch):
+        monkeypatch.setattr(settings, "INGEST_LOG", "redis")
+        monkeypatch.setattr(settings, "INGEST_OWNER_TTL_MS", 150)
+        ingest.recover()  # no flusher started: nothing else refreshes the key
+        alive = ingest.ALIVE_KEY + ingest.WORKER_ID
+
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            assert self.redis.exists(alive)
+            time.sleep(0.02)
+
+    def test_log_order_matches_queue_order(self, monkeypatch):
+        monkeypatch.setattr(settings, "INGEST_LOG", "redis")
+        ingest.recover()
+
+        def like_unlike(n):
+            for i in range(20):
+                ingest.submit(ingest.OP_ADD if (n + i) % 2 else ingest.OP_REMOVE, 10, 100)
+
+        threads = [threading.Thread(target=like_unlike, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        logged = [e["log_id"] for e in ingest._log.pending()]
+        assert [e["log_id"] for e in ingest._queue] == logged
+        assert [e["seq"] for e in ingest._queue] == sorted(e["seq"] for e in ingest._queue)
+        assert ingest.overlay(10, set()) == ({100} if ingest._queue[-1]["op"] == ingest.OP_ADD else set())
@@ -0,0 +1,84 @@
+"""The in-process L1 LRU and the pub/sub broadcast that keeps it coherent across workers."""
+import json
+import time
+
+import pytest
+
+from app.core.cache import LRUCache
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_evicts_the_least_recently_used():
+    lru = LRUCache(maxsize=2, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")  # b is now the oldest
+
+    lru.set("c", 3)
+
+    assert (lru.get("a"), lru.get("b"), lru.get("c")) == (1, None, 3)
+    assert lru.stats() == {"size": 2, "hits": 3, "misses": 1}
+
+
+def test_entries_expire_after_their_ttl():
+    lru = LRUCache(maxsize=4, ttl=60)
+    lru.set("short", 1, ttl=0.05)
+    lru.set("long", 2)
+
+    time.sleep(0.1)
+
+    assert lru.get("short") is None and lru.get("long") == 2
+    assert lru.stats()["size"] == 1
+
+
+def test_pop_where_returns_only_live_entries():
+    lru = LRUCache(maxsize=8, ttl=60)
+    lru.set((1, "bfs", 10), "a")
+    lru.set((1, "ppr", 10), "b", ttl=0.01)
+    lru.set((2, "bfs", 10), "c")
+    time.sleep(0.05)
+
+    popped = lru.pop_where(lambda key: key[0] == 1)
+
+    assert popped == [((1, "bfs", 10), "a")]
+    assert lru.stats()["size"] == 1
+
+
+@pytest.fixture
+def listener(cache, redis_client):
+    thread = cache.start_invalidation_listener()
+    _wait_until(lambda: redis_client.pubsub_numsub(cache.INVALIDATION_CHANNEL)[0][1] > 0)
+    yield cache
+    cache.stop_invalidation_listener()
+    thread.join(5)
+
+
+def test_another_workers_invalidation_reaches_this_l1(listener, redis_client):
+    cache = listener
+    cache.rec_l1.set((3, "bfs", 10), b"[]")
+    cache.rec_l1.set((4, "bfs", 10), b"[]")
+    cache.profile_l1.set("uuid-3", 3)
+
+    # What invalidate_user / invalidate_profile on another worker broadcast
+    redis_client.publish(cache.INVALIDATION_CHANNEL, json.dumps({"type": "user", "user_id": 3}))
+    redis_client.publish(cache.INVALIDATION_CHANNEL, json.dumps({"type": "profile", "uuid": "uuid-3"}))
+
+    _wait_until(lambda: cache.profile_l1.get("uuid-3") is None)
+    assert cache.rec_l1.get((3, "bfs", 10)) is None
+    assert cache.rec_l1.get((4, "bfs", 10)) == b"[]"
+
+
+def test_epoch_broadcast_clears_every_user(listener, redis_client):
+    cache = listener
+    for user_id in (5, 6):
+        cache.rec_l1.set((user_id, "bfs", 10), b"[]")
+
+    redis_client.publish(cache.INVALIDATION_CHANNEL, json.dumps({"type": "epoch"}))
+
+    _wait_until(lambda: cache.rec_l1.stats()["size"] == 0)
@@ -0,0 +1,100 @@
+"""Queued structured logging: formats, level and sampling filters, a full queue and request ids."""
+import asyncio
+import json
+
+import pytest
+
+from app.config import settings
+from app.core import log
+
+
+@pytest.fixture
+def lines(capsys):
+    """Stops the writer (joined, so nothing is in flight) and returns what it printed since the last call."""
+    log.stop()
+    capsys.readouterr()
+
+    def written():
+        log.stop()
+        return capsys.readouterr().out.splitlines()
+
+    return written
+
+
+def test_text_record_carries_fields_and_request_id():
+    record = (0.0, log.INFO, "Auth", "Profile created", "abc123", {"user_id": 7})
+
+    assert log._format(record) == "[Auth] Profile created user_id=7 (req abc123)"
+
+
+def test_json_record(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_FORMAT", "json")
+
+    doc = json.loads(log._format((1.23456, log.WARNING, "Core", "slow", None, {"ms": 12})))
+
+    assert doc == {"ts": 1.235, "level": "WARNING", "tag": "Core", "msg": "slow", "ms": 12}
+
+
+def test_records_reach_stdout_through_the_writer(lines):
+    log.info("Import", "done", inserted=3)
+    log.engine_sink(log.WARNING, "graph image truncated")
+
+    assert lines() == ["[Import] done inserted=3", "[C++] graph image truncated"]
+
+
+def test_filters_drop_at_the_call_site(lines, monkeypatch):
+    monkeypatch.setattr(log, "_min_level", log.INFO)
+    monkeypatch.setattr(log, "_sample_rates", {"Auth": 0.0})
+    before = log.log_stats["sampled_out"]
+
+    log.debug("Core", "hidden")
+    log.info("Auth", "sampled away")
+    log.info("Core", "sampled away too", sample=0.0)
+    log.warning("Auth", "kept: warnings are never sampled")
+
+    assert lines() == ["[Auth] kept: warnings are never sampled"]
+    assert log.log_stats["sampled_out"] == before + 2
+
+
+def test_full_queue_drops_instead_of_blocking(lines, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_QUEUE_SIZE", 0)
+    before = log.log_stats["dropped_full"]
+
+    log.error("Core", "nowhere to go")
+
+    assert log.log_stats["dropped_full"] == before + 1
+    assert lines() == []
+
+
+def test_parse_rates():
+    assert log._parse_rates("Auth=0.1, Core=1") == {"Auth": 0.1, "Core": 1.0}
+    assert log._parse_rates("") == {}
+
+
+def _call(headers=()):
+    """Runs one request through RequestIdMiddleware; returns (response headers, id seen by the app)."""
+    seen, sent = [], []
+
+    async def app(scope, receive, send):
+        seen.append(log.request_id.get())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": list(headers)}
+    asyncio.run(log.RequestIdMiddleware(app)(scope, None, send))
+    return dict(sent[0]["headers"]), seen[0]
+
+
+def test_request_id_is_taken_from_the_header_and_echoed():
+    headers, rid = _call([(b"x-request-id", b"trace-42")])
+
+    assert rid == "trace-42" and headers[b"x-request-id"] == b"trace-42"
+    assert log.request_id.get() is None  # unbound after the request
+
+
+def test_request_id_is_generated_when_missing():
+    headers, rid = _call()
+
+    assert len(rid) == 16 and headers[b"x-request-id"] == rid.encode()
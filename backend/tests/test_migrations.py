@@ -0,0 +1,59 @@
+"""Startup migrations: dialect check, interaction dedupe and the unique (user_id, item_id) index."""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import inspect, text
+
+from app.db import crud, migrations, models
+from app.db.session import engine
+
+
+def _indexes():
+    return {ix["name"] for ix in inspect(engine).get_indexes("interactions")}
+
+
+@pytest.fixture
+def legacy_table(db):
+    """interactions as created before the pair index: duplicates allowed, user_id index."""
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX {migrations.INTERACTION_PAIR_INDEX}"))
+        conn.execute(text("CREATE INDEX ix_interactions_user_id ON interactions (user_id)"))
+    db.add_all([
+        models.Interaction(id=1, user_id=1, item_id=10, timestamp=100),
+        models.Interaction(id=2, user_id=1, item_id=10, timestamp=200),
+        models.Interaction(id=3, user_id=1, item_id=11, timestamp=300),
+        models.Interaction(id=4, user_id=2, item_id=10, timestamp=400),
+        models.Interaction(id=5, user_id=1, item_id=10, timestamp=500),
+    ])
+    db.commit()
+    yield db
+    migrations.add_interaction_pair_index(engine)  # leave the schema as create_all() made it
+
+
+def test_duplicates_are_removed_before_the_unique_index(legacy_table):
+    migrations.add_interaction_pair_index(engine)
+
+    rows = legacy_table.query(models.Interaction.id, models.Interaction.timestamp).order_by(models.Interaction.id)
+    assert [tuple(r) for r in rows] == [(1, 100), (3, 300), (4, 400)]  # the oldest row per pair stays
+    assert migrations.INTERACTION_PAIR_INDEX in _indexes()
+    assert "ix_interactions_user_id" not in _indexes()
+
+
+def test_index_migration_is_idempotent(legacy_table):
+    migrations.add_interaction_pair_index(engine)
+    migrations.add_interaction_pair_index(engine)
+
+    # On a session whose pool predates the index: ON CONFLICT must find it
+    crud.upsert(legacy_table, models.Interaction, [{"user_id": 1, "item_id": 10, "timestamp": 900}],
+                crud.INTERACTION_KEYS, lambda new: {"timestamp": new.timestamp})
+    legacy_table.commit()
+    assert legacy_table.query(models.Interaction).filter_by(user_id=1, item_id=10).one().timestamp == 900
+
+
+def test_unsupported_dialect_is_refused_at_startup():
+    oracle = SimpleNamespace(dialect=SimpleNamespace(name="oracle"))
+
+    with pytest.raises(RuntimeError, match="Unsupported database 'oracle'"):
+        migrations.run(oracle)
+    for name in ("sqlite", "postgresql", "mysql"):
+        crud.check_dialect(SimpleNamespace(dialect=SimpleNamespace(name=name)))
@@ -0,0 +1,80 @@
+"""Read sessions: async driver URLs, the threadpool fallback, replica routing and pool metrics."""
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.api import interactions, recommend
+from app.db import crud, models, session
+
+
+def _read(fn):
+    """Runs fn(db) on a get_async_read_db() session, the way FastAPI drives the dependency."""
+    async def run():
+        deps = session.get_async_read_db()
+        db = await deps.__anext__()
+        try:
+            return await fn(db)
+        finally:
+            await deps.aclose()
+            await session.dispose_async()  # pooled aiosqlite connections belong to this loop
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(params=["async", "threaded"])
+def driver(request, monkeypatch):
+    if request.param == "async" and session.AsyncReadSessionLocal is None:
+        pytest.skip("needs an async driver (aiosqlite)")
+    if request.param == "threaded":
+        monkeypatch.setattr(session, "AsyncReadSessionLocal", None)
+    return request.param
+
+
+@pytest.fixture
+def likes(db):
+    db.add_all([models.Interaction(user_id=1, item_id=i, timestamp=1) for i in (10, 11)])
+    db.add(models.InteractionArchive(user_id=1, item_id=12, timestamp=0))
+    db.add(models.UserPreference(user_id=1, genre_id=crud.get_genre_id("Drama")))
+    db.commit()
+    return db
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///./graphrec.db", "sqlite+aiosqlite:///./graphrec.db"),
+    ("postgresql://u:p@db:6543/app", "postgresql+asyncpg://u:p@db:6543/app?prepared_statement_cache_size=0"),
+    (
+        "postgresql+psycopg://u:p@db/app?sslmode=require",
+        "postgresql+asyncpg://u:p@db/app?prepared_statement_cache_size=0&ssl=require",
+    ),
+])
+def test_async_url(url, expected):
+    assert session.async_url(url).render_as_string(hide_password=False) == expected
+
+
+def test_reads_see_live_and_archived_likes(likes, driver):
+    assert _read(lambda db: crud.get_user_interacted_ids_async(db, 1)) == {10, 11, 12}
+
+
+def test_read_endpoints(likes, driver):
+    assert sorted(_read(lambda db: interactions.get_user_interactions(1, db=db))) == [10, 11, 12]
+    assert _read(lambda db: recommend.get_user_preferences(1, db=db)) == ["Drama"]
+
+
+def test_without_a_replica_reads_share_the_primary_pool():
+    stats = session.pool_stats()
+
+    assert session.read_engine is session.engine and not stats["read_replica"]
+    assert "replica" not in stats["pools"] and "primary" in stats["pools"]
+
+
+def test_replica_gets_its_own_pool(monkeypatch, tmp_path):
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    monkeypatch.setattr(session, "read_engine", replica)
+    monkeypatch.setattr(session, "async_read_engine", None)
+
+    stats = session.pool_stats()
+
+    assert stats["read_replica"] and stats["async_driver"] is None
+    assert session.pools() == {"primary": session.engine.pool, "replica": replica.pool}
+    replica.dispose()
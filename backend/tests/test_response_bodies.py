@@ -0,0 +1,55 @@
+"""Pre-serialized response bodies: encode_body + render make a valid RecResponse without Pydantic."""
+import importlib
+import json
+import sys
+
+import pytest
+
+from app.api.recommend import RecResponse, render
+from app.core import cache, timing
+from app.utils import fastjson
+
+RESULTS = [
+    {"id": 1, "title": "Amélie (2001)", "category": "Comedy", "reason": "Graph BFS"},
+    {"id": 2, "title": "千と千尋の神隠し", "category": "Animation", "reason": "Global Trending"},
+]
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    """fastjson on each of its encoders (json: as if orjson were not installed)."""
+    if request.param == "json":
+        monkeypatch.setitem(sys.modules, "orjson", None)
+    elif fastjson.BACKEND != "orjson":
+        pytest.importorskip("orjson")
+    importlib.reload(fastjson)
+    yield fastjson.BACKEND
+    monkeypatch.undo()
+    importlib.reload(fastjson)
+
+
+def test_rendered_body_is_a_valid_response(backend):
+    body = cache.encode_body(7, RESULTS)
+
+    response = render(body, timing.StageTimer("recommend"), "Memory Cache ⚡", work={"work_done": 3, "work_total": 4})
+
+    payload = json.loads(response.body)
+    assert payload["recommendations"] == RESULTS
+    assert (payload["source"], payload["completeness"]) == ("Memory Cache ⚡", 0.75)
+    assert RecResponse.model_validate(payload).user_id == 7
+    assert response.media_type == "application/json"
+
+
+def test_one_body_serves_many_renders(backend):
+    body = cache.encode_body(7, [])
+
+    first = json.loads(render(body, timing.StageTimer("recommend"), "l1").body)
+    second = json.loads(render(body, timing.StageTimer("recommend"), "l2", expose=True).body)
+
+    assert first["recommendations"] == second["recommendations"] == []
+    assert "timings" not in first and second["timings"] == {}
+
+
+def test_encoders_agree(backend):
+    assert json.loads(fastjson.dumps({"items": RESULTS})) == {"items": RESULTS}
+    assert fastjson.loads(fastjson.dumps(RESULTS)) == RESULTS
@@ -0,0 +1,122 @@
+"""Decay-based retention: the cutoff, the SQL sweep (archive / aggregate) and the engine prune."""
+import pytest
+from sqlalchemy import select
+
+from app.config import settings
+from app.core import retention
+from app.db import archive, crud, models
+from app.db.session import engine
+
+DAY = 86400
+NOW = 1_700_000_000
+CUTOFF = NOW - 30 * DAY
+
+# user -> [(item, age_days)]
+LIKES = {
+    1: [(1, 400), (2, 300), (3, 200), (4, 5), (5, 1)],  # two recent: the old three go
+    2: [(6, 500), (7, 90)],                             # all old: the newest one stays
+    3: [(8, 2)],                                        # nothing old
+}
+
+
+@pytest.fixture
+def likes(db):
+    db.add_all([
+        models.Interaction(user_id=u, item_id=i, timestamp=NOW - age * DAY)
+        for u, rows in LIKES.items() for i, age in rows
+    ])
+    db.add_all([models.Item(id=1, category="Drama"), models.Item(id=2, category="Drama"),
+                models.Item(id=3, category="Horror"), models.Item(id=6, category="Action")])
+    db.commit()
+    return db
+
+
+def _live(db):
+    return set(db.execute(select(models.Interaction.user_id, models.Interaction.item_id)).all())
+
+
+def test_cutoff_is_where_the_decayed_weight_reaches_the_threshold(monkeypatch):
+    monkeypatch.setattr(settings, "RETENTION_MIN_WEIGHT", 0.5)
+
+    # 1 / (1 + 0.05 * days) = 0.5  ->  20 days
+    assert retention.max_age_seconds() == pytest.approx(20 * DAY)
+    assert retention.cutoff(NOW) == NOW - 20 * DAY
+    assert retention.enabled()
+
+
+def test_sweep_archives_old_likes_beyond_the_keep_count(likes):
+    result = archive.sweep(engine, CUTOFF, keep_per_user=1, mode="archive", user_batch=1)
+
+    assert result == {"rows": 4, "batches": 2}
+    assert _live(likes) == {(1, 4), (1, 5), (2, 7), (3, 8)}
+    archived = likes.execute(select(models.InteractionArchive.user_id, models.InteractionArchive.item_id)).all()
+    assert set(archived) == {(1, 1), (1, 2), (1, 3), (2, 6)}
+    # Archived Likes still count as seen
+    assert crud.get_user_interacted_ids(likes, 1) == {1, 2, 3, 4, 5}
+
+
+def test_sweep_is_safe_to_rerun(likes):
+    archive.sweep(engine, CUTOFF, keep_per_user=1)
+
+    assert archive.sweep(engine, CUTOFF, keep_per_user=1) == {"rows": 0, "batches": 0}
+    assert likes.query(models.InteractionArchive).count() == 4
+
+
+def test_aggregate_mode_keeps_per_genre_counts(likes):
+    archive.sweep(engine, CUTOFF, keep_per_user=1, mode="aggregate")
+
+    affinity = {
+        (a.user_id, a.genre_id): (a.likes, a.last_ts) for a in likes.query(models.UserGenreAffinity)
+    }
+    drama, horror, action = (crud.get_genre_id(c) for c in ("Drama", "Horror", "Action"))
+    assert affinity == {
+        (1, drama): (2, NOW - 300 * DAY),
+        (1, horror): (1, NOW - 200 * DAY),
+        (2, action): (1, NOW - 500 * DAY),
+    }
+    assert likes.query(models.InteractionArchive).count() == 0
+
+
+def test_unknown_mode_is_rejected(likes):
+    with pytest.raises(ValueError):
+        archive.sweep(engine, CUTOFF, keep_per_user=1, mode="drop")
+
+
+def test_engine_prune_matches_the_sql_rule(likes, cpp_engine):
+    for u, rows in LIKES.items():
+        for i, age in rows:
+            cpp_engine.add_interaction(u, i, NOW - age * DAY)
+
+    pruned = cpp_engine.prune_edges(CUTOFF, 1)
+    moved = archive.sweep(engine, CUTOFF, keep_per_user=1)["rows"]
+
+    assert pruned == moved
+    assert cpp_engine.get_edge_count() == len(_live(likes))
+
+
+def test_one_replica_sweeps_per_interval(likes, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "RETENTION_MIN_WEIGHT", 0.01)  # ~5.4 years: nothing to move
+    skipped = retention.retention_stats["skipped_sql"]
+
+    assert retention.run("first")["moved"] == 0
+    assert retention.run("second")["moved"] is None  # swept this interval already
+    assert retention.retention_stats["skipped_sql"] == skipped + 1
+    assert retention.run("admin", force=True)["moved"] == 0
+    assert not redis_client.exists(retention.LOCK_KEY)
+
+
+def test_failed_sweep_is_retried_next_run(likes, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "RETENTION_MIN_WEIGHT", 0.01)
+    real_sweep = archive.sweep
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(archive, "sweep", broken)
+    with pytest.raises(RuntimeError):
+        retention.run("first")
+    assert not redis_client.exists(retention.LAST_KEY)
+    assert not redis_client.exists(retention.LOCK_KEY)
+
+    monkeypatch.setattr(archive, "sweep", real_sweep)
+    assert retention.run("retry")["moved"] == 0
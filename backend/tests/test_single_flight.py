@@ -0,0 +1,135 @@
+"""Request coalescing: in-process single-flight and the cross-worker Redis lock."""
+import threading
+import time
+
+from app.config import settings
+from app.core.singleflight import SingleFlight
+
+
+def _concurrently(n, fn):
+    start = threading.Barrier(n)
+    results = [None] * n
+
+    def call(i):
+        start.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _slow(calls, value, delay=0.1):
+    def fn():
+        calls.append(1)
+        time.sleep(delay)
+        return value
+    return fn
+
+
+def test_concurrent_callers_share_one_computation():
+    flights = SingleFlight()
+    calls = []
+
+    results = _concurrently(8, lambda: flights.do("k", _slow(calls, "v")))
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 7
+    assert {value for value, _ in results} == {"v"}
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "followers": 7}
+
+
+def test_followers_get_the_leaders_error():
+    flights = SingleFlight()
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    results = _concurrently(4, lambda: flights.do("k", fail))
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_different_keys_do_not_wait_on_each_other():
+    flights = SingleFlight()
+    calls = []
+    keys = iter(range(4))
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            key = next(keys)
+        return flights.do(key, _slow(calls, key))
+
+    _concurrently(4, call)
+    assert len(calls) == 4
+
+
+def test_compute_once_coalesces_misses(cache):
+    calls = []
+    ticket = cache.make_ticket(1, "bfs", 10)
+
+    results = _concurrently(6, lambda: cache.compute_once(dict(ticket), _slow(calls, [{"id": 9}])))
+
+    assert len(calls) == 1
+    assert len({body for body, _ in results}) == 1
+    assert cache.get_recs(1, "bfs", 10)[1] == "l1"
+
+
+def test_waits_for_the_worker_holding_the_lock(cache, redis_client):
+    ticket = cache.make_ticket(2, "bfs", 10)
+    body = cache.encode_body(2, [{"id": 4}])
+    redis_client.set(f"lock:{ticket['key']}", "other-worker", px=5000)
+
+    def peer_finishes():
+        time.sleep(0.1)
+        redis_client.set(ticket["key"], body)
+
+    threading.Thread(target=peer_finishes).start()
+    calls = []
+    result, shared = cache.compute_once(ticket, _slow(calls, [{"id": 1}], delay=0))
+
+    assert (result, shared) == (body, True)
+    assert calls == []
+
+
+def test_computes_itself_when_the_peer_gives_up(cache, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_WAIT_MS", 100)
+    ticket = cache.make_ticket(3, "bfs", 10)
+    redis_client.set(f"lock:{ticket['key']}", "other-worker", px=5000)
+
+    body, shared = cache.compute_once(ticket, lambda: [{"id": 1}])
+
+    assert body == cache.encode_body(3, [{"id": 1}])
+    assert shared is False
+
+
+def test_releases_only_its_own_lock(cache, redis_client):
+    ticket = cache.make_ticket(4, "bfs", 10)
+    lock_key = f"lock:{ticket['key']}"
+
+    def compute():
+        # Our lock expired mid-compute and another worker took it
+        redis_client.set(lock_key, "other-worker", px=5000)
+        return [{"id": 1}]
+
+    cache.compute_once(ticket, compute)
+    assert redis_client.get(lock_key) == "other-worker"
+
+    redis_client.delete(lock_key)
+    cache.compute_once(cache.make_ticket(5, "bfs", 10), lambda: [{"id": 1}])
+    assert not redis_client.exists(f"lock:{cache.rec_key(5, 'bfs', 10)}")
+
+
+def test_empty_results_are_not_cached(cache):
+    ticket = cache.make_ticket(6, "bfs", 10)
+    cache.compute_once(ticket, lambda: [])
+    assert cache.get_recs(6, "bfs", 10)[1] is None
@@ -0,0 +1,127 @@
+"""Stale-while-revalidate reads and the background refresher."""
+import time
+
+import pytest
+
+from app.config import settings
+from app.core import refresher
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "refresher did not finish"
+        time.sleep(0.01)
+
+
+def _store(cache, user_id, items, algo="bfs", k=10):
+    body = cache.encode_body(user_id, [{"id": i} for i in items])
+    cache.set_recs(cache.make_ticket(user_id, algo, k), body)
+    return body
+
+
+def test_invalidated_list_is_served_stale_on_this_worker(cache):
+    body = _store(cache, 1, [1, 2])
+
+    cache.invalidate_user(1)
+
+    assert cache.get_recs(1, "bfs", 10)[:2] == (body, "stale")
+
+
+def test_other_workers_serve_the_redis_copy(cache):
+    body = _store(cache, 2, [3])
+    cache.invalidate_user(2)
+    cache.stale_l1.clear()  # as on a worker that never had the list
+
+    assert cache.get_recs(2, "bfs", 10)[:2] == (body, "stale")
+
+
+def test_stale_reads_can_be_disabled(cache, monkeypatch):
+    monkeypatch.setattr(settings, "STALE_WHILE_REVALIDATE", False)
+    _store(cache, 3, [1])
+
+    cache.invalidate_user(3)
+
+    assert cache.get_recs(3, "bfs", 10)[1] is None
+
+
+def test_copy_older_than_the_grace_window_is_refused(cache, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "STALE_GRACE_SECONDS", 2)
+    _store(cache, 4, [1])
+    last = cache.last_key(4, "bfs", 10)
+    # Written 10 s ago, invalidated 5 s ago: past the 2 s grace
+    redis_client.pexpire(last, (cache.ttl_for("bfs") + 2 - 10) * 1000)
+    redis_client.set(cache.invalidated_key(4), time.time() - 5)
+
+    assert cache.get_stale(4, "bfs", 10) is None
+
+
+def test_copy_written_after_the_invalidation_is_kept(cache, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "STALE_GRACE_SECONDS", 2)
+    redis_client.set(cache.invalidated_key(5), time.time() - 5)
+    body = _store(cache, 5, [1])
+
+    assert cache.get_stale(5, "bfs", 10) == body
+
+
+def test_epoch_bump_bounds_every_copy(cache, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "STALE_GRACE_SECONDS", 2)
+    _store(cache, 6, [1])
+    redis_client.pexpire(cache.last_key(6, "bfs", 10), (cache.ttl_for("bfs") + 2 - 10) * 1000)
+    redis_client.set(cache.EPOCH_AT_KEY, time.time() - 5)
+
+    assert cache.get_stale(6, "bfs", 10) is None
+
+
+@pytest.fixture
+def running_refresher(monkeypatch):
+    monkeypatch.setattr(settings, "REFRESH_ALGOS", ["bfs"])
+    monkeypatch.setattr(settings, "REFRESH_K", [10])
+    builds = []
+
+    def build(db, user_id, algo, k, work):
+        builds.append((user_id, algo, k))
+        if user_id == 9:  # a blend that lost a generator to its deadline
+            work.update(work_done=2, work_total=3, completed=False)
+        return [{"id": 100 + len(builds)}]
+
+    refresher.start(build)
+    yield builds
+    refresher.stop()
+
+
+def test_refresher_recomputes_after_a_write(cache, running_refresher):
+    _store(cache, 7, [1])
+    cache.invalidate_user(7)
+
+    refresher.enqueue_user(7)
+    _wait_until(lambda: cache.get_recs(7, "bfs", 10)[1] == "l1")
+
+    assert running_refresher == [(7, "bfs", 10)]
+    body, tier, _ = cache.get_recs(7, "bfs", 10)
+    assert tier == "l1"
+    assert body == cache.encode_body(7, [{"id": 101}])
+
+
+def test_refresher_sheds_when_the_algorithm_is_overloaded(cache, running_refresher, monkeypatch):
+    from app.core import admission
+
+    def overloaded(algo, fn, wait=True):
+        raise admission.Overloaded(algo, "busy")
+
+    monkeypatch.setattr(admission, "run", overloaded)
+    shed = refresher.refresh_stats["shed"]
+
+    refresher.enqueue_user(8)
+    _wait_until(lambda: refresher.refresh_stats["shed"] > shed)
+
+    assert running_refresher == []
+
+
+def test_refresher_does_not_cache_a_partial_list(cache, running_refresher):
+    completed = refresher.refresh_stats["completed"]
+
+    refresher.enqueue_user(9)
+    _wait_until(lambda: refresher.refresh_stats["completed"] > completed)
+
+    assert cache.get_recs(9, "bfs", 10)[1] is None
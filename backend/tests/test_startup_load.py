@@ -0,0 +1,81 @@
+"""Startup graph sync: interactions streamed from SQL in bounded chunks into the engine."""
+import pytest
+from sqlalchemy import insert
+
+from app import main
+from app.config import settings
+from app.core.recommender import add_edges
+from app.db import crud, models
+
+
+class Recorder:
+    """Engine stand-in that records each vectorized batch."""
+
+    def __init__(self):
+        self.batches = []
+        self.genres = {}
+
+    def add_interactions(self, user_ids, item_ids, timestamps):
+        self.batches.append([tuple(map(int, row)) for row in zip(user_ids, item_ids, timestamps)])
+
+    def set_item_genre(self, item_id, genre_id):
+        self.genres[item_id] = genre_id
+
+
+class OneByOne:
+    """An engine build without add_interactions."""
+
+    def __init__(self):
+        self.edges = []
+
+    def add_interaction(self, user_id, item_id, timestamp):
+        self.edges.append((user_id, item_id, timestamp))
+
+
+@pytest.fixture
+def history(db):
+    db.execute(insert(models.Interaction), [
+        {"user_id": u, "item_id": i, "timestamp": 1_700_000_000 + u * 100 + i}
+        for u in range(1, 6) for i in range(5)
+    ])
+    db.add(models.Interaction(user_id=9, item_id=9, timestamp=None))
+    db.add_all([models.Item(id=1, category="Drama"), models.Item(id=2, category="Horror")])
+    db.commit()
+    return db
+
+
+def test_chunks_are_bounded_plain_tuples(history):
+    chunks = list(crud.iter_interaction_chunks(history, chunk_size=7))
+
+    assert [len(c) for c in chunks] == [7, 7, 7, 5]
+    rows = [tuple(r) for c in chunks for r in c]
+    assert len(set(rows)) == 26
+    assert (9, 9, 0) in rows  # a NULL timestamp loads as 0
+    assert not any(isinstance(r, models.Interaction) for c in chunks for r in c)
+
+
+def test_sync_feeds_one_batch_per_chunk(history, monkeypatch):
+    monkeypatch.setattr(settings, "STARTUP_LOAD_CHUNK", 10)
+    engine = Recorder()
+
+    main.sync_graph_with_db(history, engine)
+
+    assert [len(b) for b in engine.batches] == [10, 10, 6]
+    assert engine.genres == {1: crud.get_genre_id("Drama"), 2: crud.get_genre_id("Horror")}
+
+
+def test_add_edges_falls_back_to_single_adds():
+    engine = OneByOne()
+
+    add_edges(engine, [(1, 2, 3), (4, 5, 6)])
+    add_edges(engine, [])
+
+    assert engine.edges == [(1, 2, 3), (4, 5, 6)]
+
+
+def test_chunked_load_builds_the_same_graph(history, cpp_engine):
+    for rows in crud.iter_interaction_chunks(history, chunk_size=4):
+        add_edges(cpp_engine, rows)
+
+    assert cpp_engine.get_edge_count() == 26
+    assert cpp_engine.get_user_count() == 6
@@ -0,0 +1,59 @@
+"""Per-stage request timing: stage accounting, Server-Timing header and the Prometheus histogram."""
+import time
+
+import pytest
+from fastapi import Response
+
+from app.config import settings
+from app.core import timing
+
+
+def test_stages_accumulate_and_render_as_server_timing():
+    timer = timing.StageTimer("recommend", "bfs")
+    with timer.stage("sql"):
+        time.sleep(0.01)
+    with timer.stage("sql"):  # a stage entered twice adds up
+        time.sleep(0.01)
+    with timer.stage("engine"):
+        pass
+
+    breakdown = timer.breakdown_ms()
+    assert list(breakdown) == ["sql", "engine"] and breakdown["sql"] >= 20
+    header = timer.finish(Response()).headers["Server-Timing"]
+    names = [part.split(";")[0] for part in header.split(", ")]
+    assert names == ["sql", "engine", "total"]
+    assert all(part.split(";dur=")[1].replace(".", "").isdigit() for part in header.split(", "))
+
+
+def test_unsampled_requests_only_report_the_total():
+    timer = timing.StageTimer("recommend", sampled=False)
+    with timer.stage("sql"):
+        pass
+
+    assert timer.breakdown_ms() == {}
+    assert timer.server_timing().startswith("total;dur=")
+
+
+def test_sample_rate_and_force(monkeypatch):
+    monkeypatch.setattr(settings, "TIMING_SAMPLE_RATE", 0.0)
+
+    assert not timing.start("recommend").sampled
+    assert timing.start("recommend", force=True).sampled
+
+
+def test_sampled_stages_reach_the_histogram():
+    if timing.STAGE_SECONDS is None:
+        pytest.skip("needs prometheus_client")
+    from prometheus_client import REGISTRY
+
+    labels = {"endpoint": "test", "stage": "sql", "algo": "ppr", "tier": "miss"}
+    before = REGISTRY.get_sample_value("graphrec_stage_seconds_count", labels) or 0
+    timer = timing.StageTimer("test", "ppr")
+    timer.tier = "miss"
+    with timer.stage("sql"):
+        pass
+
+    timer.finish(Response())
+
+    assert REGISTRY.get_sample_value("graphrec_stage_seconds_count", labels) == before + 1
+    assert REGISTRY.get_sample_value("graphrec_stage_seconds_count", {**labels, "stage": "total"}) >= 1
@@ -0,0 +1,102 @@
+"""Graph user-id allocation: free list reuse, extension and incremental gap reclaim."""
+import threading
+
+from sqlalchemy import select
+
+from app.db import models, user_ids
+from app.db.session import SessionLocal, engine
+
+
+def _profiles(db, *ids):
+    for n in ids:
+        db.add(models.Profile(id=n, uuid=f"uuid-{n}", user_id=n))
+    db.commit()
+
+
+def _assign(db, uuid):
+    with user_ids.locked(db):
+        n = user_ids.allocate(db)
+        db.add(models.Profile(uuid=uuid, user_id=n))
+        db.commit()
+    return n
+
+
+def _free(db):
+    return list(db.execute(select(models.FreeUserId.user_id).order_by(models.FreeUserId.user_id)).scalars())
+
+
+def test_extends_past_the_highest_id(db):
+    assert _assign(db, "a") == 1
+    _profiles(db, 5)
+    assert _assign(db, "b") == 6
+
+
+def test_reuses_the_lowest_released_id(db):
+    _profiles(db, 1, 2, 3, 4)
+    with user_ids.locked(db):
+        user_ids.release(db, 3)
+        user_ids.release(db, 2)
+        user_ids.release(db, 2)  # released twice: listed once
+        db.commit()
+
+    assert _free(db) == [2, 3]
+    db.execute(models.Profile.__table__.delete().where(models.Profile.id.in_([2, 3])))
+    db.commit()
+    assert [_assign(db, "a"), _assign(db, "b")] == [2, 3]
+    assert _free(db) == []
+
+
+def test_skips_a_freed_id_that_was_taken_since(db):
+    _profiles(db, 1, 2)
+    db.add(models.FreeUserId(user_id=2))
+    db.commit()
+
+    assert _assign(db, "a") == 3
+    assert _free(db) == []
+
+
+def test_profile_can_keep_its_own_id(db):
+    _profiles(db, 1, 2)
+    db.add(models.FreeUserId(user_id=2))
+    db.commit()
+
+    with user_ids.locked(db):
+        assert user_ids.allocate(db, own_id=2) == 2
+
+
+def test_concurrent_signups_get_distinct_ids(db):
+    ids = []
+
+    def signup(i):
+        session = SessionLocal()
+        try:
+            ids.append(_assign(session, f"signup-{i}"))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=signup, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(ids) == list(range(1, 17))
+
+
+def test_reclaims_gaps_one_window_per_run(db):
+    _profiles(db, 1, 2, 5, 9)
+
+    assert user_ids.reclaim_gaps(engine, batch=3) == 1  # [1, 4)
+    assert _free(db) == [3]
+    assert user_ids.reclaim_gaps(engine, batch=3) == 2  # [4, 7)
+    assert user_ids.reclaim_gaps(engine, batch=3) == 2  # [7, 9), then wrap
+    assert _free(db) == [3, 4, 6, 7, 8]
+
+    # Next pass starts over at 1 and finds nothing new
+    assert user_ids.reclaim_gaps(engine, batch=100) == 0
+    assert db.get(models.UserIdReclaimCursor, 1).next_id == 1
+
+
+def test_reclaim_on_an_empty_table_is_a_no_op(db):
+    assert user_ids.reclaim_gaps(engine, batch=10) == 0
+    assert _free(db) == []
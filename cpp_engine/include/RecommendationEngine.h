@@ -10,6 +10,15 @@
 #include <cmath>
 #include <fstream> 
 #include <random>
+#include <chrono>
+#include <mutex>
+#include <atomic>
+#include <cstdio>
+#include <cstdint>
+#include <cstring>
+#include <stdexcept>
+#include <functional>
+#include <shared_mutex>
 
 struct Interaction {
     int user_id;
@@ -17,33 +26,209 @@ struct Interaction {
     long timestamp;
 };
 
+// Result of a time-budgeted ("anytime") call: the best ranking found before the
+// budget ran out, plus how much of the planned work was actually done.
+struct AnytimeResult {
+    std::vector<int> items;
+    std::vector<double> scores;  // parallel to items (BFS: decayed weight, PPR: visit count)
+    long work_done = 0;
+    long work_total = 0;
+    bool completed = true;
+};
+
+// Engine log messages (levels as in Python logging: 20 info, 30 warning, 40 error).
+// Without a sink they go to stdout/stderr; the bindings install one that hands
+// them to the application's log queue.
+using LogSink = std::function<void(int level, const std::string& message)>;
+void set_log_sink(LogSink sink);
+void engine_log(int level, const std::string& message);
+
 class RecommendationEngine {
 private:
     std::unordered_map<int, std::vector<std::pair<int, long>>> user_items;
     std::unordered_map<int, std::vector<std::pair<int, long>>> item_users;
     std::unordered_map<int, int> item_genres;
 
+    // Readers (recommend*, save, counts) share the graph; writers take it exclusively.
+    // This is what lets the bindings release the GIL during recommendation calls.
+    mutable std::shared_mutex graph_mutex;
+
+    // Adds the edge unless the user already has it (adds are idempotent, so replays are safe).
+    // Scans the user's list: batches dedupe through a BatchIndex and call push_edge instead.
+    // Caller holds graph_mutex.
+    bool insert_edge(int user_id, int item_id, long timestamp);
+    void push_edge(int user_id, int item_id, long timestamp);
     bool has_interacted(int user_id, int item_id);
+
+    // Graph writes since construction; drives edge-delta snapshot triggers.
+    std::atomic<unsigned long long> mutations{0};
+
+    // Delta buffer: writes that arrive while serialize_into() holds the shared lock are
+    // queued here instead of waiting for the unique lock, and applied in arrival order
+    // (under both locks) as soon as the image is complete. Lock order: graph, then pending.
+    struct PendingWrite {
+        enum Op { Add, Remove, Genre } op;
+        int a;   // user_id (Genre: item_id)
+        int b;   // item_id (Genre: genre_id)
+        long ts;
+    };
+    std::mutex pending_mutex;
+    std::vector<PendingWrite> pending_writes;
+    int dumps_in_progress = 0;  // guarded by pending_mutex
+
+    // Applies one write; caller holds graph_mutex exclusively.
+    void apply_write(const PendingWrite& w);
+    // Applies now, or queues behind a running dump.
+    void write(const PendingWrite& w);
+    void begin_dump();
+    void end_dump();
+    struct DumpScope {
+        RecommendationEngine& engine;
+        explicit DumpScope(RecommendationEngine& e) : engine(e) { engine.begin_dump(); }
+        ~DumpScope() { engine.end_dump(); }
+    };
+
+    using Adjacency = std::unordered_map<int, std::vector<std::pair<int, long>>>;
+    struct GraphImage {
+        std::unordered_map<int, int> item_genres;
+        Adjacency user_items;
+        Adjacency item_users;
+    };
+    // Swaps a parsed image in under a brief unique lock; the old graph is freed by the caller.
+    void install(GraphImage& image);
     double calculate_decay_score(long interaction_time, long current_time);
 
 public:
     RecommendationEngine();
     
     void add_interaction(int user_id, int item_id, long timestamp);
+    // Bulk load: n parallel columns, one lock acquisition for the whole batch
+    void add_interactions(const int64_t* user_ids, const int64_t* item_ids, const int64_t* timestamps, size_t n);
     void remove_interaction(int user_id, int item_id);
     void set_item_genre(int item_id, int genre_id);
+
+    // Retention: drops every edge older than cutoff_ts except each user's keep_per_user
+    // newest (ties by item id, same rule as the SQL archiver). The plan is made under
+    // the shared lock; only the erase takes it exclusively. Returns edges removed.
+    long prune_edges(long cutoff_ts, int keep_per_user);
     
     std::vector<int> recommend(int target_user_id, int k, const std::vector<int>& preferred_genres);
 
     std::vector<int> recommend_ppr(int target_user_id, int k, int num_walks, int walk_depth);
 
+    // --- Deadline-aware variants (budget_us <= 0 means unlimited) ---
+    // BFS work unit = one history item expanded; PPR work unit = one random walk.
+    AnytimeResult recommend_anytime(int target_user_id, int k, const std::vector<int>& preferred_genres, long budget_us);
+    AnytimeResult recommend_ppr_anytime(int target_user_id, int k, int num_walks, int walk_depth, long budget_us);
+
     void rebuild(const std::vector<Interaction>& data);
     
     // --- NEW: Serialization Methods ---
     void save_model(const std::string& filepath);
     void load_model(const std::string& filepath);
+
+    // --- In-memory serialization (graph.bin format) ---
+    // Point-in-time image: sizes it and calls alloc(size) -> char* under the shared lock,
+    // then fills that buffer, so the caller chooses where the bytes live (no extra copy).
+    // Writers don't wait for it: they go to the delta buffer until the copy is done.
+    template <typename Alloc> void serialize_into(Alloc&& alloc);
+    std::string serialize();
+    // Parses an image from read(dst, n) -> bool (false = truncated) into a staging graph
+    // without holding the lock, then swaps it in. Readers keep the old graph meanwhile.
+    // limit: the image size when known (lengths are bounded by it), else SIZE_MAX.
+    template <typename Read> void deserialize_from(Read&& read, size_t limit = SIZE_MAX);
+    void loads(const char* data, size_t len);
     
     int get_user_count() const;
     int get_item_count() const;
     long get_edge_count() const;
-};
\ No newline at end of file
+    unsigned long long get_mutation_count() const;
+};
+
+template <typename Alloc>
+void RecommendationEngine::serialize_into(Alloc&& alloc) {
+    using Edge = std::pair<int, long>;
+    DumpScope dump(*this);  // released after the shared lock below
+    std::shared_lock lock(graph_mutex);
+
+    size_t total = sizeof(size_t) * 3 + item_genres.size() * 2 * sizeof(int);
+    for (const auto* graph : {&user_items, &item_users}) {
+        for (const auto& [node, edges] : *graph) total += sizeof(int) + sizeof(size_t) + edges.size() * sizeof(Edge);
+    }
+    char* dst = alloc(total);
+    auto put = [&dst](const void* p, size_t n) { std::memcpy(dst, p, n); dst += n; };
+
+    // 1. Genres
+    size_t genre_size = item_genres.size();
+    put(&genre_size, sizeof(genre_size));
+    for (const auto& [item, genre] : item_genres) {
+        put(&item, sizeof(item));
+        put(&genre, sizeof(genre));
+    }
+
+    // 2. User Graph, 3. Item Graph
+    for (const auto* graph : {&user_items, &item_users}) {
+        size_t size = graph->size();
+        put(&size, sizeof(size));
+        for (const auto& [node, edges] : *graph) {
+            put(&node, sizeof(node));
+            size_t vec_size = edges.size();
+            put(&vec_size, sizeof(vec_size));
+            if (vec_size > 0) put(edges.data(), vec_size * sizeof(Edge));
+        }
+    }
+}
+
+template <typename Read>
+void RecommendationEngine::deserialize_from(Read&& read, size_t limit) {
+    using Edge = std::pair<int, long>;
+    constexpr size_t piece = size_t(1) << 16;  // edges allocated per read
+    // Every length is checked against the bytes left before anything is allocated for
+    // it, and edge lists grow only as their bytes arrive, so a corrupt length fails as
+    // truncated instead of asking for gigabytes.
+    size_t remaining = limit;
+    auto get = [&](void* dst, size_t n) {
+        if (n > remaining) throw std::runtime_error("Truncated graph image");
+        if (n > 0 && !read(static_cast<char*>(dst), n)) throw std::runtime_error("Truncated graph image");
+        if (limit != SIZE_MAX) remaining -= n;
+    };
+
+    GraphImage image;
+
+    // 1. Genres
+    size_t genre_size;
+    get(&genre_size, sizeof(genre_size));
+    for (size_t i = 0; i < genre_size; ++i) {
+        int item, genre;
+        get(&item, sizeof(item));
+        get(&genre, sizeof(genre));
+        image.item_genres[item] = genre;
+    }
+
+    // 2. User Graph, 3. Item Graph
+    for (auto* graph : {&image.user_items, &image.item_users}) {
+        size_t size;
+        get(&size, sizeof(size));
+        for (size_t i = 0; i < size; ++i) {
+            int node;
+            size_t vec_size;
+            get(&node, sizeof(node));
+            get(&vec_size, sizeof(vec_size));
+            if (vec_size > remaining / sizeof(Edge)) throw std::runtime_error("Truncated graph image");
+            std::vector<Edge> edges;
+            for (size_t done = 0; done < vec_size;) {
+                size_t n = std::min(piece, vec_size - done);
+                edges.resize(done + n);
+                get(edges.data() + done, n * sizeof(Edge));
+                done += n;
+            }
+            (*graph)[node] = std::move(edges);
+        }
+    }
+
+    // 4. End of image: trailing bytes mean the lengths above were wrong. Reading up to
+    // the end also lets a checksumming reader verify the image before it is installed.
+    char extra;
+    if (read(&extra, 1)) throw std::runtime_error("Corrupt graph image: trailing bytes");
+    install(image);
+}
@@ -1,5 +1,59 @@
 #include "../include/RecommendationEngine.h"
 
+namespace {
+std::mutex log_sink_mutex;
+LogSink log_sink;
+
+// Dedupe for a batch of adds: a user's items are hashed the first time the batch
+// touches that user, then every row is an O(1) check instead of a scan of the
+// user's list (which made a bulk load O(degree^2) per user).
+class BatchIndex {
+public:
+    using Adjacency = std::unordered_map<int, std::vector<std::pair<int, long>>>;
+    explicit BatchIndex(const Adjacency& user_items) : user_items(user_items) {}
+
+    // True (and recorded) if the user does not have the item yet
+    bool claim(int user_id, int item_id) { return items_of(user_id).insert(item_id).second; }
+    void forget(int user_id, int item_id) {
+        auto it = seen.find(user_id);
+        if (it != seen.end()) it->second.erase(item_id);
+    }
+
+private:
+    std::unordered_set<int>& items_of(int user_id) {
+        auto [it, fresh] = seen.try_emplace(user_id);
+        if (fresh) {
+            auto user_it = user_items.find(user_id);
+            if (user_it != user_items.end()) {
+                for (const auto& p : user_it->second) it->second.insert(p.first);
+            }
+        }
+        return it->second;
+    }
+
+    const Adjacency& user_items;
+    std::unordered_map<int, std::unordered_set<int>> seen;
+};
+}
+
+void set_log_sink(LogSink sink) {
+    std::lock_guard<std::mutex> guard(log_sink_mutex);
+    log_sink = std::move(sink);
+}
+
+void engine_log(int level, const std::string& message) {
+    LogSink sink;
+    {
+        std::lock_guard<std::mutex> guard(log_sink_mutex);
+        sink = log_sink;
+    }
+    if (sink) {
+        sink(level, message);
+        return;
+    }
+    (level >= 30 ? std::cerr : std::cout) << "[C++] " << message << std::endl;
+}
+
 RecommendationEngine::RecommendationEngine() {}
 
 double RecommendationEngine::calculate_decay_score(long interaction_time, long current_time) {
@@ -10,38 +64,192 @@ double RecommendationEngine::calculate_decay_score(long interaction_time, long c
     return 1.0 / (1.0 + (alpha * diff_days));
 }
 
-void RecommendationEngine::add_interaction(int user_id, int item_id, long timestamp) {
+bool RecommendationEngine::insert_edge(int user_id, int item_id, long timestamp) {
+    auto& items = user_items[user_id];
+    for (const auto& p : items) {
+        if (p.first == item_id) return false;
+    }
+    push_edge(user_id, item_id, timestamp);
+    return true;
+}
+
+void RecommendationEngine::push_edge(int user_id, int item_id, long timestamp) {
     user_items[user_id].push_back({item_id, timestamp});
     item_users[item_id].push_back({user_id, timestamp});
 }
 
+void RecommendationEngine::apply_write(const PendingWrite& w) {
+    switch (w.op) {
+    case PendingWrite::Add:
+        if (insert_edge(w.a, w.b, w.ts)) ++mutations;
+        break;
+    case PendingWrite::Remove: {
+        int user_id = w.a, item_id = w.b;
+        auto user_it = user_items.find(user_id);
+        if (user_it != user_items.end()) {
+            auto& items = user_it->second;
+            items.erase(std::remove_if(items.begin(), items.end(),
+                [item_id](const std::pair<int, long>& p){ return p.first == item_id; }), items.end());
+            if (items.empty()) user_items.erase(user_it);
+        }
+        auto item_it = item_users.find(item_id);
+        if (item_it != item_users.end()) {
+            auto& users = item_it->second;
+            users.erase(std::remove_if(users.begin(), users.end(),
+                [user_id](const std::pair<int, long>& p){ return p.first == user_id; }), users.end());
+            if (users.empty()) item_users.erase(item_it);
+        }
+        ++mutations;
+        break;
+    }
+    case PendingWrite::Genre:
+        item_genres[w.a] = w.b;
+        ++mutations;
+        break;
+    }
+}
+
+void RecommendationEngine::write(const PendingWrite& w) {
+    {
+        std::lock_guard<std::mutex> guard(pending_mutex);
+        if (dumps_in_progress > 0) {
+            pending_writes.push_back(w);
+            return;
+        }
+    }
+    std::unique_lock lock(graph_mutex);
+    apply_write(w);
+}
+
+void RecommendationEngine::begin_dump() {
+    std::lock_guard<std::mutex> guard(pending_mutex);
+    ++dumps_in_progress;
+}
+
+void RecommendationEngine::end_dump() {
+    std::unique_lock lock(graph_mutex);
+    std::lock_guard<std::mutex> guard(pending_mutex);
+    if (--dumps_in_progress > 0) return;
+    // A bulk load that ran during the dump can leave many adds here
+    BatchIndex index(user_items);
+    for (const auto& w : pending_writes) {
+        if (w.op == PendingWrite::Add) {
+            if (index.claim(w.a, w.b)) {
+                push_edge(w.a, w.b, w.ts);
+                ++mutations;
+            }
+            continue;
+        }
+        if (w.op == PendingWrite::Remove) index.forget(w.a, w.b);
+        apply_write(w);
+    }
+    pending_writes.clear();
+    pending_writes.shrink_to_fit();
+}
+
+void RecommendationEngine::add_interaction(int user_id, int item_id, long timestamp) {
+    write({PendingWrite::Add, user_id, item_id, timestamp});
+}
+
+void RecommendationEngine::add_interactions(const int64_t* user_ids, const int64_t* item_ids, const int64_t* timestamps, size_t n) {
+    {
+        std::lock_guard<std::mutex> guard(pending_mutex);
+        if (dumps_in_progress > 0) {
+            for (size_t i = 0; i < n; ++i) {
+                pending_writes.push_back({PendingWrite::Add, (int)user_ids[i], (int)item_ids[i], (long)timestamps[i]});
+            }
+            return;
+        }
+    }
+    std::unique_lock lock(graph_mutex);
+    BatchIndex index(user_items);
+    for (size_t i = 0; i < n; ++i) {
+        int user_id = (int)user_ids[i], item_id = (int)item_ids[i];
+        if (!index.claim(user_id, item_id)) continue;
+        push_edge(user_id, item_id, (long)timestamps[i]);
+        ++mutations;
+    }
+}
+
 void RecommendationEngine::remove_interaction(int user_id, int item_id) {
-    if (user_items.find(user_id) != user_items.end()) {
-        auto& items = user_items[user_id];
-        items.erase(std::remove_if(items.begin(), items.end(),
-            [item_id](const std::pair<int, long>& p){ return p.first == item_id; }), items.end());
-        if (items.empty()) user_items.erase(user_id);
+    write({PendingWrite::Remove, user_id, item_id, 0});
+}
+
+long RecommendationEngine::prune_edges(long cutoff_ts, int keep_per_user) {
+    using Edge = std::pair<int, long>;
+    keep_per_user = std::max(keep_per_user, 0);
+
+    // 1. PLAN: per user, the old edges outside its keep_per_user newest
+    std::unordered_map<int, std::unordered_map<int, long>> by_user;  // user -> item -> timestamp
+    {
+        std::shared_lock lock(graph_mutex);
+        std::vector<Edge> ranked;
+        for (const auto& [user_id, edges] : user_items) {
+            if ((int)edges.size() <= keep_per_user) continue;
+            bool any_old = false;
+            for (const auto& e : edges) any_old = any_old || e.second < cutoff_ts;
+            if (!any_old) continue;
+
+            ranked.assign(edges.begin(), edges.end());
+            std::sort(ranked.begin(), ranked.end(), [](const Edge& a, const Edge& b) {
+                return a.second != b.second ? a.second > b.second : a.first > b.first;
+            });
+            for (size_t i = keep_per_user; i < ranked.size(); ++i) {
+                if (ranked[i].second < cutoff_ts) by_user[user_id][ranked[i].first] = ranked[i].second;
+            }
+        }
     }
-    if (item_users.find(item_id) != item_users.end()) {
-        auto& users = item_users[item_id];
-        users.erase(std::remove_if(users.begin(), users.end(),
-            [user_id](const std::pair<int, long>& p){ return p.first == user_id; }), users.end());
-        if (users.empty()) item_users.erase(item_id);
+    if (by_user.empty()) return 0;
+
+    std::unordered_map<int, std::unordered_map<int, long>> by_item;  // item -> user -> timestamp
+    for (const auto& [user_id, items] : by_user) {
+        for (const auto& [item_id, ts] : items) by_item[item_id][user_id] = ts;
     }
+
+    // 2. APPLY: erase only edges still carrying the planned timestamp (a re-Like since is kept)
+    auto erase = [](Adjacency& graph, int node, const std::unordered_map<int, long>& drop) {
+        auto it = graph.find(node);
+        if (it == graph.end()) return 0L;
+        auto& edges = it->second;
+        size_t before = edges.size();
+        edges.erase(std::remove_if(edges.begin(), edges.end(), [&drop](const Edge& e) {
+            auto d = drop.find(e.first);
+            return d != drop.end() && d->second == e.second;
+        }), edges.end());
+        long removed = (long)(before - edges.size());
+        if (edges.empty()) graph.erase(it);
+        return removed;
+    };
+
+    std::unique_lock lock(graph_mutex);
+    long removed = 0;
+    for (const auto& [user_id, items] : by_user) removed += erase(user_items, user_id, items);
+    for (const auto& [item_id, users] : by_item) erase(item_users, item_id, users);
+    mutations += removed;
+    return removed;
 }
 
 // NEW: Store metadata
 void RecommendationEngine::set_item_genre(int item_id, int genre_id) {
-    item_genres[item_id] = genre_id;
+    write({PendingWrite::Genre, item_id, genre_id, 0});
 }
 
 // UPDATED: Now takes preferred_genres
 std::vector<int> RecommendationEngine::recommend(int target_user_id, int k, const std::vector<int>& preferred_genres) {
+    return recommend_anytime(target_user_id, k, preferred_genres, 0).items;
+}
+
+// Deadline-aware BFS: stops expanding history items once budget_us has elapsed
+AnytimeResult RecommendationEngine::recommend_anytime(int target_user_id, int k, const std::vector<int>& preferred_genres, long budget_us) {
+    AnytimeResult result;
+    std::shared_lock lock(graph_mutex);
     // Edge case handling...
-    if (user_items.find(target_user_id) == user_items.end()) return {}; 
+    auto target_it = user_items.find(target_user_id);
+    if (target_it == user_items.end()) return result; 
 
+    auto started = std::chrono::steady_clock::now();
     long current_time = std::time(nullptr);
-    const auto& target_history = user_items[target_user_id];
+    const auto& target_history = target_it->second;
     std::unordered_set<int> seen_items;
     for(const auto& p : target_history) seen_items.insert(p.first);
 
@@ -49,17 +257,25 @@ std::vector<int> RecommendationEngine::recommend(int target_user_id, int k, cons
     std::unordered_set<int> pref_set(preferred_genres.begin(), preferred_genres.end());
 
     std::unordered_map<int, double> item_scores;
+    result.work_total = target_history.size();
 
     // BFS Traversal
     for (const auto& [item_id, _] : target_history) {
-        if (item_users.find(item_id) == item_users.end()) continue;
-        const auto& neighbors = item_users[item_id];
+        if (budget_us > 0 && result.work_done > 0) {
+            auto elapsed = std::chrono::duration_cast<std::chrono::microseconds>(std::chrono::steady_clock::now() - started).count();
+            if (elapsed >= budget_us) break;
+        }
+        result.work_done++;
+        auto item_it = item_users.find(item_id);
+        if (item_it == item_users.end()) continue;
+        const auto& neighbors = item_it->second;
         
         for (const auto& [neighbor_id, _] : neighbors) {
             if (neighbor_id == target_user_id) continue;
-            if (user_items.find(neighbor_id) == user_items.end()) continue;
+            auto neighbor_it = user_items.find(neighbor_id);
+            if (neighbor_it == user_items.end()) continue;
             
-            const auto& candidate_items = user_items[neighbor_id];
+            const auto& candidate_items = neighbor_it->second;
             for (const auto& [candidate_id, timestamp] : candidate_items) {
                 if (seen_items.count(candidate_id)) continue;
 
@@ -68,9 +284,9 @@ std::vector<int> RecommendationEngine::recommend(int target_user_id, int k, cons
                 
                 // 2. Genre Boost
                 // If the item's genre is in the user's preferred list, boost score by 1.5x
-                if (item_genres.count(candidate_id)) {
-                    int g_id = item_genres[candidate_id];
-                    if (pref_set.count(g_id)) {
+                auto genre_it = item_genres.find(candidate_id);
+                if (genre_it != item_genres.end()) {
+                    if (pref_set.count(genre_it->second)) {
                         score *= 1.5; 
                     }
                 }
@@ -90,16 +306,29 @@ std::vector<int> RecommendationEngine::recommend(int target_user_id, int k, cons
                   return a.second > b.second; 
               });
 
-    std::vector<int> results;
     for (int i = 0; i < std::min((int)ranked_candidates.size(), k); ++i) {
-        results.push_back(ranked_candidates[i].first);
+        result.items.push_back(ranked_candidates[i].first);
+        result.scores.push_back(ranked_candidates[i].second);
     }
-    return results;
+    result.completed = result.work_done == result.work_total;
+    return result;
 }
 
 // --- NEW: Personalized PageRank Implementation ---
 std::vector<int> RecommendationEngine::recommend_ppr(int target_user_id, int k, int num_walks, int walk_depth) {
-    if (user_items.find(target_user_id) == user_items.end()) return {};
+    return recommend_ppr_anytime(target_user_id, k, num_walks, walk_depth, 0).items;
+}
+
+// Deadline-aware PPR: the visit counts after any number of walks are a valid
+// (noisier) estimate, so we rank whatever has been sampled when the budget runs out
+AnytimeResult RecommendationEngine::recommend_ppr_anytime(int target_user_id, int k, int num_walks, int walk_depth, long budget_us) {
+    AnytimeResult result;
+    result.work_total = num_walks;
+    std::shared_lock lock(graph_mutex);
+    auto target_it = user_items.find(target_user_id);
+    if (target_it == user_items.end()) return result;
+
+    auto started = std::chrono::steady_clock::now();
 
     // 1. Setup Random Number Generation
     std::random_device rd;
@@ -110,11 +339,17 @@ std::vector<int> RecommendationEngine::recommend_ppr(int target_user_id, int k,
     
     // Identify items already seen by target (to exclude them later)
     std::unordered_set<int> seen_items;
-    const auto& history = user_items[target_user_id];
+    const auto& history = target_it->second;
     for(const auto& p : history) seen_items.insert(p.first);
 
     // 2. Perform Random Walks (Monte Carlo Simulation)
     for (int i = 0; i < num_walks; ++i) {
+        // Check the clock every 256 walks to keep the overhead negligible
+        if (budget_us > 0 && i > 0 && (i & 255) == 0) {
+            auto elapsed = std::chrono::duration_cast<std::chrono::microseconds>(std::chrono::steady_clock::now() - started).count();
+            if (elapsed >= budget_us) break;
+        }
+        result.work_done++;
         int curr_user = target_user_id;
         int curr_item = -1;
         
@@ -123,8 +358,9 @@ std::vector<int> RecommendationEngine::recommend_ppr(int target_user_id, int k,
         for (int step = 0; step < walk_depth; ++step) {
             
             // A. Move User -> Item
-            if (user_items.find(curr_user) == user_items.end()) break;
-            const auto& u_items = user_items[curr_user];
+            auto user_it = user_items.find(curr_user);
+            if (user_it == user_items.end()) break;
+            const auto& u_items = user_it->second;
             if (u_items.empty()) break;
             
             std::uniform_int_distribution<> dis_item(0, u_items.size() - 1);
@@ -140,8 +376,9 @@ std::vector<int> RecommendationEngine::recommend_ppr(int target_user_id, int k,
             }
 
             // B. Move Item -> User
-            if (item_users.find(curr_item) == item_users.end()) break;
-            const auto& i_users = item_users[curr_item];
+            auto item_it = item_users.find(curr_item);
+            if (item_it == item_users.end()) break;
+            const auto& i_users = item_it->second;
             if (i_users.empty()) break;
 
             std::uniform_int_distribution<> dis_user(0, i_users.size() - 1);
@@ -164,124 +401,87 @@ std::vector<int> RecommendationEngine::recommend_ppr(int target_user_id, int k,
               });
 
     // Extract Top K
-    std::vector<int> results;
     for (int i = 0; i < std::min((int)ranked_candidates.size(), k); ++i) {
-        results.push_back(ranked_candidates[i].first);
+        result.items.push_back(ranked_candidates[i].first);
+        result.scores.push_back(ranked_candidates[i].second);
     }
 
-    return results;
+    result.completed = result.work_done == result.work_total;
+    return result;
 }
 
 
 // ... rebuild, get_user_count etc remain same ...
 void RecommendationEngine::rebuild(const std::vector<Interaction>& data) {
+    std::unique_lock lock(graph_mutex);
     user_items.clear();
     item_users.clear();
-    for (const auto& i : data) add_interaction(i.user_id, i.item_id, i.timestamp);
+    BatchIndex index(user_items);
+    for (const auto& i : data) {
+        if (index.claim(i.user_id, i.item_id)) push_edge(i.user_id, i.item_id, i.timestamp);
+    }
+    mutations += data.size();
 }
-int RecommendationEngine::get_user_count() const { return user_items.size(); }
-int RecommendationEngine::get_item_count() const { return item_users.size(); }
+int RecommendationEngine::get_user_count() const { std::shared_lock lock(graph_mutex); return user_items.size(); }
+int RecommendationEngine::get_item_count() const { std::shared_lock lock(graph_mutex); return item_users.size(); }
 long RecommendationEngine::get_edge_count() const { 
+    std::shared_lock lock(graph_mutex);
     long edges = 0;
     for(auto const& [key, val] : user_items) edges += val.size();
     return edges;
 }
+unsigned long long RecommendationEngine::get_mutation_count() const { return mutations.load(); }
 
-// --- NEW: Save Memory to Disk ---
-void RecommendationEngine::save_model(const std::string& filepath) {
-    std::ofstream out(filepath, std::ios::binary);
-    if (!out) {
-        std::cerr << "Error: Cannot open file for writing: " << filepath << std::endl;
-        return;
-    }
+std::string RecommendationEngine::serialize() {
+    std::string buf;
+    serialize_into([&buf](size_t n) { buf.resize(n); return buf.data(); });
+    return buf;
+}
 
-    // 1. Save Genres
-    size_t genre_size = item_genres.size();
-    out.write(reinterpret_cast<const char*>(&genre_size), sizeof(genre_size));
-    for (const auto& [item, genre] : item_genres) {
-        out.write(reinterpret_cast<const char*>(&item), sizeof(item));
-        out.write(reinterpret_cast<const char*>(&genre), sizeof(genre));
-    }
+void RecommendationEngine::install(GraphImage& image) {
+    std::unique_lock lock(graph_mutex);
+    item_genres.swap(image.item_genres);
+    user_items.swap(image.user_items);
+    item_users.swap(image.item_users);
+    ++mutations;
+}
 
-    // 2. Save User Graph
-    size_t user_size = user_items.size();
-    out.write(reinterpret_cast<const char*>(&user_size), sizeof(user_size));
-    for (const auto& [user, items] : user_items) {
-        out.write(reinterpret_cast<const char*>(&user), sizeof(user));
-        size_t vec_size = items.size();
-        out.write(reinterpret_cast<const char*>(&vec_size), sizeof(vec_size));
-        if (vec_size > 0) {
-            out.write(reinterpret_cast<const char*>(items.data()), vec_size * sizeof(std::pair<int, long>));
-        }
-    }
+void RecommendationEngine::loads(const char* data, size_t len) {
+    size_t pos = 0;
+    deserialize_from([&](char* dst, size_t n) {
+        if (n > len - pos) return false;
+        std::memcpy(dst, data + pos, n);
+        pos += n;
+        return true;
+    }, len);
+}
 
-    // 3. Save Item Graph
-    size_t item_size = item_users.size();
-    out.write(reinterpret_cast<const char*>(&item_size), sizeof(item_size));
-    for (const auto& [item, users] : item_users) {
-        out.write(reinterpret_cast<const char*>(&item), sizeof(item));
-        size_t vec_size = users.size();
-        out.write(reinterpret_cast<const char*>(&vec_size), sizeof(vec_size));
-        if (vec_size > 0) {
-            out.write(reinterpret_cast<const char*>(users.data()), vec_size * sizeof(std::pair<int, long>));
+// --- NEW: Save Memory to Disk ---
+// Online: the lock is held only for serialize(); the file is written afterwards and
+// renamed into place, so a reader of filepath never sees a partial snapshot.
+void RecommendationEngine::save_model(const std::string& filepath) {
+    std::string buf = serialize();
+
+    std::string tmp = filepath + ".tmp";
+    {
+        std::ofstream out(tmp, std::ios::binary | std::ios::trunc);
+        if (!out) {
+            engine_log(40, "Cannot open file for writing: " + tmp);
+            return;
         }
+        out.write(buf.data(), buf.size());
+        if (!out) throw std::runtime_error("Failed writing snapshot to " + tmp);
     }
-    
-    out.close();
-    std::cout << "[C++] Graph saved to " << filepath << std::endl;
+    if (std::rename(tmp.c_str(), filepath.c_str()) != 0) {
+        throw std::runtime_error("Cannot move snapshot into place: " + filepath);
+    }
+    engine_log(20, "Graph saved to " + filepath);
 }
 
 // --- NEW: Load Memory from Disk ---
 void RecommendationEngine::load_model(const std::string& filepath) {
     std::ifstream in(filepath, std::ios::binary);
     if (!in) throw std::runtime_error("Cannot open file for reading");
-
-    user_items.clear();
-    item_users.clear();
-    item_genres.clear();
-
-    // 1. Load Genres
-    size_t genre_size;
-    in.read(reinterpret_cast<char*>(&genre_size), sizeof(genre_size));
-    for (size_t i = 0; i < genre_size; ++i) {
-        int item, genre;
-        in.read(reinterpret_cast<char*>(&item), sizeof(item));
-        in.read(reinterpret_cast<char*>(&genre), sizeof(genre));
-        item_genres[item] = genre;
-    }
-
-    // 2. Load User Graph
-    size_t user_size;
-    in.read(reinterpret_cast<char*>(&user_size), sizeof(user_size));
-    for (size_t i = 0; i < user_size; ++i) {
-        int user;
-        size_t vec_size;
-        in.read(reinterpret_cast<char*>(&user), sizeof(user));
-        in.read(reinterpret_cast<char*>(&vec_size), sizeof(vec_size));
-        
-        std::vector<std::pair<int, long>> items(vec_size);
-        if (vec_size > 0) {
-            in.read(reinterpret_cast<char*>(items.data()), vec_size * sizeof(std::pair<int, long>));
-        }
-        user_items[user] = std::move(items);
-    }
-
-    // 3. Load Item Graph
-    size_t item_size;
-    in.read(reinterpret_cast<char*>(&item_size), sizeof(item_size));
-    for (size_t i = 0; i < item_size; ++i) {
-        int item;
-        size_t vec_size;
-        in.read(reinterpret_cast<char*>(&item), sizeof(item));
-        in.read(reinterpret_cast<char*>(&vec_size), sizeof(vec_size));
-        
-        std::vector<std::pair<int, long>> users(vec_size);
-        if (vec_size > 0) {
-            in.read(reinterpret_cast<char*>(users.data()), vec_size * sizeof(std::pair<int, long>));
-        }
-        item_users[item] = std::move(users);
-    }
-
-    in.close();
-    std::cout << "[C++] Graph loaded from " << filepath << std::endl;
-}
\ No newline at end of file
+    deserialize_from([&in](char* dst, size_t n) { return bool(in.read(dst, n)); });
+    engine_log(20, "Graph loaded from " + filepath);
+}
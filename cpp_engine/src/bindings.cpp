@@ -1,5 +1,6 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
+#include <pybind11/numpy.h>
 #include "../include/RecommendationEngine.h"
 
 namespace py = pybind11;
@@ -7,36 +8,175 @@ namespace py = pybind11;
 PYBIND11_MODULE(recommender, m) {
     m.doc() = "C++ Graph-Based Recommendation Engine";
 
+    // The sink holds the callback by shared_ptr so engine threads copy it without
+    // touching Python refcounts; the GIL is taken only to call or free it.
+    m.def("set_log_callback", [](py::object callback) {
+              if (callback.is_none()) {
+                  set_log_sink(nullptr);
+                  return;
+              }
+              std::shared_ptr<py::object> fn(new py::object(callback), [](py::object* p) {
+                  py::gil_scoped_acquire gil;
+                  delete p;
+              });
+              set_log_sink([fn](int level, const std::string& message) {
+                  py::gil_scoped_acquire gil;
+                  try {
+                      (*fn)(level, message);
+                  } catch (py::error_already_set& e) {
+                      e.discard_as_unraisable("recommender log callback");
+                  }
+              });
+          }, py::arg("callback"),
+          "Routes engine log messages to callback(level, message); None restores stdout/stderr.");
+    // Drop the callback before the interpreter goes away
+    py::module_::import("atexit").attr("register")(py::cpp_function([]() { set_log_sink(nullptr); }));
+
     py::class_<Interaction>(m, "Interaction")
         .def(py::init<int, int, long>())
         .def_readwrite("user_id", &Interaction::user_id)
         .def_readwrite("item_id", &Interaction::item_id)
         .def_readwrite("timestamp", &Interaction::timestamp);
 
+    py::class_<AnytimeResult>(m, "AnytimeResult")
+        .def_readonly("items", &AnytimeResult::items)
+        .def_readonly("scores", &AnytimeResult::scores)
+        .def_readonly("work_done", &AnytimeResult::work_done)
+        .def_readonly("work_total", &AnytimeResult::work_total)
+        .def_readonly("completed", &AnytimeResult::completed);
+
     py::class_<RecommendationEngine>(m, "Engine")
         .def(py::init<>())
-        .def("add_interaction", &RecommendationEngine::add_interaction)
-        .def("remove_interaction", &RecommendationEngine::remove_interaction)
+        // Writers run without the GIL: one that waits for the graph lock (or queues behind
+        // a dump) must not freeze every other Python thread meanwhile
+        .def("add_interaction", &RecommendationEngine::add_interaction, py::call_guard<py::gil_scoped_release>())
+        .def("remove_interaction", &RecommendationEngine::remove_interaction, py::call_guard<py::gil_scoped_release>())
+
+        // Vectorized bulk add from three equal-length integer arrays (numpy or lists)
+        .def("add_interactions", [](RecommendationEngine& self,
+                                    py::array_t<int64_t, py::array::c_style | py::array::forcecast> user_ids,
+                                    py::array_t<int64_t, py::array::c_style | py::array::forcecast> item_ids,
+                                    py::array_t<int64_t, py::array::c_style | py::array::forcecast> timestamps) {
+                 size_t n = user_ids.size();
+                 if (item_ids.size() != (py::ssize_t)n || timestamps.size() != (py::ssize_t)n)
+                     throw std::invalid_argument("add_interactions: arrays must have equal length");
+                 const int64_t* u = user_ids.data();
+                 const int64_t* i = item_ids.data();
+                 const int64_t* t = timestamps.data();
+                 py::gil_scoped_release release;
+                 self.add_interactions(u, i, t, n);
+             },
+             py::arg("user_ids"), py::arg("item_ids"), py::arg("timestamps"))
+        // Retention sweep (see retention.py); plans under the shared lock, GIL released
+        .def("prune_edges", &RecommendationEngine::prune_edges,
+             py::arg("cutoff_ts"), py::arg("keep_per_user") = 0,
+             py::call_guard<py::gil_scoped_release>())
         // NEW: Expose set_item_genre
-        .def("set_item_genre", &RecommendationEngine::set_item_genre)
+        .def("set_item_genre", &RecommendationEngine::set_item_genre, py::call_guard<py::gil_scoped_release>())
         
+        // Recommendation calls only read the graph (under a shared lock), so they run
+        // with the GIL released and can overlap with each other and with Python code.
+
         //BFS 
         .def("recommend", &RecommendationEngine::recommend, 
-             py::arg("target_user_id"), py::arg("k"), py::arg("preferred_genres") = std::vector<int>())
+             py::arg("target_user_id"), py::arg("k"), py::arg("preferred_genres") = std::vector<int>(),
+             py::call_guard<py::gil_scoped_release>())
         
              
         // --- NEW: PPR Binding ---
         // Defaults: 5000 walks, Depth 2 (User->Item->User->Item)
         .def("recommend_ppr", &RecommendationEngine::recommend_ppr,
-             py::arg("target_user_id"), py::arg("k"), py::arg("num_walks") = 10000, py::arg("walk_depth") = 2)     
+             py::arg("target_user_id"), py::arg("k"), py::arg("num_walks") = 10000, py::arg("walk_depth") = 2,
+             py::call_guard<py::gil_scoped_release>())
+
+        // --- Deadline-aware (anytime) variants: budget in microseconds, <= 0 = unlimited ---
+        .def("recommend_anytime", &RecommendationEngine::recommend_anytime,
+             py::arg("target_user_id"), py::arg("k"), py::arg("preferred_genres") = std::vector<int>(),
+             py::arg("budget_us") = 0, py::call_guard<py::gil_scoped_release>())
+        .def("recommend_ppr_anytime", &RecommendationEngine::recommend_ppr_anytime,
+             py::arg("target_user_id"), py::arg("k"), py::arg("num_walks") = 10000, py::arg("walk_depth") = 2,
+             py::arg("budget_us") = 0, py::call_guard<py::gil_scoped_release>())
 
 
         // --- NEW: Save to disk bindings ---     
-        .def("save_model", &RecommendationEngine::save_model)
-        .def("load_model", &RecommendationEngine::load_model)
+        .def("save_model", &RecommendationEngine::save_model, py::call_guard<py::gil_scoped_release>())
+        .def("load_model", &RecommendationEngine::load_model, py::call_guard<py::gil_scoped_release>())
+
+        // --- In-memory serialization (same format as graph.bin, no temp files) ---
+        // dumps: the image is written straight into a new bytes object. Sizing and copying
+        // run without the GIL; it is taken only to allocate the bytes. That is safe under the
+        // shared graph lock because no binding waits for graph_mutex while holding the GIL:
+        // writers, readers and the count getters below all release it first.
+        .def("dumps", [](RecommendationEngine& self) {
+                 PyObject* out = nullptr;
+                 {
+                     py::gil_scoped_release release;
+                     self.serialize_into([&](size_t n) -> char* {
+                         py::gil_scoped_acquire gil;
+                         out = PyBytes_FromStringAndSize(nullptr, (Py_ssize_t)n);
+                         if (!out) throw py::error_already_set();
+                         return PyBytes_AS_STRING(out);
+                     });
+                 }
+                 return py::reinterpret_steal<py::bytes>(out);
+             })
+        // loads: any contiguous buffer (bytes, bytearray, memoryview, mmap), read in place
+        .def("loads", [](RecommendationEngine& self, py::object buffer) {
+                 Py_buffer view;
+                 if (PyObject_GetBuffer(buffer.ptr(), &view, PyBUF_SIMPLE) != 0) throw py::error_already_set();
+                 try {
+                     py::gil_scoped_release release;
+                     self.loads(static_cast<const char*>(view.buf), (size_t)view.len);
+                 } catch (...) {
+                     PyBuffer_Release(&view);
+                     throw;
+                 }
+                 PyBuffer_Release(&view);
+             }, py::arg("buffer"))
+        // dump_to: streams the image to write(memoryview) in chunk_size pieces; each view is
+        // only valid during the call. Returns the total size.
+        .def("dump_to", [](RecommendationEngine& self, py::object write, size_t chunk_size) {
+                 if (chunk_size == 0) throw std::invalid_argument("dump_to: chunk_size must be > 0");
+                 std::string buf;
+                 {
+                     py::gil_scoped_release release;
+                     buf = self.serialize();
+                 }
+                 for (size_t off = 0; off < buf.size(); off += chunk_size) {
+                     write(py::memoryview::from_memory(buf.data() + off, std::min(chunk_size, buf.size() - off)));
+                 }
+                 return buf.size();
+             }, py::arg("write"), py::arg("chunk_size") = 1 << 20)
+        // load_from: parses an image pulled through read(n) -> bytes-like (file.read semantics:
+        // may return fewer bytes, empty means EOF) in ~1 MiB reads, without buffering it whole.
+        // The parse runs without the GIL; it is taken back only to call read(). size, when
+        // known (> 0), bounds every length in the image. read() is always called until EOF.
+        .def("load_from", [](RecommendationEngine& self, py::object read, size_t size) {
+                 std::string pending;
+                 size_t pos = 0;
+                 py::gil_scoped_release release;
+                 self.deserialize_from([&](char* dst, size_t n) {
+                     while (pending.size() - pos < n) {
+                         pending.erase(0, pos);
+                         pos = 0;
+                         py::gil_scoped_acquire gil;
+                         py::object chunk = read(std::max(n - pending.size(), size_t(1) << 20));
+                         Py_buffer view;
+                         if (PyObject_GetBuffer(chunk.ptr(), &view, PyBUF_SIMPLE) != 0) throw py::error_already_set();
+                         pending.append(static_cast<const char*>(view.buf), (size_t)view.len);
+                         bool eof = view.len == 0;
+                         PyBuffer_Release(&view);
+                         if (eof) return false;
+                     }
+                     std::memcpy(dst, pending.data() + pos, n);
+                     pos += n;
+                     return true;
+                 }, size > 0 ? size : SIZE_MAX);
+             }, py::arg("read"), py::arg("size") = 0)
 
-        .def("rebuild", &RecommendationEngine::rebuild)
-        .def("get_user_count", &RecommendationEngine::get_user_count)
-        .def("get_item_count", &RecommendationEngine::get_item_count)
-        .def("get_edge_count", &RecommendationEngine::get_edge_count);
+        .def("rebuild", &RecommendationEngine::rebuild, py::call_guard<py::gil_scoped_release>())
+        .def("get_user_count", &RecommendationEngine::get_user_count, py::call_guard<py::gil_scoped_release>())
+        .def("get_item_count", &RecommendationEngine::get_item_count, py::call_guard<py::gil_scoped_release>())
+        .def("get_edge_count", &RecommendationEngine::get_edge_count, py::call_guard<py::gil_scoped_release>())
+        .def("get_mutation_count", &RecommendationEngine::get_mutation_count, py::call_guard<py::gil_scoped_release>());
 }
\ No newline at end of file